@@ -0,0 +1,265 @@
+# adaptive_concurrency.py
+"""
+Adaptive concurrency limits for API and image requests (AIMD).
+
+Each limiter bounds how many requests of its kind run at the same time.
+The limit grows additively (+1 per "limit" successful requests) while
+latency stays near the best latency observed, and shrinks multiplicatively
+on rate limiting (429), timeouts, server errors or a clear latency rise.
+Limit changes are kept as history for the run stats and the GUI.
+
+Free slots go to waiting requests of the highest priority class first
+(see scheduling.py), so interactive fetches overtake queued bulk work.
+
+Streamed requests (images, videos) keep their slot until the body was read
+(see AdaptiveLimiter.stream), so the limit bounds concurrent transfers and
+the latency feedback covers the whole transfer, not just the headers.
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+import requests
+
+import scheduling
+
+DEFAULT_MIN_LIMIT = 1
+DEFAULT_MAX_LIMIT = 16
+DEFAULT_INITIAL_LIMIT = 4
+
+# Multiplicative decrease on errors / on rising latency
+ERROR_BACKOFF = 0.5
+LATENCY_BACKOFF = 0.8
+# Latency (EWMA) above baseline * LATENCY_TOLERANCE counts as congestion
+LATENCY_TOLERANCE = 2.0
+EWMA_WEIGHT = 0.2
+# The best-latency baseline drifts up slowly, so a permanently slower link
+# does not keep the limit at its minimum
+BASELINE_DRIFT = 1.01
+# Status codes that signal overload
+OVERLOAD_STATUS = (429, 502, 503, 504)
+HISTORY_SIZE = 200
+
+# All limiters by name (for stats)
+_registry: dict[str, "AdaptiveLimiter"] = {}
+_registry_lock = threading.Lock()
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit with blocking slots.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        min_limit: int = DEFAULT_MIN_LIMIT,
+        max_limit: int = DEFAULT_MAX_LIMIT,
+        initial_limit: int = DEFAULT_INITIAL_LIMIT,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.name = name
+        # Monotonic clock for latencies and the decrease hold (injectable for tests)
+        self.clock = clock
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(self.max_limit, max(self.min_limit, initial_limit)))
+
+        self._cond = threading.Condition()
+        self.in_flight = 0
+        # Waiting requests by priority rank
+        self.waiting = [0] * len(scheduling.PRIORITIES)
+        self.successes = 0
+        self.failures = 0
+        self.latency: Optional[float] = None
+        self.baseline: Optional[float] = None
+        # No further decrease until the requests started before it finished
+        self._hold_until = 0.0
+        self.history: deque[tuple[float, int]] = deque([(time.time(), int(self.limit))], maxlen=HISTORY_SIZE)
+
+        with _registry_lock:
+            _registry[name] = self
+
+    def configure(self, min_limit: int, max_limit: int, initial_limit: int) -> None:
+        with self._cond:
+            self.min_limit = max(1, min_limit)
+            self.max_limit = max(self.min_limit, max_limit)
+            self._set_limit(min(self.max_limit, max(self.min_limit, initial_limit)))
+            self._cond.notify_all()
+
+    # -------------------------------
+    # Slots
+    # -------------------------------
+    @contextmanager
+    def slot(self):
+        """
+        Blocks until a request may start; yields the start time.
+        A request only starts if no request of a higher priority class waits.
+        """
+        rank = scheduling.priority_rank(scheduling.current_priority())
+        with self._cond:
+            self.waiting[rank] += 1
+            try:
+                self._cond.wait_for(
+                    lambda: self.in_flight < int(self.limit) and not any(self.waiting[:rank])
+                )
+            finally:
+                self.waiting[rank] -= 1
+            self.in_flight += 1
+            # Lower classes may have become eligible for the remaining slots
+            self._cond.notify_all()
+        try:
+            yield self.clock()
+        finally:
+            with self._cond:
+                self.in_flight -= 1
+                self._cond.notify_all()
+
+    # -------------------------------
+    # Feedback
+    # -------------------------------
+    def _set_limit(self, value: float) -> None:
+        previous = int(self.limit)
+        self.limit = value
+        if int(value) != previous:
+            self.history.append((time.time(), int(value)))
+
+    def _decrease(self, factor: float) -> None:
+        now = self.clock()
+        if now < self._hold_until:
+            return
+        self._set_limit(max(float(self.min_limit), self.limit * factor))
+        # Requests already in flight saw the old limit; ignore their feedback
+        self._hold_until = now + (self.latency or 0.0)
+
+    def record_success(self, latency: float) -> None:
+        """
+        Reports a completed request and its latency in seconds.
+        """
+        with self._cond:
+            self.successes += 1
+            self.latency = latency if self.latency is None else (
+                EWMA_WEIGHT * latency + (1 - EWMA_WEIGHT) * self.latency
+            )
+            self.baseline = latency if self.baseline is None else min(self.baseline * BASELINE_DRIFT, latency)
+
+            if self.latency > self.baseline * LATENCY_TOLERANCE and self.in_flight > 1:
+                self._decrease(LATENCY_BACKOFF)
+            elif self.limit < self.max_limit:
+                self._set_limit(min(float(self.max_limit), self.limit + 1.0 / self.limit))
+            self._cond.notify_all()
+
+    def record_failure(self) -> None:
+        """
+        Reports an overload signal (429, timeout, 5xx).
+        """
+        with self._cond:
+            self.failures += 1
+            self._decrease(ERROR_BACKOFF)
+
+    def request(self, func: Callable[[], requests.Response]) -> requests.Response:
+        """
+        Runs an HTTP request in a slot and feeds its outcome back.
+        The bandwidth cap of the priority class is applied after the slot
+        is released.
+        """
+        with self.slot() as started:
+            try:
+                response = func()
+            except requests.exceptions.Timeout:
+                self.record_failure()
+                raise
+
+            if is_overload_status(response.status_code):
+                self.record_failure()
+            else:
+                self.record_success(self.clock() - started)
+
+        scheduling.throttle(len(response.content or b""))
+        return response
+
+    @contextmanager
+    def stream(self, func: Callable[[], requests.Response]):
+        """
+        Runs a streamed HTTP request; yields the response. The slot is held
+        until the with block ends, so read the body inside it (the bandwidth
+        cap is applied by the reader, per chunk). The latency sample covers
+        the whole block; timeouts and broken connections while reading count
+        as overload, other exceptions (e.g. HTTP errors) give no feedback.
+        """
+        with self.slot() as started:
+            try:
+                response = func()
+            except requests.exceptions.Timeout:
+                self.record_failure()
+                raise
+
+            overloaded = is_overload_status(response.status_code)
+            if overloaded:
+                self.record_failure()
+            try:
+                yield response
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+                if not overloaded:
+                    self.record_failure()
+                raise
+            finally:
+                response.close()
+
+            if not overloaded:
+                self.record_success(self.clock() - started)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "limit": int(self.limit),
+                "min_limit": self.min_limit,
+                "max_limit": self.max_limit,
+                "in_flight": self.in_flight,
+                "waiting": dict(zip(scheduling.PRIORITIES, self.waiting)),
+                "successes": self.successes,
+                "failures": self.failures,
+                "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+                "history": [limit for _, limit in self.history],
+            }
+
+
+def is_overload_status(status_code: int) -> bool:
+    return status_code in OVERLOAD_STATUS
+
+
+def all_stats() -> dict:
+    """
+    Returns the stats of all limiters.
+    """
+    with _registry_lock:
+        limiters = list(_registry.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
+
+
+def configure_from_config(config, *limiters: AdaptiveLimiter) -> None:
+    """
+    Applies the adaptive_* config keys to the given limiters.
+    """
+    for limiter in limiters:
+        limiter.configure(
+            config.get("adaptive_min_concurrency", DEFAULT_MIN_LIMIT),
+            config.get("adaptive_max_concurrency", DEFAULT_MAX_LIMIT),
+            config.get("adaptive_initial_concurrency", DEFAULT_INITIAL_LIMIT)
+        )
+
+
+def sparkline(values: list[int], width: int = 20) -> str:
+    """
+    Renders the last values as a unicode sparkline (GUI history display).
+    """
+    values = values[-width:]
+    if not values:
+        return ""
+    blocks = "▁▂▃▄▅▆▇█"
+    low, high = min(values), max(values)
+    span = max(1, high - low)
+    return "".join(blocks[(v - low) * (len(blocks) - 1) // span] for v in values)
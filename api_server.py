@@ -0,0 +1,445 @@
+# api_server.py
+"""
+Local HTTP API exposing the fetcher as a service.
+
+Endpoints:
+    POST   /jobs                  {"model_id": 3149, "version": "v16.0", "priority": "bulk"} -> enqueue
+    GET    /jobs                  list jobs
+    GET    /jobs/{id}             job status
+    DELETE /jobs/{id}             cancel job
+    GET    /jobs/{id}/result      created notes (409 while the job is running)
+    GET    /jobs/{id}/events      progress as server-sent events
+    GET    /models/{id}           model metadata (name, type, versions)
+    GET    /stats                 job, request coalescing and concurrency metrics
+
+Jobs run on a worker pool. A request for a model/version that is already
+queued or running returns the existing job instead of starting a new one.
+Jobs run in the bulk priority class unless the request asks for
+"interactive" (see scheduling.py); an interactive request joining a bulk
+job raises that job. Cancelling a shared job only detaches the client
+until the last one cancels. Finished jobs are kept for
+api_server_job_ttl seconds (at most api_server_max_finished_jobs).
+
+Usage: python api_server.py  (api_server_* keys in config.json)
+"""
+
+import json
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+import civitai_api_helper as api_helper
+import civitai_fetch_model
+from config import ConfigManager
+from output_sinks import create_sink
+import single_flight
+import adaptive_concurrency
+import scheduling
+import dataset_export
+from resource_resolver import ResourceResolver
+from snapshots import SnapshotStore
+from image_policy import ImagePolicy
+from image_dedupe import ImageDeduplicator
+import transport
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_WORKERS = 2
+# Finished jobs stay queryable this long (seconds) / at most this many
+DEFAULT_JOB_TTL = 3600
+DEFAULT_MAX_FINISHED_JOBS = 200
+# Seconds between SSE keep-alive comments
+SSE_KEEPALIVE = 15
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+FINAL_STATES = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+
+class Job:
+    """
+    A fetch job and its observable state.
+    """
+
+    def __init__(self, model_id: int, version: str, priority: str = scheduling.PRIORITY_BULK):
+        self.id = uuid.uuid4().hex[:12]
+        self.model_id = model_id
+        self.version = version
+        self.priority_handle = scheduling.PriorityHandle(priority)
+        self.status = JOB_QUEUED
+        self.progress = 0.0
+        self.result: list[str] = []
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.clients = 1
+        self.cancel_event = threading.Event()
+        self.future: Optional[Future] = None
+
+        # Incremented on every change; SSE clients wait on the condition
+        self.seq = 0
+        self.changed = threading.Condition()
+
+    @property
+    def priority(self) -> str:
+        return self.priority_handle.priority
+
+    @property
+    def key(self) -> tuple[int, str]:
+        return (self.model_id, self.version.lower())
+
+    def update(self, **fields) -> None:
+        with self.changed:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.seq += 1
+            self.changed.notify_all()
+
+    def wait_for_change(self, seq: int, timeout: float) -> int:
+        """
+        Blocks until the job changed after seq (or timeout). Returns the current seq.
+        """
+        with self.changed:
+            self.changed.wait_for(lambda: self.seq != seq, timeout=timeout)
+            return self.seq
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "model_id": self.model_id,
+            "version": self.version,
+            "priority": self.priority,
+            "status": self.status,
+            "progress": round(self.progress, 1),
+            "error": self.error,
+            "clients": self.clients,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    """
+    Runs fetch jobs on a worker pool and coalesces identical requests.
+    """
+
+    def __init__(self, config, workers: int = DEFAULT_WORKERS):
+        self.config = config
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers))
+        self._lock = threading.Lock()
+        self.jobs: dict[str, Job] = {}
+        self._active: dict[tuple[int, str], Job] = {}
+        self.coalesced = 0
+        self.job_ttl = config.get("api_server_job_ttl", DEFAULT_JOB_TTL)
+        self.max_finished_jobs = config.get("api_server_max_finished_jobs", DEFAULT_MAX_FINISHED_JOBS)
+
+    def submit(self, model_id: int, version: str, priority: str = scheduling.PRIORITY_BULK) -> tuple[Job, bool]:
+        """
+        Enqueues a job. Returns (job, coalesced).
+        """
+        with self._lock:
+            self._evict_finished()
+            key = (model_id, version.lower())
+            active = self._active.get(key)
+            if active is not None:
+                self.coalesced += 1
+                if active.priority_handle.raise_to(priority):
+                    print(f"[INFO] Job {active.id} raised to priority '{priority}'")
+                active.update(clients=active.clients + 1)
+                return active, True
+
+            job = Job(model_id, version, priority)
+            self.jobs[job.id] = job
+            self._active[key] = job
+            job.future = self.executor.submit(self._run, job)
+            return job, False
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Detaches one client from a job. The job is cancelled once no client
+        is left; until then it keeps running for the others.
+        """
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.status in FINAL_STATES or job.cancel_event.is_set():
+                return job
+            job.update(clients=max(0, job.clients - 1))
+            if job.clients:
+                return job
+            # New requests must not join a cancelled job
+            if self._active.get(job.key) is job:
+                del self._active[job.key]
+
+        job.cancel_event.set()
+        if job.future is not None and job.future.cancel():
+            # Never started
+            self._finish(job, JOB_CANCELLED)
+        return job
+
+    def _finish(self, job: Job, status: str, **fields) -> None:
+        with self._lock:
+            if self._active.get(job.key) is job:
+                del self._active[job.key]
+        job.update(status=status, finished_at=time.time(), **fields)
+        with self._lock:
+            self._evict_finished()
+
+    def _evict_finished(self) -> None:
+        """
+        Drops finished jobs older than job_ttl and the oldest ones beyond
+        max_finished_jobs. Caller holds _lock.
+        """
+        finished = sorted(
+            (job for job in self.jobs.values() if job.status in FINAL_STATES),
+            key=lambda job: job.finished_at or 0
+        )
+        excess = len(finished) - self.max_finished_jobs
+        cutoff = time.time() - self.job_ttl
+        for idx, job in enumerate(finished):
+            if idx < excess or (job.finished_at or 0) < cutoff:
+                del self.jobs[job.id]
+
+    def _run(self, job: Job) -> None:
+        if job.cancel_event.is_set():
+            self._finish(job, JOB_CANCELLED)
+            return
+
+        job.update(status=JOB_RUNNING)
+        md_dir = self.config.get_path("model_output_dir")
+        img_dir = self.config.get_path("image_output_dir")
+
+        try:
+            with create_sink(self.config, md_dir, img_dir) as sink, \
+                    dataset_export.open_from_config(self.config) as dataset:
+                result = civitai_fetch_model.run(
+                    job.model_id,
+                    job.version,
+                    progress_callback=lambda percent: job.update(progress=percent),
+                    cancel_event=job.cancel_event,
+                    md_output_dir=md_dir,
+                    img_output_dir=img_dir,
+                    version_workers=self.config.get("version_workers", civitai_fetch_model.DEFAULT_VERSION_WORKERS),
+                    write_index=self.config.get("write_model_index", True),
+                    sink=sink,
+                    snapshots=SnapshotStore.from_config(self.config),
+                    stats_pages=self.config.get("stats_deep_fetch_pages", 0),
+                    image_policy=ImagePolicy.from_config(self.config),
+                    deduplicator=ImageDeduplicator.from_config(self.config),
+                    priority=job.priority_handle,
+                    dataset=dataset,
+                    resolver=ResourceResolver.from_config(self.config, md_dir)
+                )
+        except Exception as e:
+            self._finish(job, JOB_FAILED, error=str(e))
+            return
+
+        if job.cancel_event.is_set():
+            self._finish(job, JOB_CANCELLED)
+        elif not result:
+            self._finish(job, JOB_FAILED, error=f"Version '{job.version}' not found")
+        else:
+            result = result if isinstance(result, list) else [result]
+            self._finish(job, JOB_DONE, progress=100.0, result=[str(r) for r in result])
+
+    def shutdown(self) -> None:
+        for job in list(self.jobs.values()):
+            job.cancel_event.set()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    """
+    Routes HTTP requests to the JobManager.
+    """
+
+    server_version = "AIModelFetcher/0.1"
+    manager: JobManager = None
+
+    # -------------------------------
+    # Helpers
+    # -------------------------------
+    def _send_json(self, status: int, payload) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status: int, message: str) -> None:
+        self._send_json(status, {"error": message})
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length))
+
+    def _job_or_404(self, job_id: str) -> Optional[Job]:
+        job = self.manager.get(job_id)
+        if job is None:
+            self._error(404, f"Unknown job: {job_id}")
+        return job
+
+    def log_message(self, format, *args):
+        print(f"[INFO] API {self.address_string()} {format % args}")
+
+    # -------------------------------
+    # Routes
+    # -------------------------------
+    def do_POST(self):
+        if self.path.rstrip("/") != "/jobs":
+            return self._error(404, "Not found")
+
+        try:
+            payload = self._read_json()
+            model_id = int(payload["model_id"])
+            version = str(payload.get("version") or civitai_fetch_model.ALL_VERSIONS)
+            priority = str(payload.get("priority") or scheduling.PRIORITY_BULK)
+            scheduling.priority_rank(priority)
+        except (ValueError, KeyError, TypeError) as e:
+            return self._error(400, f"Invalid request: {e}")
+
+        job, coalesced = self.manager.submit(model_id, version, priority)
+        self._send_json(200 if coalesced else 202, {"job": job.to_dict(), "coalesced": coalesced})
+
+    def do_DELETE(self):
+        match = re.fullmatch(r"/jobs/(\w+)/?", self.path)
+        if not match:
+            return self._error(404, "Not found")
+
+        job = self.manager.cancel(match.group(1))
+        if job is None:
+            return self._error(404, f"Unknown job: {match.group(1)}")
+        self._send_json(200, {"job": job.to_dict()})
+
+    def do_GET(self):
+        path = self.path.rstrip("/")
+
+        if path == "/jobs":
+            with self.manager._lock:
+                jobs = [job.to_dict() for job in self.manager.jobs.values()]
+            return self._send_json(200, {"jobs": jobs, "coalesced": self.manager.coalesced})
+
+        if path == "/stats":
+            return self._send_json(200, {
+                "jobs_coalesced": self.manager.coalesced,
+                "requests": single_flight.all_stats(),
+                "concurrency": adaptive_concurrency.all_stats(),
+                "bandwidth": scheduling.all_stats(),
+            })
+
+        match = re.fullmatch(r"/jobs/(\w+)(/result|/events)?", path)
+        if match:
+            job = self._job_or_404(match.group(1))
+            if job is None:
+                return
+            if match.group(2) == "/result":
+                return self._send_result(job)
+            if match.group(2) == "/events":
+                return self._send_events(job)
+            return self._send_json(200, {"job": job.to_dict()})
+
+        match = re.fullmatch(r"/models/(\d+)", path)
+        if match:
+            return self._send_model(int(match.group(1)))
+
+        self._error(404, "Not found")
+
+    def _send_result(self, job: Job) -> None:
+        if job.status not in FINAL_STATES:
+            return self._error(409, f"Job is {job.status}")
+        if job.status != JOB_DONE:
+            return self._send_json(200, {"job": job.to_dict(), "notes": []})
+        self._send_json(200, {"job": job.to_dict(), "notes": job.result})
+
+    def _send_model(self, model_id: int) -> None:
+        try:
+            metadata = api_helper.get_model_metadata(model_id)
+        except RuntimeError as e:
+            return self._error(502, str(e))
+
+        self._send_json(200, {
+            "id": model_id,
+            "name": metadata["name"],
+            "type": metadata["type"],
+            "baseModel": metadata["baseModel"],
+            "versions": metadata["versions"],
+        })
+
+    def _send_events(self, job: Job) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        seq = -1
+        try:
+            while True:
+                with job.changed:
+                    current = job.seq
+                    state = job.to_dict()
+
+                if current != seq:
+                    seq = current
+                    event = "done" if state["status"] in FINAL_STATES else "progress"
+                    self.wfile.write(f"event: {event}\ndata: {json.dumps(state)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    if event == "done":
+                        return
+                elif job.wait_for_change(seq, SSE_KEEPALIVE) == seq:
+                    self.wfile.write(b": keep-alive\n\n")
+                    self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def create_server(config, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, workers: int = DEFAULT_WORKERS) -> ThreadingHTTPServer:
+    """
+    Creates the HTTP server (call serve_forever() to run it).
+    """
+    manager = JobManager(config, workers)
+    handler = type("BoundApiRequestHandler", (ApiRequestHandler,), {"manager": manager})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.manager = manager
+    return server
+
+
+def main() -> None:
+    config = ConfigManager()
+    transport.configure_from_config(config)
+    adaptive_concurrency.configure_from_config(config, api_helper.api_limiter, civitai_fetch_model.image_limiter)
+    scheduling.configure_from_config(config)
+    api_helper.configure_cache(
+        config.get("metadata_cache_dir") or None,
+        config.get("metadata_cache_ttl", api_helper.DEFAULT_CACHE_TTL)
+    )
+
+    host = config.get("api_server_host", DEFAULT_HOST)
+    port = config.get("api_server_port", DEFAULT_PORT)
+    server = create_server(config, host, port, config.get("api_server_workers", DEFAULT_WORKERS))
+
+    print(f"[OK] API server listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("[WARN] API server stopped")
+    finally:
+        server.manager.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,231 @@
 # model_api_helper.py
 # Wrapper for accessing AI model metadata APIs
+import hashlib
+import json
 import requests
-from typing import Optional
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterator, Optional
+
+from model_payload import parse_model_payload
+from single_flight import SingleFlight
+import transport
+from adaptive_concurrency import AdaptiveLimiter
 
 # Note: Current implementation uses AI model platform (civitai.com) as the API provider
 API_MODEL_URL = "https://api.civitai.com/v1/models/{}"
+API_MODELS_URL = "https://api.civitai.com/v1/models"
+API_IMAGES_URL = "https://api.civitai.com/v1/images"
+API_VERSION_URL = "https://api.civitai.com/v1/model-versions/{}"
+API_VERSION_BY_HASH_URL = "https://api.civitai.com/v1/model-versions/by-hash/{}"
 API_TIMEOUT = 30
 
+# Responses younger than this are served from the cache without a request
+DEFAULT_CACHE_TTL = 60
+DEFAULT_CACHE_ENTRIES = 256
+
+
+class CacheEntry:
+    """
+    Cached API response with its HTTP validators.
+    """
+
+    __slots__ = ("body", "etag", "last_modified", "fetched_at")
+
+    def __init__(self, body: bytes, etag: Optional[str], last_modified: Optional[str], fetched_at: float):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+
+
+class MetadataCache:
+    """
+    LRU cache of API responses keyed by URL, optionally persisted to disk.
+    Entries keep ETag/Last-Modified so they can be revalidated with
+    conditional requests.
+    """
+
+    def __init__(self, cache_dir: Optional[Path] = None, max_entries: int = DEFAULT_CACHE_ENTRIES):
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)
+                return entry
+
+        if not self.cache_dir:
+            return None
+
+        key = self._key(url)
+        meta_file = self.cache_dir / f"{key}.json"
+        body_file = self.cache_dir / f"{key}.body"
+        try:
+            meta = json.loads(meta_file.read_text(encoding="utf-8"))
+            entry = CacheEntry(body_file.read_bytes(), meta.get("etag"), meta.get("last_modified"), meta.get("fetched_at", 0))
+        except (OSError, ValueError):
+            return None
+
+        self._remember(url, entry)
+        return entry
+
+    def put(self, url: str, entry: CacheEntry) -> None:
+        self._remember(url, entry)
+
+        if self.cache_dir:
+            key = self._key(url)
+            try:
+                (self.cache_dir / f"{key}.body").write_bytes(entry.body)
+                (self.cache_dir / f"{key}.json").write_text(json.dumps({
+                    "url": url,
+                    "etag": entry.etag,
+                    "last_modified": entry.last_modified,
+                    "fetched_at": entry.fetched_at,
+                }), encoding="utf-8")
+            except OSError as e:
+                print(f"[WARN] Cache entry could not be written: {e}")
+
+    def _remember(self, url: str, entry: CacheEntry) -> None:
+        with self._lock:
+            self._entries[url] = entry
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+# Shared cache (memory only until configure_cache() is called)
+_cache = MetadataCache()
+_cache_ttl = DEFAULT_CACHE_TTL
+
+# Coalesces concurrent identical API requests
+_api_flight = SingleFlight("api")
+# Adaptive limit of concurrent API requests
+api_limiter = AdaptiveLimiter("api")
+
+
+def configure_cache(cache_dir: Optional[Path] = None, ttl: int = DEFAULT_CACHE_TTL) -> None:
+    """
+    Replaces the shared metadata cache (e.g. to persist it in cache_dir).
+    """
+    global _cache, _cache_ttl
+    _cache = MetadataCache(cache_dir)
+    _cache_ttl = ttl
+
+
+def fetch_cached(url: str, max_age: Optional[float] = None, params: Optional[dict] = None) -> tuple[bytes, bool]:
+    """
+    GETs an API URL through the metadata cache.
+
+    Cached entries younger than max_age (default: cache TTL) are returned
+    without a request; older entries are revalidated with If-None-Match /
+    If-Modified-Since.
+
+    Returns:
+        Tuple of (response body, changed) - changed is False if the body is
+        identical to the previously cached one
+
+    Raises:
+        requests.exceptions.RequestException: On HTTP errors
+    """
+    if params:
+        url = requests.Request("GET", url, params=params).prepare().url
+
+    if max_age is None:
+        max_age = _cache_ttl
+
+    cached = _cache.get(url)
+    if cached is not None and time.time() - cached.fetched_at < max_age:
+        return cached.body, False
+
+    # Concurrent requests for the same URL share one HTTP call
+    return _api_flight.do(url, lambda: _revalidate(url, cached))
+
+
+def _revalidate(url: str, cached: Optional[CacheEntry]) -> tuple[bytes, bool]:
+    """
+    Fetches url (conditionally if cached) and updates the cache.
+    """
+    now = time.time()
+    headers = {}
+    if cached is not None:
+        if cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+
+    r = api_limiter.request(lambda: transport.get(url, timeout=API_TIMEOUT, headers=headers))
+
+    if r.status_code == 304 and cached is not None:
+        _cache.put(url, CacheEntry(cached.body, cached.etag, cached.last_modified, now))
+        return cached.body, False
+
+    r.raise_for_status()
+    body = r.content
+    changed = cached is None or cached.body != body
+    _cache.put(url, CacheEntry(body, r.headers.get("ETag"), r.headers.get("Last-Modified"), now))
+    return body, changed
+
+
+def fetch_model_raw(model_id: int, max_age: Optional[float] = None) -> tuple[bytes, bool]:
+    """
+    Returns the raw model payload and whether it changed since the last fetch.
+    """
+    return fetch_cached(API_MODEL_URL.format(model_id), max_age=max_age)
+
+
+def get_version_info(version_id: Optional[int] = None, file_hash: Optional[str] = None) -> dict:
+    """
+    Returns a model version (with modelId and model name/type) by version
+    ID or by the hash of one of its files.
+
+    Raises:
+        RuntimeError: On API error
+    """
+    url = API_VERSION_URL.format(version_id) if version_id else API_VERSION_BY_HASH_URL.format(file_hash)
+    try:
+        raw, _ = fetch_cached(url)
+        return json.loads(raw)
+    except requests.exceptions.RequestException as e:
+        raise RuntimeError(f"API error: {e}")
+    except ValueError as e:
+        raise RuntimeError(f"Invalid version response: {e}")
+
 
 def get_model_metadata(model_id: int) -> dict:
     """
     Ruft Modell-Metadaten vom API ab.
-    
+
     Returns:
-        Dict with keys: name, image, versions (list), full_data (dict)
-    
+        Dict with keys: name, image, versions (list), full_data (ModelInfo)
+        modelVersions/full_data are compact records (see model_payload)
+
     Raises:
         RuntimeError: On API error
     """
     try:
-        r = requests.get(API_MODEL_URL.format(model_id), timeout=API_TIMEOUT)
-        r.raise_for_status()
-        data = r.json()
-        
+        raw, _ = fetch_model_raw(model_id)
+        data = parse_model_payload(raw)
+
         versions = [
             v.get("name", "")
             for v in data.get("modelVersions", [])
             if v.get("name")
         ]
-        
+
         return {
             "name": data.get("name", ""),
             "image": data.get("image", ""),
@@ -55,3 +252,50 @@ def get_model_versions(model_id: int) -> list[str]:
     metadata = get_model_metadata(model_id)
     return metadata["versions"]
 
+
+def iter_version_images(version_id: int, max_pages: int, per_page: int = 100) -> Iterator[dict]:
+    """
+    Yields the images of a version page by page from the image API
+    (cursor pagination, at most max_pages pages).
+
+    Raises:
+        RuntimeError: On API error
+    """
+    params = {"modelVersionId": version_id, "limit": per_page}
+
+    for _ in range(max_pages):
+        try:
+            raw, _ = fetch_cached(API_IMAGES_URL, params=params)
+            data = json.loads(raw)
+        except requests.exceptions.RequestException as e:
+            raise RuntimeError(f"API error: {e}")
+        except ValueError as e:
+            raise RuntimeError(f"Invalid image listing for version {version_id}: {e}")
+
+        yield from data.get("items", [])
+
+        cursor = (data.get("metadata") or {}).get("nextCursor")
+        if not cursor or not data.get("items"):
+            return
+        params = {**params, "cursor": cursor}
+
+
+def get_creator_model_ids(username: str, limit: int = 20, max_age: Optional[float] = None) -> list[int]:
+    """
+    Returns the IDs of the newest models of a creator.
+
+    Raises:
+        RuntimeError: On API error
+    """
+    try:
+        raw, _ = fetch_cached(
+            API_MODELS_URL,
+            max_age=max_age,
+            params={"username": username, "sort": "Newest", "limit": limit}
+        )
+        data = json.loads(raw)
+        return [item["id"] for item in data.get("items", []) if "id" in item]
+    except requests.exceptions.RequestException as e:
+        raise RuntimeError(f"API error: {e}")
+    except (ValueError, KeyError) as e:
+        raise RuntimeError(f"Invalid creator listing for {username}: {e}")
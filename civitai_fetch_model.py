@@ -5,25 +5,52 @@ AI Model Fetcher - Downloads models and metadata from AI model APIs.
 Note: Current implementation uses AI model platform (civitai.com) as the API provider
 """
 
-import requests
 import re
 import io
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import Optional
 from PIL import Image
 
+import civitai_api_helper as api_helper
+from output_sinks import OutputSink, LocalDirSink, SINK_MARKDOWN, SINK_IMAGES, write_file_stream
+from model_payload import ModelInfo, parse_model_payload
+from path_planner import PathPlan, PathPlanner, sanitize_filename
+from prompt_analytics import cluster_prompts, top_tokens
+from generation_stats import (
+    GenerationStats, NEGATIVE_PROMPT_FIELD_NAMES, SAMPLER_FIELD_NAMES, SCHEDULER_FIELD_NAMES, SIZE_FIELD_NAMES,
+)
+from image_policy import ImagePolicy, FETCH_ORIGINAL
+from image_dedupe import DedupeScope, DuplicateImage, ImageDeduplicator
+import transport
+from adaptive_concurrency import AdaptiveLimiter
+from single_flight import SingleFlight
+import scheduling
+from snapshots import SnapshotStore
+from dataset_export import DatasetExporter
+from resource_resolver import Resource, ResourceResolver
+from description_markdown import parse_description
+import video_media
+from video_media import MEDIA_VIDEO, VIDEO_POSTER, VIDEO_SKIP, DEFAULT_POSTER_PROBE_BYTES, VideoContent
+
 # =========================================================
 # CONFIGURATION & CONSTANTS
 # =========================================================
 
 API_MODEL_URL = "https://api.civitai.com/v1/models/{}"
 API_TIMEOUT = 30
-DEFAULT_IMAGE_PLACEHOLDER_COUNT = 2
 
-# Field names for metadata extraction (different API versions)
-SAMPLER_FIELD_NAMES = ["sampler", "samplerName", "Sampler"]
-SCHEDULER_FIELD_NAMES = ["scheduler", "schedulerName", "Scheduler"]
-SIZE_FIELD_NAMES = ["size", "resolution", "Size"]
+# Image CDN: path segments like /width=450/ or /original=true/ select the
+# variant the CDN delivers
+IMAGE_CDN_HOSTS = ("image.civitai.com",)
+_CDN_TRANSFORM_RE = re.compile(r"/(?:width=\d+|original=true|anim=false|transcode=true)(?:,[^/]*)?/")
+
+# Pseudo version name: fetch every version of a model in one go
+ALL_VERSIONS = "[All versions]"
+DEFAULT_VERSION_WORKERS = 4
 
 # Default directories (can be overridden)
 DEFAULT_BASE_DIR = Path(".")
@@ -33,6 +60,62 @@ DEFAULT_IMG_OUT_DIR = DEFAULT_BASE_DIR / "images"
 DEFAULT_MD_OUT_DIR.mkdir(parents=True, exist_ok=True)
 DEFAULT_IMG_OUT_DIR.mkdir(parents=True, exist_ok=True)
 
+# Coalesces concurrent downloads of the same image URL
+_image_flight = SingleFlight("images")
+# Adaptive limit of concurrent image downloads (shared by all versions)
+image_limiter = AdaptiveLimiter("images")
+DEFAULT_PREFETCH_CACHE_BYTES = 64 * 1024 * 1024
+# Read size of streamed image/video bodies
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+class ImageByteCache:
+    """
+    Bounded LRU cache of prefetched image bytes. Entries are consumed by
+    the download that uses them.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_PREFETCH_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self._size = 0
+        self.hits = 0
+
+    def put(self, url: str, content: bytes) -> None:
+        if len(content) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(url, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[url] = content
+            self._size += len(content)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def take(self, url: str) -> Optional[bytes]:
+        with self._lock:
+            content = self._entries.pop(url, None)
+            if content is not None:
+                self._size -= len(content)
+                self.hits += 1
+            return content
+
+    def __contains__(self, url: str) -> bool:
+        with self._lock:
+            return url in self._entries
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+# Filled by the GUI prefetcher (see prefetch.py)
+image_cache = ImageByteCache()
+
 # Template file location (relative to this script)
 TEMPLATE_FILE = Path(__file__).parent / "model_template.md"
 
@@ -53,6 +136,99 @@ def load_template() -> str:
     return TEMPLATE_FILE.read_text(encoding="utf-8")
 
 
+# Marker clean-up patterns (see CompiledTemplate.render)
+_BEGIN_MARKER_NL_RE = re.compile(r'<!-- BEGIN .+ -->\n')
+_END_MARKER_NL_RE = re.compile(r'<!-- END .+ -->\n')
+_BEGIN_MARKER_RE = re.compile(r'<!-- BEGIN .+ -->')
+_END_MARKER_RE = re.compile(r'<!-- END .+ -->')
+
+
+class CompiledTemplate:
+    """
+    Template with its <!-- BEGIN/END --> blocks located once up front.
+    Rendering the same template for many versions only does the
+    placeholder substitution.
+    """
+
+    def __init__(self, template: str):
+        self.template = template
+        # Parts are either ("text", text) or ("block", name, lead, content)
+        self.parts: list[tuple] = []
+
+        begin_re = re.compile(r"<!-- BEGIN (.+?) -->")
+        pos = 0
+        while True:
+            match = begin_re.search(template, pos)
+            if not match:
+                break
+
+            name = match.group(1)
+            end_marker = f"<!-- END {name} -->"
+            end_idx = template.find(end_marker, match.end())
+            if end_idx == -1:
+                break
+
+            # A line break after the BEGIN marker belongs to the marker line,
+            # not to every repeated item (keeps table rows consecutive)
+            content = template[match.end():end_idx]
+            lead = "\n" if content.startswith("\n") else ""
+            self.parts.append(("text", template[pos:match.start()]))
+            self.parts.append(("block", name, lead, content[len(lead):]))
+            pos = end_idx + len(end_marker)
+
+        self.parts.append(("text", template[pos:]))
+
+    @staticmethod
+    def _substitute(text: str, variables: dict) -> str:
+        for key, value in variables.items():
+            text = text.replace(f"{{{{{key}}}}}", str(value))
+        return text
+
+    def render(self, variables: dict, lists: dict) -> str:
+        """
+        Renders the template (see render_template for the format of the arguments).
+        """
+        rendered = []
+
+        for part in self.parts:
+            if part[0] == "text":
+                rendered.append(self._substitute(part[1], variables))
+                continue
+
+            _, name, lead, content = part
+            begin_marker = f"<!-- BEGIN {name} -->" + lead
+            end_marker = f"<!-- END {name} -->"
+            content = self._substitute(content, variables)
+
+            if name in lists:
+                content = "".join(
+                    self._substitute(content, item) for item in lists[name]
+                )
+
+            rendered.append(begin_marker + content + end_marker)
+
+        result = "".join(rendered)
+
+        # Post-processing: Remove all comment markers
+        # This prevents Obsidian media-slider plugin from treating them as errors
+        result = _BEGIN_MARKER_NL_RE.sub('', result)
+        result = _END_MARKER_NL_RE.sub('', result)
+        # Also handle cases without trailing newline
+        result = _BEGIN_MARKER_RE.sub('', result)
+        result = _END_MARKER_RE.sub('', result)
+
+        return result
+
+
+def compile_template(template: Optional[str] = None) -> CompiledTemplate:
+    """
+    Compiles a template string (default: model_template.md) for repeated rendering.
+    """
+    if template is None:
+        template = load_template()
+    return CompiledTemplate(template)
+
+
 def render_template(template: str, variables: dict, lists: dict) -> str:
     """
     Renders the template by replacing variables and filling repeated blocks.
@@ -67,53 +243,7 @@ def render_template(template: str, variables: dict, lists: dict) -> str:
     Returns:
         Rendered markdown string
     """
-    result = template
-    
-    # Replace simple variables
-    for key, value in variables.items():
-        placeholder = f"{{{{{key}}}}}"
-        result = result.replace(placeholder, str(value))
-    
-    # Replace repeated blocks
-    for section_name, items in lists.items():
-        begin_marker = f"<!-- BEGIN {section_name} -->"
-        end_marker = f"<!-- END {section_name} -->"
-        
-        # Find the block
-        begin_idx = result.find(begin_marker)
-        end_idx = result.find(end_marker)
-        
-        if begin_idx == -1 or end_idx == -1:
-            continue
-        
-        # Extract the block content (between markers)
-        block_start = begin_idx + len(begin_marker)
-        block_content = result[block_start:end_idx]
-        
-        # Render this block for each item in the list
-        rendered_items = []
-        for item in items:
-            item_text = block_content
-            # Replace variables for this item
-            for key, value in item.items():
-                placeholder = f"{{{{{key}}}}}"
-                item_text = item_text.replace(placeholder, str(value))
-            rendered_items.append(item_text)
-        
-        # Join all rendered items and replace the entire block (keep the markers)
-        full_block = begin_marker + block_content + end_marker
-        replacement = begin_marker + "".join(rendered_items) + end_marker
-        result = result.replace(full_block, replacement)
-    
-    # Post-processing: Remove all comment markers
-    # This prevents Obsidian media-slider plugin from treating them as errors
-    result = re.sub(r'<!-- BEGIN .+ -->\n', '', result)
-    result = re.sub(r'<!-- END .+ -->\n', '', result)
-    # Also handle cases without trailing newline
-    result = re.sub(r'<!-- BEGIN .+ -->', '', result)
-    result = re.sub(r'<!-- END .+ -->', '', result)
-    
-    return result
+    return CompiledTemplate(template).render(variables, lists)
 
 # =========================================================
 # GENERAL HELPER FUNCTIONS
@@ -125,64 +255,362 @@ def run(
     progress_callback=None,
     cancel_event=None,
     md_output_dir: Optional[Path] = None,
-    img_output_dir: Optional[Path] = None
+    img_output_dir: Optional[Path] = None,
+    version_workers: int = DEFAULT_VERSION_WORKERS,
+    write_index: bool = True,
+    sink: Optional[OutputSink] = None,
+    snapshots: Optional[SnapshotStore] = None,
+    stats_pages: int = 0,
+    image_policy: Optional[ImagePolicy] = None,
+    deduplicator: Optional[ImageDeduplicator] = None,
+    priority: "str | scheduling.PriorityHandle" = scheduling.PRIORITY_INTERACTIVE,
+    dataset: Optional[DatasetExporter] = None,
+    resolver: Optional[ResourceResolver] = None
 ):
     """
     Starts the fetch process for a model.
     
     Args:
         model_id: Model ID from the API platform
-        version_name: Name of the model version
+        version_name: Name of the model version (ALL_VERSIONS fetches every version)
         progress_callback: Callback for progress display (float: 0-100)
         cancel_event: threading.Event for cancellation
         md_output_dir: Output directory for Markdown (default: ./models)
         img_output_dir: Output directory for images (default: ./images)
+        version_workers: Parallel versions in ALL_VERSIONS mode
+        write_index: Write a model index note in ALL_VERSIONS mode
+        sink: Output sink (default: local md/img output directories)
+        snapshots: Snapshot store for offline re-rendering (default: none)
+        stats_pages: Image API pages aggregated into the parameter statistics
+                     (0 = only the images of the model payload)
+        image_policy: Selects the images to download (default: all)
+        deduplicator: Near-duplicate image detection (default: none)
+        priority: Priority class of all requests, or a scheduling.PriorityHandle
+                  to raise it while running (see scheduling.py)
+        dataset: Columnar export of the per-image generation data (default: none)
+        resolver: Resolves (and optionally fetches) used resources (default: names only)
     """
     if md_output_dir is None:
         md_output_dir = DEFAULT_MD_OUT_DIR
     if img_output_dir is None:
         img_output_dir = DEFAULT_IMG_OUT_DIR
-    
-    main(
-        model_id,
-        version_name,
-        progress_callback=progress_callback,
-        cancel_event=cancel_event,
-        md_output_dir=md_output_dir,
-        img_output_dir=img_output_dir
-    )
+
+    with scheduling.priority_class(priority):
+        if version_name == ALL_VERSIONS:
+            return fetch_all_versions(
+                model_id,
+                progress_callback=progress_callback,
+                cancel_event=cancel_event,
+                md_output_dir=md_output_dir,
+                img_output_dir=img_output_dir,
+                max_workers=version_workers,
+                write_index=write_index,
+                sink=sink,
+                snapshots=snapshots,
+                stats_pages=stats_pages,
+                image_policy=image_policy,
+                deduplicator=deduplicator,
+                dataset=dataset,
+                resolver=resolver
+            )
+
+        return main(
+            model_id,
+            version_name,
+            progress_callback=progress_callback,
+            cancel_event=cancel_event,
+            md_output_dir=md_output_dir,
+            img_output_dir=img_output_dir,
+            sink=sink,
+            snapshots=snapshots,
+            stats_pages=stats_pages,
+            image_policy=image_policy,
+            deduplicator=deduplicator,
+            dataset=dataset,
+            resolver=resolver
+        )
 
 
-def sanitize_filename(text: str) -> str:
+@contextmanager
+def open_media_stream(url: str, headers: Optional[dict] = None):
     """
-    Removes problematic characters from filenames.
+    Streamed GET of an image or video; yields the response after the headers
+    arrived. The image limiter slot is held until the with block ends, so
+    read the body inside it with iter_body().
     """
-    return re.sub(r"[^\w\d\-_ ]", "_", text).strip()
+    with image_limiter.stream(
+        lambda: transport.get(url, timeout=API_TIMEOUT, headers=headers, stream=True)
+    ) as response:
+        response.raise_for_status()
+        yield response
 
 
-def download_image(url: str, target_base: Path) -> str | None:
+def iter_body(response, limit: int = 0):
     """
-    Downloads an image and saves it in the appropriate format.
-    Returns: filename or None on error.
+    Yields the body of a streamed response in chunks (at most limit bytes
+    if given) under the bandwidth cap, and closes the response.
     """
+    read = 0
     try:
-        response = requests.get(url, timeout=API_TIMEOUT)
-        response.raise_for_status()
+        for chunk in response.iter_content(STREAM_CHUNK_BYTES):
+            if limit:
+                chunk = chunk[:limit - read]
+            read += len(chunk)
+            scheduling.throttle(len(chunk))
+            yield chunk
+            if limit and read >= limit:
+                break
+    finally:
+        response.close()
+
+
+def fetch_image_bytes(url: str) -> bytes:
+    """
+    Downloads the raw bytes of an image (prefetched bytes are used if present).
 
-        img = Image.open(io.BytesIO(response.content))
+    Raises:
+        VideoContent: If the URL serves a video (detected before the body is read)
+    """
+    content = image_cache.take(url)
+    if content is not None:
+        if video_media.sniff_media_kind(content) == MEDIA_VIDEO:
+            raise VideoContent(url)
+        return content
 
-        if getattr(img, "is_animated", False):
-            out_file = target_base.with_suffix(".gif")
-            img.save(out_file, save_all=True)
-        elif img.mode in ("RGBA", "P"):
-            out_file = target_base.with_suffix(".png")
-            img.save(out_file)
-        else:
-            out_file = target_base.with_suffix(".jpeg")
-            img.convert("RGB").save(out_file, quality=95)
+    with open_media_stream(url) as response:
+        content_type = response.headers.get("Content-Type", "")
+        if video_media.media_kind(content_type, url) == MEDIA_VIDEO:
+            raise VideoContent(url, content_type)
+        return b"".join(iter_body(response))
+
+
+def _replace_cdn_transform(url: str, segment: str) -> str:
+    if _CDN_TRANSFORM_RE.search(url):
+        return _CDN_TRANSFORM_RE.sub(segment, url, count=1)
+    # No transform yet: insert it before the filename
+    head, _, filename = url.rpartition("/")
+    return f"{head}{segment}{filename}"
+
+
+def cdn_image_url(url: str, width: int) -> str:
+    """
+    Rewrites an image CDN URL to request a variant scaled to width pixels
+    (FETCH_ORIGINAL: the full-resolution original). URLs of other hosts
+    and width 0 are returned unchanged.
+    """
+    parts = url.split("/")
+    if width == 0 or len(parts) < 5 or parts[2] not in IMAGE_CDN_HOSTS:
+        return url
+
+    segment = "/original=true/" if width == FETCH_ORIGINAL else f"/width={width}/"
+    return _replace_cdn_transform(url, segment)
+
+
+def cdn_poster_url(url: str, width: int = 0) -> str:
+    """
+    Rewrites an image CDN video URL to its still variant (first frame as
+    JPEG, scaled to width pixels if given). URLs of other hosts are
+    returned unchanged.
+    """
+    parts = url.split("/")
+    if len(parts) < 5 or parts[2] not in IMAGE_CDN_HOSTS:
+        return url
+
+    segment = f"/anim=false,width={width}/" if width > 0 else "/anim=false/"
+    head, _, filename = _replace_cdn_transform(url, segment).rpartition("/")
+    return f"{head}/{filename.rsplit('.', 1)[0]}.jpeg"
+
+
+def fetch_image(url: str, width: int = 0) -> Image.Image:
+    """
+    Downloads and opens an image. With a width (or FETCH_ORIGINAL), that CDN
+    variant is tried first and the URL as given is the fallback.
+
+    Raises:
+        VideoContent: If the URL serves a video
+    """
+    candidates = [cdn_image_url(url, width), url]
+
+    for candidate in dict.fromkeys(candidates):
+        try:
+            content = _image_flight.do(candidate, lambda: fetch_image_bytes(candidate))
+            img = Image.open(io.BytesIO(content))
+            if not getattr(img, "is_animated", False):
+                # Decode now, so a broken scaled variant falls back to the original
+                img.load()
+            return img
+        except VideoContent:
+            raise
+        except Exception as e:
+            if candidate == url:
+                raise
+            print(f"[WARN] Image variant not available, using {url}: {candidate} ({e})")
+
+    raise ValueError(f"No image URL: {url}")
+
+
+def fetch_poster_frame(url: str, width: int = 0, probe_bytes: int = DEFAULT_POSTER_PROBE_BYTES) -> bytes:
+    """
+    Returns a still frame of a video as image bytes: decoded by ffmpeg from
+    the leading bytes of the clip (ranged requests, extended once if the
+    first range holds no complete frame), else the still variant of the
+    image CDN.
+
+    Raises:
+        ValueError: If neither way yields a frame
+    """
+    if video_media.ffmpeg_path():
+        data = b""
+        limit = probe_bytes
+        try:
+            while True:
+                with open_media_stream(url, headers={"Range": f"bytes={len(data)}-{limit - 1}"}) as response:
+                    if response.status_code != 206:
+                        # Range ignored: the body starts at byte 0
+                        data = b""
+                    data += b"".join(iter_body(response, limit - len(data)))
+
+                frame = video_media.extract_poster_frame(data)
+                if frame:
+                    return frame
+                # Whole clip read, or the larger range did not help either
+                if len(data) < limit or limit >= probe_bytes * video_media.POSTER_PROBE_GROWTH:
+                    break
+                limit *= video_media.POSTER_PROBE_GROWTH
+        except Exception as e:
+            print(f"[WARN] Leading video bytes not available: {url} ({e})")
+
+    poster_url = cdn_poster_url(url, width)
+    if poster_url == url:
+        raise ValueError(f"No poster frame for {url} (ffmpeg not available or no frame in the leading bytes)")
+    return _image_flight.do(poster_url, lambda: fetch_image_bytes(poster_url))
+
+
+def save_image(
+    img: Image.Image,
+    target_base: Path,
+    sink: Optional[OutputSink] = None,
+    dedupe: Optional[DedupeScope] = None,
+    image_key: Optional[str] = None
+) -> str:
+    """
+    Encodes an image in the appropriate format and saves it.
+    image_key identifies the image for dedupe across runs (its URL).
+    Returns: filename.
+
+    Raises:
+        DuplicateImage: If dedupe drops the image as a near-duplicate
+    """
+    buffer = io.BytesIO()
+
+    if getattr(img, "is_animated", False):
+        out_file = target_base.with_suffix(".gif")
+    elif img.mode in ("RGBA", "P"):
+        out_file = target_base.with_suffix(".png")
+    else:
+        out_file = target_base.with_suffix(".jpeg")
+
+    # Checked before encoding, so dropped images cost no further work
+    if dedupe is not None:
+        dedupe.check(img, out_file.name, image_key)
+
+    if out_file.suffix == ".gif":
+        img.save(buffer, format="GIF", save_all=True)
+    elif out_file.suffix == ".png":
+        img.save(buffer, format="PNG")
+    else:
+        img.convert("RGB").save(buffer, format="JPEG", quality=95)
+
+    if sink is None:
+        out_file.parent.mkdir(parents=True, exist_ok=True)
+        out_file.write_bytes(buffer.getvalue())
+    else:
+        sink.write_bytes(SINK_IMAGES, out_file, buffer.getvalue())
+
+    return out_file.name
+
+
+def download_video(
+    url: str,
+    target_base: Path,
+    sink: Optional[OutputSink] = None,
+    dedupe: Optional[DedupeScope] = None,
+    width: int = 0,
+    video_mode: str = VIDEO_POSTER,
+    probe_bytes: int = DEFAULT_POSTER_PROBE_BYTES
+) -> str | None:
+    """
+    Saves a video sample according to the video mode: a poster frame
+    (JPEG), the clip itself (streamed to the sink chunk by chunk) or nothing.
+
+    Returns: filename or None if skipped.
+
+    Raises:
+        DuplicateImage: If dedupe drops the poster frame as a near-duplicate
+    """
+    if video_mode == VIDEO_SKIP:
+        print(f"[SKIP] Video not saved (video mode '{VIDEO_SKIP}'): {url}")
+        return None
 
-        return out_file.name
+    if video_mode == VIDEO_POSTER:
+        img = Image.open(io.BytesIO(fetch_poster_frame(url, width, probe_bytes)))
+        img.load()
+        return save_image(img, target_base, sink, dedupe, url)
+
+    with open_media_stream(url) as response:
+        out_file = target_base.with_suffix(video_media.video_suffix(response.headers.get("Content-Type"), url))
+        chunks = iter_body(response)
+        try:
+            if sink is None:
+                write_file_stream(out_file, chunks)
+            else:
+                sink.write_stream(SINK_IMAGES, out_file, chunks)
+        finally:
+            chunks.close()
+    return out_file.name
+
+
+def download_image(
+    url: str,
+    target_base: Path,
+    sink: Optional[OutputSink] = None,
+    dedupe: Optional[DedupeScope] = None,
+    width: int = 0,
+    media_type: str = "",
+    video_mode: str = VIDEO_POSTER,
+    probe_bytes: int = DEFAULT_POSTER_PROBE_BYTES
+) -> str | None:
+    """
+    Downloads an image and saves it in the appropriate format. Videos
+    (by media_type or detected from the response headers) are handled per
+    video_mode, see download_video().
+
+    Args:
+        url: Image URL
+        target_base: Target path without suffix (relative to the image root if a sink is given)
+        sink: Output sink (default: write to target_base directly)
+        dedupe: Near-duplicate check of the version (default: none)
+        width: CDN variant to fetch: width in pixels, FETCH_ORIGINAL or 0 (as given by url)
+        media_type: Media type from the payload ("image"/"video"; default: detect)
+        video_mode: VIDEO_POSTER, VIDEO_FULL or VIDEO_SKIP
+        probe_bytes: Leading bytes fetched for a poster frame
+
+    Returns: filename or None on error.
 
+    Raises:
+        DuplicateImage: If dedupe drops the image as a near-duplicate
+    """
+    try:
+        if media_type == MEDIA_VIDEO:
+            return download_video(url, target_base, sink, dedupe, width, video_mode, probe_bytes)
+        try:
+            img = fetch_image(url, width)
+        except VideoContent:
+            return download_video(url, target_base, sink, dedupe, width, video_mode, probe_bytes)
+        return save_image(img, target_base, sink, dedupe, url)
+
+    except DuplicateImage:
+        raise
     except Exception as e:
         print(f"[WARN] Image could not be downloaded: {url} ({e})")
         return None
@@ -244,7 +672,7 @@ def extract_prompts(images: list[dict]) -> tuple[list[str], list[str]]:
         meta = img.get("meta") or {}
 
         pos = meta.get("prompt")
-        neg = meta.get("negativePrompt") or meta.get("negativeprompt") or meta.get("negative_prompt")
+        neg = next((meta.get(f) for f in NEGATIVE_PROMPT_FIELD_NAMES if meta.get(f)), None)
 
         if pos:
             pos = str(pos).strip()
@@ -261,6 +689,52 @@ def extract_prompts(images: list[dict]) -> tuple[list[str], list[str]]:
     return positive, negative
 
 
+def extract_image_prompts(images: list[dict]) -> tuple[list[str], list[str]]:
+    """
+    Returns the positive and negative prompt of every image (not deduplicated),
+    e.g. for clustering and token statistics.
+    """
+    positive, negative = [], []
+
+    for img in images:
+        meta = img.get("meta") or {}
+
+        pos = str(meta.get("prompt") or "").strip()
+        neg = str(next((meta.get(f) for f in NEGATIVE_PROMPT_FIELD_NAMES if meta.get(f)), "")).strip()
+
+        if pos:
+            positive.append(pos)
+        if neg:
+            negative.append(neg)
+
+    return positive, negative
+
+
+def collect_generation_stats(version: dict, deep_pages: int = 0) -> GenerationStats:
+    """
+    Aggregates the generation parameters of a version's images.
+
+    Args:
+        version: Version entry from data["modelVersions"]
+        deep_pages: Aggregate up to this many pages of the image API instead
+                    of only the images embedded in the model payload
+
+    Returns:
+        GenerationStats (payload images if the image API fails)
+    """
+    if deep_pages > 0 and version.get("id") is not None:
+        stats = GenerationStats()
+        try:
+            for img in api_helper.iter_version_images(version.get("id"), deep_pages):
+                stats.add(img.get("meta"))
+            if stats.images:
+                return stats
+        except RuntimeError as e:
+            print(f"[WARN] Image pages of version '{version.get('name', '')}' could not be fetched: {e}")
+
+    return GenerationStats().add_images(version.get("images", []))
+
+
 def extract_loras(version: dict) -> list[str]:
     """
     Extracts recommended LoRAs from training information.
@@ -323,92 +797,252 @@ def render_file_tables(files: list[dict]) -> str:
     return md
 
 # =========================================================
-# MAIN
+# FETCH PIPELINE
 # =========================================================
 
-def main(
-    model_id: int,
-    version_name: str,
-    progress_callback=None,
-    cancel_event=None,
-    md_output_dir: Optional[Path] = None,
-    img_output_dir: Optional[Path] = None
-):
+def fetch_model_data(model_id: int, version_name: Optional[str] = None) -> tuple[bytes, ModelInfo]:
     """
-    Main function to fetch and save AI model data and documentation.
+    Downloads the model payload from the API (through the metadata cache) and
+    parses it into compact records. If version_name is given, only that
+    version keeps its images and files.
+
+    Returns: (raw payload, parsed model)
     """
-    if md_output_dir is None:
-        md_output_dir = DEFAULT_MD_OUT_DIR
-    if img_output_dir is None:
-        img_output_dir = DEFAULT_IMG_OUT_DIR
-    
-    # Ensure directories exist
-    md_output_dir.mkdir(parents=True, exist_ok=True)
-    img_output_dir.mkdir(parents=True, exist_ok=True)
-    
-    # -------- Fetch from API --------
-    response = requests.get(API_MODEL_URL.format(model_id), timeout=API_TIMEOUT)
-    response.raise_for_status()
-    data = response.json()
+    raw, _ = api_helper.fetch_model_raw(model_id)
+    return raw, parse_model_payload(raw, version_name)
 
-    model_name = data.get("name", "")
-    model_type = data.get("type", "")
-    base_model = data.get("baseModel") or ""
 
-    # -------- Find version --------
-    version = next(
+def find_version(data: dict, version_name: str) -> Optional[dict]:
+    """
+    Returns the version with the given name (case-insensitive) or None.
+    """
+    return next(
         (v for v in data.get("modelVersions", [])
          if v.get("name", "").lower() == version_name.lower()),
         None
     )
 
-    if not version:
-        print(f"[ERROR] Version '{version_name}' not found.")
-        return
 
-    # -------- Save images --------
-    model_img_dir = img_output_dir / sanitize_filename(model_name)
-    version_img_dir = model_img_dir / sanitize_filename(version.get("name", ""))
-    version_img_dir.mkdir(parents=True, exist_ok=True)
+def clean_description(description: str, image_names: Optional[dict[str, str]] = None) -> str:
+    """
+    Converts the model description HTML to Markdown for the note.
+    Embedded images found in image_names (saved filename by URL) become
+    local embeds, the others stay remote.
+    """
+    return parse_description(description).render(image_names)
+
+
+def download_description_images(
+    urls: list[str],
+    bases: list[Path],
+    sink: OutputSink,
+    cancel_event=None,
+    width: int = 0
+) -> dict[str, str]:
+    """
+    Downloads the images embedded in the model description into the sink
+    (same limiter, cache and single-flight as the sample images).
+
+    Returns: saved filename by image URL.
+    """
+    def fetch(url: str, base: Path) -> Optional[str]:
+        if cancel_event and cancel_event.is_set():
+            return None
+        return download_image(url, base, sink, width=width)
+
+    saved: dict[str, str] = {}
+    with ThreadPoolExecutor(max_workers=min(len(urls), image_limiter.max_limit) or 1) as executor:
+        fetch = scheduling.propagate(fetch)
+        for url, name in zip(urls, executor.map(fetch, urls, bases)):
+            if name:
+                saved[url] = name
+    if urls:
+        print(f"[OK] Description images saved: {len(saved)}/{len(urls)}")
+    return saved
+
+
+def localize_description(
+    data: dict,
+    model_id: int,
+    planner: PathPlanner,
+    sink: OutputSink,
+    policy: Optional[ImagePolicy] = None,
+    cancel_event=None
+) -> tuple[str, dict[str, str]]:
+    """
+    Converts the model description and downloads its embedded images
+    (unless the image policy turns that off).
+
+    Returns: (Markdown description, saved filename by image URL)
+    """
+    document = parse_description(data.get("description", ""))
+    if not document.image_urls or (policy and not policy.localize_description):
+        return document.render(), {}
+
+    bases = planner.plan_description(data.get("name", ""), len(document.image_urls), model_id)
+    image_names = download_description_images(
+        document.image_urls, bases, sink, cancel_event, policy.target_width if policy else 0
+    )
+    return document.render(image_names), image_names
 
+
+def select_images(version: dict, policy: Optional[ImagePolicy] = None) -> list:
+    """
+    Returns the images of a version that should be downloaded.
+    """
     images = version.get("images", [])
-    saved_images = []
+    if policy is None:
+        return list(images)
+
+    selected = policy.select(images)
+    if len(selected) < len(images):
+        print(f"[INFO] Version '{version.get('name', '')}': {len(selected)} of {len(images)} images selected")
+    return selected
 
+
+def download_version_images(
+    version: dict,
+    plan: PathPlan,
+    sink: OutputSink,
+    progress_callback=None,
+    cancel_event=None,
+    images: Optional[list] = None,
+    dedupe: Optional[DedupeScope] = None,
+    policy: Optional[ImagePolicy] = None
+) -> list[str]:
+    """
+    Downloads the sample images of a version into the sink.
+    Target paths come from the precomputed plan.
+
+    Args:
+        images: Selected images (default: all images of the version)
+        dedupe: Near-duplicate check of the version (default: none)
+        policy: Image policy (target width and video mode of the downloads; default: URL as given, poster frames)
+
+    Returns: list of saved filenames.
+    """
+    if images is None:
+        images = version.get("images", [])
     total = len(images)
 
-    for idx, img in enumerate(images, 1):
+    def fetch(idx: int, img) -> Optional[str]:
         url = img.get("url")
         if not url:
             print(f"[SKIP] Image {idx}/{total}: no URL")
-            continue
+            return None
+        if cancel_event and cancel_event.is_set():
+            return None
 
         print(f"[INFO] Downloading image {idx}/{total} ...")
-
-        base_name = f"{sanitize_filename(model_name)}_{sanitize_filename(version.get('name',''))}_{idx}"
-        saved = download_image(url, version_img_dir / base_name)
+        try:
+            saved = download_image(
+                url, plan.image_bases[idx - 1], sink, dedupe,
+                policy.fetch_width(idx - 1) if policy else 0,
+                media_type=(img.get("type") or "").lower(),
+                video_mode=policy.video_mode if policy else VIDEO_POSTER,
+                probe_bytes=policy.poster_probe_bytes if policy else DEFAULT_POSTER_PROBE_BYTES
+            )
+        except DuplicateImage as e:
+            print(f"[SKIP] Image {idx}/{total}: {e}")
+            return None
 
         if saved:
-            saved_images.append(saved)
             print(f"[OK] Image saved: {saved}")
         else:
             print(f"[WARN] Image {idx}/{total} could not be saved")
+        return saved
+
+    # Downloads run in parallel; image_limiter decides how many at a time
+    results: list[Optional[str]] = [None] * total
+    if total:
+        with ThreadPoolExecutor(max_workers=min(total, image_limiter.max_limit)) as executor:
+            fetch = scheduling.propagate(fetch)
+            futures = {executor.submit(fetch, idx, img): idx for idx, img in enumerate(images, 1)}
+            for done, future in enumerate(as_completed(futures), 1):
+                results[futures[future] - 1] = future.result()
+
+                # Fortschritt für Progressbar nur über Callback
+                if progress_callback:
+                    progress_callback((done / total) * 100)
+
+                # Check for cancellation
+                if cancel_event and cancel_event.is_set():
+                    print("[WARN] Download cancelled")
+                    for pending in futures:
+                        pending.cancel()
+                    break
+
+    # Keep the image order of the version
+    saved_images = [saved for saved in results if saved]
+    return saved_images
+
+
+def export_version_images(
+    dataset: DatasetExporter,
+    model_id: int,
+    model_name: str,
+    version: dict,
+    images: list,
+    saved_images: list[str],
+    plan: PathPlan
+) -> None:
+    """
+    Adds a version's images to the dataset export, each with the path it
+    was saved under (relative to the image root; None if not saved).
+    """
+    saved_by_base = {name.rsplit(".", 1)[0]: name for name in saved_images}
+    image_paths = []
+    for base in plan.image_bases[:len(images)]:
+        name = saved_by_base.get(base.name)
+        image_paths.append(base.with_name(name).as_posix() if name else None)
+    dataset.add_version(model_id, model_name, version, images, image_paths)
+
+
+def build_note(
+    data: dict,
+    version: dict,
+    saved_images: list[str],
+    model_id: int,
+    template: Optional[CompiledTemplate] = None,
+    description: Optional[str] = None,
+    plan: Optional[PathPlan] = None,
+    stats: Optional[GenerationStats] = None,
+    resources: Optional[list[Resource]] = None
+) -> str:
+    """
+    Renders the markdown note of a version.
 
-        # Fortschritt für Progressbar nur über Callback
-        if progress_callback:
-            percent = (idx / total) * 100 if total else 0
-            progress_callback(percent)
+    Args:
+        data: Model payload from the API
+        version: Version entry from data["modelVersions"]
+        saved_images: Filenames of the downloaded sample images
+        model_id: Model ID from the API platform
+        template: Compiled template (default: model_template.md)
+        description: Cleaned description (default: cleaned data["description"])
+        plan: Output paths of the version (provides the sanitized model name)
+        stats: Generation parameter statistics (default: from the version images)
+        resources: Resolved resources (default: unresolved names from the files)
+    """
+    if template is None:
+        template = compile_template()
+    if description is None:
+        description = clean_description(data.get("description", ""))
 
-        # Check for cancellation
-        if cancel_event and cancel_event.is_set():
-            print("[WARN] Download cancelled")
-            break
+    model_name = data.get("name", "")
+    model_type = data.get("type", "")
+    base_model = data.get("baseModel") or ""
 
+    images = version.get("images", [])
 
     # -------- Collect metadata --------
     samplers = extract_sampler_scheduler(images)
     resolutions = extract_resolutions(images)
     pos_prompts, neg_prompts = extract_prompts(images)
-    loras = extract_loras(version)
+    image_pos_prompts, image_neg_prompts = extract_image_prompts(images)
+    if resources is None:
+        resources = [Resource(name=name) for name in extract_loras(version)]
+    if stats is None:
+        stats = GenerationStats().add_images(images)
     files_data = version.get("files", [])
 
     # =========================================================
@@ -419,18 +1053,14 @@ def main(
     
     # Prepare simple variables for template
     variables = {
-        "sanitized_model_name": sanitize_filename(model_name),
+        "sanitized_model_name": plan.sanitized_model_name if plan else sanitize_filename(model_name),
         "model_name": model_name,
         "base_model": base_model,
         "model_type": model_type,
         "version": version_str,
         "civitai_id": model_id,
-        "description": re.sub(
-            r'<edge-media[^>]*>',
-            '',
-            data.get("description", "").strip(),
-            flags=re.IGNORECASE
-        )
+        "description": description,
+        **stats.template_variables()
     }
     
     # Prepare lists for repeated blocks
@@ -461,9 +1091,27 @@ def main(
         {"prompt_text": n} for n in neg_prompts
     ]
     
-    # LoRAs
+    # Prompt analytics: frequent tokens and near-duplicate prompts collapsed
+    lists["PROMPT_TOKENS"] = [
+        {"token": token, "token_count": count} for token, count in top_tokens(image_pos_prompts)
+    ]
+    lists["PROMPT_CLUSTERS"] = [
+        {"prompt_text": c.prompt, "prompt_count": c.count} for c in cluster_prompts(image_pos_prompts)
+    ]
+    lists["NEGATIVE_PROMPT_CLUSTERS"] = [
+        {"prompt_text": c.prompt, "prompt_count": c.count} for c in cluster_prompts(image_neg_prompts)
+    ]
+
+    # LoRAs and other resources (links to their notes where available)
     lists["LORAS"] = [
-        {"lora_name": l} for l in loras
+        {
+            "lora_name": r.display_name,
+            "lora_link": r.link(),
+            "lora_url": r.url,
+            "lora_type": r.type,
+            "lora_uses": r.uses,
+        }
+        for r in resources
     ]
     
     # Files
@@ -494,20 +1142,349 @@ def main(
     
     lists["FILES"] = files_list
     
-    # Load and render template
-    template = load_template()
-    md = render_template(template, variables, lists)
-
-    # -------- Save --------
-    # Create model-specific directory for markdown files
-    model_dir = md_output_dir / sanitize_filename(model_name)
-    model_dir.mkdir(parents=True, exist_ok=True)
+    return template.render(variables, lists)
+
+
+def resolve_resources(
+    resolver: ResourceResolver,
+    version: dict,
+    model_id: int,
+    depth: int,
+    **fetch_kwargs
+) -> list[Resource]:
+    """
+    Resolves the resources of a version, fetches the notes of its
+    dependencies (within the resolver's depth/breadth limits, each version
+    once) and sets the link targets.
+
+    fetch_kwargs are passed to main() for the dependency fetches.
+    """
+    resources = resolver.resolve(version, model_id)
+    cancel_event = fetch_kwargs.get("cancel_event")
+
+    for resource in resolver.dependencies(resources, depth):
+        if cancel_event and cancel_event.is_set():
+            break
+        if not resolver.claim(resource.version_id):
+            continue
+        print(f"[INFO] Fetching resource {resource.display_name} (level {depth + 1})")
+        try:
+            main(
+                resource.model_id,
+                resource.version_name,
+                resolver=resolver,
+                depth=depth + 1,
+                **fetch_kwargs
+            )
+        except Exception as e:
+            print(f"[WARN] Resource {resource.display_name} could not be fetched: {e}")
+
+    resolver.link_targets(resources, fetch_kwargs.get("snapshots"))
+    return resources
+
+
+def save_note(md: str, plan: PathPlan, sink: OutputSink) -> str:
+    """
+    Writes a version note into the model-specific markdown directory.
+    Returns: location of the written note.
+    """
+    return sink.write_text(SINK_MARKDOWN, plan.note_relpath, md)
+
+
+def render_model_index(data: dict, model_id: int, notes: list[tuple[str, PathPlan]]) -> str:
+    """
+    Renders the index note of a model linking all version notes.
+
+    Args:
+        data: Model payload from the API
+        model_id: Model ID from the API platform
+        notes: List of (version name, path plan) of the versions with a note
+    """
+    model_name = data.get("name", "")
+
+    md = f"""---
+filename: {sanitize_filename(model_name)}
+base_model: {data.get("baseModel") or ""}
+model_type: {data.get("type", "")}
+civitai_id: {model_id}
+---
+
+## 📚 Versions
+
+"""
+    for version_name, plan in notes:
+        md += f"- [[{plan.note_stem}|{version_name}]]\n"
+
+    return md
+
+
+# =========================================================
+# MAIN
+# =========================================================
+
+def main(
+    model_id: int,
+    version_name: str,
+    progress_callback=None,
+    cancel_event=None,
+    md_output_dir: Optional[Path] = None,
+    img_output_dir: Optional[Path] = None,
+    sink: Optional[OutputSink] = None,
+    planner: Optional[PathPlanner] = None,
+    snapshots: Optional[SnapshotStore] = None,
+    stats_pages: int = 0,
+    image_policy: Optional[ImagePolicy] = None,
+    deduplicator: Optional[ImageDeduplicator] = None,
+    dataset: Optional[DatasetExporter] = None,
+    resolver: Optional[ResourceResolver] = None,
+    depth: int = 0
+) -> Optional[str]:
+    """
+    Main function to fetch and save AI model data and documentation.
+    If a snapshot store is given, the raw payload and the version manifest
+    are kept for offline re-rendering. With a resolver, the notes of used
+    resources are fetched first (depth = dependency level of this version).
+    Returns: location of the created markdown file or None.
+    """
+    if md_output_dir is None:
+        md_output_dir = DEFAULT_MD_OUT_DIR
+    if img_output_dir is None:
+        img_output_dir = DEFAULT_IMG_OUT_DIR
+    if sink is None:
+        sink = LocalDirSink(md_output_dir, img_output_dir)
+    if planner is None:
+        planner = PathPlanner()
     
-    out_file = model_dir / f"{sanitize_filename(model_name)}{version_str}.md"
-    out_file.write_text(md, encoding="utf-8")
+    # -------- Fetch from API --------
+    raw, data = fetch_model_data(model_id, version_name)
+    model_name = data.get("name", "")
+
+    # -------- Find version --------
+    version = find_version(data, version_name)
+
+    if not version:
+        print(f"[ERROR] Version '{version_name}' not found.")
+        return None
+
+    # -------- Select images & plan output paths --------
+    images = select_images(version, image_policy)
+    plan = planner.plan_version(model_name, version.get("name", ""), len(images), model_id)
+    if resolver:
+        resolver.claim(version.get("id"))
+        resolver.register_note(version.get("id"), plan.note_stem)
+
+    # -------- Save images (description images alongside) --------
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        description_future = executor.submit(
+            scheduling.propagate(localize_description),
+            data, model_id, planner, sink, image_policy, cancel_event
+        )
+        saved_images = download_version_images(
+            version,
+            plan,
+            sink,
+            progress_callback=progress_callback,
+            cancel_event=cancel_event,
+            images=images,
+            dedupe=deduplicator.scope(version.get("id")) if deduplicator else None,
+            policy=image_policy
+        )
+        description, description_images = description_future.result()
+
+    if dataset:
+        export_version_images(dataset, model_id, model_name, version, images, saved_images, plan)
+
+    # -------- Resources --------
+    resources = None
+    if resolver:
+        resources = resolve_resources(
+            resolver, version, model_id, depth,
+            cancel_event=cancel_event,
+            md_output_dir=md_output_dir,
+            img_output_dir=img_output_dir,
+            sink=sink,
+            planner=planner,
+            snapshots=snapshots,
+            stats_pages=stats_pages,
+            image_policy=image_policy,
+            deduplicator=deduplicator,
+            dataset=dataset
+        )
+
+    # -------- Render & save --------
+    stats = collect_generation_stats(version, stats_pages)
+    md = build_note(
+        data, version, saved_images, model_id,
+        description=description, plan=plan, stats=stats, resources=resources
+    )
+    out_file = save_note(md, plan, sink)
+    sink.flush()
+
+    if snapshots:
+        snapshots.save_payload(model_id, raw)
+        snapshots.save_manifest(
+            model_id, version, saved_images, plan, stats if stats_pages > 0 else None, resources, description_images
+        )
 
     print(f"[OK] Markdown created: {out_file}")
     print(f"Done!")
+    return out_file
+
+
+def fetch_all_versions(
+    model_id: int,
+    progress_callback=None,
+    cancel_event=None,
+    md_output_dir: Optional[Path] = None,
+    img_output_dir: Optional[Path] = None,
+    max_workers: int = DEFAULT_VERSION_WORKERS,
+    write_index: bool = True,
+    sink: Optional[OutputSink] = None,
+    planner: Optional[PathPlanner] = None,
+    snapshots: Optional[SnapshotStore] = None,
+    stats_pages: int = 0,
+    image_policy: Optional[ImagePolicy] = None,
+    deduplicator: Optional[ImageDeduplicator] = None,
+    dataset: Optional[DatasetExporter] = None,
+    resolver: Optional[ResourceResolver] = None
+) -> list[str]:
+    """
+    Fetches every version of a model.
+
+    The model payload is downloaded once; the description (with its
+    images, downloaded alongside the versions) and the template compilation
+    are shared, and the versions are processed in parallel. Writes one note per version plus an optional model index note.
+
+    Returns: locations of the created markdown files (index note last).
+    """
+    if md_output_dir is None:
+        md_output_dir = DEFAULT_MD_OUT_DIR
+    if img_output_dir is None:
+        img_output_dir = DEFAULT_IMG_OUT_DIR
+    if sink is None:
+        sink = LocalDirSink(md_output_dir, img_output_dir)
+    if planner is None:
+        planner = PathPlanner()
+
+    # -------- Shared model-level work --------
+    raw, data = fetch_model_data(model_id)
+    if snapshots:
+        snapshots.save_payload(model_id, raw)
+    model_name = data.get("name", "")
+    versions = [v for v in data.get("modelVersions", []) if v.get("name")]
+
+    if not versions:
+        print(f"[ERROR] No versions found for model {model_id}.")
+        return []
+
+    print(f"[INFO] Fetching {len(versions)} versions of {model_name}")
+
+    template = compile_template()
+
+    # Images are selected and all paths planned up front, so colliding
+    # version names are detected before anything is downloaded
+    selected = [select_images(v, image_policy) for v in versions]
+    plans = [
+        planner.plan_version(model_name, v.get("name", ""), len(images), model_id)
+        for v, images in zip(versions, selected)
+    ]
+    if resolver:
+        for v, plan in zip(versions, plans):
+            resolver.claim(v.get("id"))
+            resolver.register_note(v.get("id"), plan.note_stem)
+
+    # Overall progress = mean of the per-version progress
+    progress = [0.0] * len(versions)
+    progress_lock = threading.Lock()
+
+    def version_progress(idx: int):
+        def callback(percent: float):
+            if not progress_callback:
+                return
+            with progress_lock:
+                progress[idx] = percent
+                overall = sum(progress) / len(progress)
+            progress_callback(overall)
+        return callback
+
+    def process(idx: int, version: dict) -> Optional[str]:
+        if cancel_event and cancel_event.is_set():
+            return None
+
+        saved_images = download_version_images(
+            version,
+            plans[idx],
+            sink,
+            progress_callback=version_progress(idx),
+            cancel_event=cancel_event,
+            images=selected[idx],
+            dedupe=deduplicator.scope(version.get("id")) if deduplicator else None,
+            policy=image_policy
+        )
+        if dataset:
+            export_version_images(dataset, model_id, model_name, version, selected[idx], saved_images, plans[idx])
+        resources = None
+        if resolver:
+            resources = resolve_resources(
+                resolver, version, model_id, 0,
+                cancel_event=cancel_event,
+                md_output_dir=md_output_dir,
+                img_output_dir=img_output_dir,
+                sink=sink,
+                planner=planner,
+                snapshots=snapshots,
+                stats_pages=stats_pages,
+                image_policy=image_policy,
+                deduplicator=deduplicator,
+                dataset=dataset
+            )
+        stats = collect_generation_stats(version, stats_pages)
+        description, description_images = description_future.result()
+        md = build_note(data, version, saved_images, model_id, template, description, plans[idx], stats, resources)
+        out_file = save_note(md, plans[idx], sink)
+        version_progress(idx)(100)
+
+        if snapshots:
+            snapshots.save_manifest(
+                model_id, version, saved_images, plans[idx], stats if stats_pages > 0 else None, resources,
+                description_images
+            )
+
+        print(f"[OK] Markdown created: {out_file}")
+        return out_file
+
+    notes: list[tuple[str, PathPlan]] = []
+    created: list[str] = []
+    with ThreadPoolExecutor(max_workers=max(1, max_workers) + 1) as executor:
+        # Submitted first, so the versions waiting for it never hold its worker
+        description_future = executor.submit(
+            scheduling.propagate(localize_description),
+            data, model_id, planner, sink, image_policy, cancel_event
+        )
+        process = scheduling.propagate(process)
+        futures = [executor.submit(process, idx, v) for idx, v in enumerate(versions)]
+
+        for version, plan, future in zip(versions, plans, futures):
+            try:
+                out_file = future.result()
+            except Exception as e:
+                print(f"[ERROR] Version '{version.get('name', '')}' failed: {e}")
+                continue
+            if out_file:
+                notes.append((version.get("name", ""), plan))
+                created.append(out_file)
+
+    if write_index and notes:
+        index_md = render_model_index(data, model_id, notes)
+        index_relpath = planner.plan_index(model_name, model_id)
+        index_file = sink.write_text(SINK_MARKDOWN, index_relpath, index_md)
+        created.append(index_file)
+        print(f"[OK] Model index created: {index_file}")
+
+    sink.flush()
+
+    print(f"Done!")
+    return created
 
 if __name__ == "__main__":
     # Example usage - replace with actual model ID and version
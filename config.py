@@ -18,8 +18,85 @@ class ConfigManager:
         "model_output_dir": "./models",
         "image_output_dir": "./images",
         "api_timeout": 30,
-        "image_placeholder_count": 2
+        "log_max_lines": 2000,
+        "log_flush_interval_ms": 100,
+        "log_level": "INFO",
+        "log_file": "",
+        "log_file_max_bytes": 1048576,
+        "log_file_backup_count": 3,
+        "version_workers": 4,
+        "write_model_index": True,
+        "output_sink": "local",
+        "output_archive_path": "./output/batch.zip",
+        "output_buffer_bytes": 8388608,
+        "s3_endpoint": "",
+        "s3_bucket": "",
+        "s3_access_key": "",
+        "s3_secret_key": "",
+        "s3_region": "us-east-1",
+        "s3_prefix": "",
+        "metadata_cache_dir": "",
+        "metadata_cache_ttl": 60,
+        "watch_model_ids": [],
+        "watch_creators": [],
+        "watch_state_file": "./watch_state.json",
+        "watch_min_interval": 300,
+        "watch_max_interval": 21600,
+        "watch_fetch_existing": False,
+        "watch_fetch_workers": 1,
+        "api_server_host": "127.0.0.1",
+        "api_server_port": 8765,
+        "api_server_workers": 2,
+        "api_server_job_ttl": 3600,
+        "api_server_max_finished_jobs": 200,
+        "snapshot_dir": "",
+        "snapshot_history": True,
+        "rerender_workers": 0,
+        "stats_deep_fetch_pages": 0,
+        "image_max_count": 0,
+        "image_max_total_bytes": 0,
+        "image_media_types": [],
+        "image_max_nsfw_level": 0,
+        "image_order": "api",
+        "image_target_width": 0,
+        "image_originals_count": 0,
+        "image_localize_description": True,
+        "image_video_mode": "poster",
+        "image_poster_probe_bytes": 1048576,
+        "image_dedupe": "off",
+        "image_dedupe_threshold": 5,
+        "image_dedupe_library": False,
+        "image_hash_index_file": "./image_hashes.tsv",
+        "transport_mode": "live",
+        "transport_cassette": "./cassette.zip",
+        "transport_replay_latency_ms": 0,
+        "transport_replay_bandwidth": 0,
+        "adaptive_min_concurrency": 1,
+        "adaptive_max_concurrency": 16,
+        "adaptive_initial_concurrency": 4,
+        "prefetch_enabled": True,
+        "prefetch_max_images": 8,
+        "prefetch_cache_bytes": 67108864,
+        "prefetch_debounce_ms": 600,
+        "interactive_bandwidth_limit": 0,
+        "bulk_bandwidth_limit": 0,
+        "work_queue_file": "",
+        "work_queue_lease_seconds": 300,
+        "work_queue_heartbeat_seconds": 60,
+        "work_queue_max_attempts": 3,
+        "work_queue_poll_seconds": 5,
+        "dataset_export_dir": "",
+        "dataset_export_format": "parquet",
+        "dataset_export_batch_rows": 10000,
+        "resource_resolve": True,
+        "resource_fetch_depth": 0,
+        "resource_max_per_version": 10,
+        "resource_workers": 4
     }
+
+    # Keys of earlier versions that are no longer read (dropped on load, so
+    # the next save removes them from config.json)
+    REMOVED_KEYS = ("image_placeholder_count",)
     
     def __init__(self, config_file: str = "config.json"):
         """
@@ -41,6 +118,8 @@ class ConfigManager:
             if self.config_file.exists():
                 with open(self.config_file, "r", encoding="utf-8") as f:
                     loaded = json.load(f)
+                    for key in self.REMOVED_KEYS:
+                        loaded.pop(key, None)
                     # Merge with defaults (allows partial configs)
                     self.config.update(loaded)
                     print(f"[OK] Config geladen: {self.config_file}")
@@ -0,0 +1,239 @@
+# dataset_export.py
+"""
+Columnar export of per-image generation data (Parquet or Arrow IPC).
+
+For every downloaded version one record per selected image is written:
+model, version, prompts, sampler/scheduler, size, steps, CFG, seed and the
+saved image path. Records are buffered column-wise and written as one row
+group per batch_rows records, so memory stays bounded no matter how many
+images a run covers.
+
+Every run writes its own part file into the export directory; the
+directory as a whole is the dataset and grows across runs, e.g.:
+
+    pyarrow.dataset.dataset("./dataset", format="parquet").to_table()
+
+pyarrow is only imported when an export is actually configured.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+from generation_stats import (
+    CATEGORICAL_PARAMS, NUMERIC_PARAMS, NEGATIVE_PROMPT_FIELD_NAMES, PROMPT_FIELD_NAMES,
+    SAMPLER_FIELD_NAMES, SCHEDULER_FIELD_NAMES, SIZE_FIELD_NAMES,
+)
+
+FORMAT_PARQUET = "parquet"
+FORMAT_ARROW = "arrow"
+FORMATS = (FORMAT_PARQUET, FORMAT_ARROW)
+DEFAULT_BATCH_ROWS = 10000
+
+# Column -> pyarrow type name
+COLUMNS = {
+    "model_id": "int64",
+    "model_name": "string",
+    "version_id": "int64",
+    "version_name": "string",
+    "image_url": "string",
+    "image_path": "string",
+    "width": "int32",
+    "height": "int32",
+    "nsfw_level": "int32",
+    "prompt": "string",
+    "negative_prompt": "string",
+    "sampler": "string",
+    "scheduler": "string",
+    "size": "string",
+    "steps": "int32",
+    "cfg": "float32",
+    "clip_skip": "int32",
+    "seed": "int64",
+    "vae": "string",
+    "fetched_at": "timestamp",
+}
+
+INT32_MAX = 2 ** 31 - 1
+INT64_MAX = 2 ** 63 - 1
+
+
+def _text(meta: dict, field_names: list[str]) -> Optional[str]:
+    value = next((meta.get(f) for f in field_names if meta.get(f) not in (None, "")), None)
+    return str(value).strip() if value is not None else None
+
+
+def _number(value, integer: bool, limit: int = INT32_MAX):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not integer:
+        return number
+    if not number.is_integer() or abs(number) > limit:
+        return None
+    return int(number)
+
+
+def image_record(model_id: int, model_name: str, version: dict, img: dict, image_path: Optional[str]) -> dict:
+    """
+    Builds the export record of one image.
+    """
+    meta = img.get("meta") or {}
+    numeric = {name: _text(meta, fields) for name, fields in NUMERIC_PARAMS.items()}
+    categorical = {name: _text(meta, fields) for name, fields in CATEGORICAL_PARAMS.items()}
+
+    return {
+        "model_id": model_id,
+        "model_name": model_name,
+        "version_id": version.get("id"),
+        "version_name": version.get("name", ""),
+        "image_url": img.get("url"),
+        "image_path": image_path,
+        "width": _number(img.get("width"), True),
+        "height": _number(img.get("height"), True),
+        "nsfw_level": _number(img.get("nsfwLevel"), True),
+        "prompt": _text(meta, PROMPT_FIELD_NAMES),
+        "negative_prompt": _text(meta, NEGATIVE_PROMPT_FIELD_NAMES),
+        "sampler": _text(meta, SAMPLER_FIELD_NAMES),
+        "scheduler": _text(meta, SCHEDULER_FIELD_NAMES),
+        "size": _text(meta, SIZE_FIELD_NAMES),
+        "steps": _number(numeric["steps"], True),
+        "cfg": _number(numeric["cfg"], False),
+        "clip_skip": _number(numeric["clip_skip"], True),
+        "seed": _number(categorical["seed"], True, INT64_MAX),
+        "vae": categorical["vae"],
+    }
+
+
+class DatasetExporter:
+    """
+    Buffers image records and writes them as batches to a part file.
+    """
+
+    def __init__(self, export_dir: Path, file_format: str = FORMAT_PARQUET, batch_rows: int = DEFAULT_BATCH_ROWS):
+        """
+        Initialize DatasetExporter.
+
+        Args:
+            export_dir: Dataset directory (one part file per exporter)
+            file_format: FORMAT_PARQUET or FORMAT_ARROW (IPC file)
+            batch_rows: Records buffered before a batch is written
+
+        Raises:
+            ValueError: On an unknown format
+            RuntimeError: If pyarrow is not installed
+        """
+        if file_format not in FORMATS:
+            raise ValueError(f"Unknown dataset format: {file_format} (expected one of {', '.join(FORMATS)})")
+        try:
+            import pyarrow
+        except ImportError:
+            raise RuntimeError("Dataset export requires pyarrow (pip install pyarrow)")
+
+        self._pa = pyarrow
+        self.export_dir = Path(export_dir)
+        self.file_format = file_format
+        self.batch_rows = max(1, batch_rows)
+        self.schema = pyarrow.schema([
+            (name, pyarrow.timestamp("s") if kind == "timestamp" else getattr(pyarrow, kind)())
+            for name, kind in COLUMNS.items()
+        ])
+
+        self._lock = threading.Lock()
+        self._columns: dict[str, list] = {name: [] for name in COLUMNS}
+        self._writer = None
+        self.path: Optional[Path] = None
+        self.rows = 0
+
+    @classmethod
+    def from_config(cls, config) -> Optional["DatasetExporter"]:
+        """
+        Returns the configured exporter (None if dataset_export_dir is empty).
+        """
+        export_dir = config.get("dataset_export_dir", "")
+        if not export_dir:
+            return None
+        return cls(
+            Path(export_dir),
+            config.get("dataset_export_format", FORMAT_PARQUET),
+            config.get("dataset_export_batch_rows", DEFAULT_BATCH_ROWS)
+        )
+
+    # -------------------------------
+    # Records
+    # -------------------------------
+    def add_version(
+        self,
+        model_id: int,
+        model_name: str,
+        version: dict,
+        images: list,
+        image_names: list[Optional[str]]
+    ) -> None:
+        """
+        Adds the records of a version's images.
+
+        Args:
+            images: Selected image records of the version
+            image_names: Saved image path per image (None if not saved)
+        """
+        fetched_at = int(time.time())
+        with self._lock:
+            for img, image_path in zip(images, image_names):
+                record = image_record(model_id, model_name, version, img, image_path)
+                record["fetched_at"] = fetched_at
+                for name, column in self._columns.items():
+                    column.append(record[name])
+                self.rows += 1
+
+            if len(self._columns["model_id"]) >= self.batch_rows:
+                self._write_batch()
+
+    def _open_writer(self):
+        self.export_dir.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        self.path = self.export_dir / f"part-{stamp}-{os.getpid()}-{id(self):x}.{self.file_format}"
+        if self.file_format == FORMAT_PARQUET:
+            import pyarrow.parquet
+            return pyarrow.parquet.ParquetWriter(self.path, self.schema, compression="zstd")
+        return self._pa.ipc.new_file(self.path, self.schema)
+
+    def _write_batch(self) -> None:
+        if not self._columns["model_id"]:
+            return
+        batch = self._pa.RecordBatch.from_pydict(self._columns, schema=self.schema)
+        if self._writer is None:
+            self._writer = self._open_writer()
+        if self.file_format == FORMAT_PARQUET:
+            self._writer.write_batch(batch)
+        else:
+            self._writer.write(batch)
+        self._columns = {name: [] for name in COLUMNS}
+
+    def close(self) -> None:
+        """
+        Writes the remaining records and finishes the part file.
+        """
+        with self._lock:
+            self._write_batch()
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+                print(f"[OK] Dataset export: {self.rows} image record(s) written to {self.path}")
+
+
+@contextmanager
+def open_from_config(config):
+    """
+    Yields the configured exporter (or None) and closes it afterwards.
+    """
+    exporter = DatasetExporter.from_config(config)
+    try:
+        yield exporter
+    finally:
+        if exporter is not None:
+            exporter.close()
@@ -0,0 +1,390 @@
+# description_markdown.py
+"""
+HTML-to-Markdown conversion of model descriptions.
+
+The description HTML is parsed once (html.parser, no extra dependency)
+into a list of Markdown segments. Embedded images stay placeholders, so
+the image URLs are known before anything is rendered: the caller
+downloads them and renders the Markdown with local embeds (![[name]])
+for the saved ones and remote embeds for the rest.
+
+Supported: paragraphs, line breaks, headings, bold/italic/strikethrough,
+inline code and code blocks, links, (nested) lists, block quotes,
+tables (the first row is the header; cells are flattened to one line),
+horizontal rules and images. <edge-media>, scripts and styles are
+dropped; other tags keep only their text.
+"""
+
+import re
+from html.parser import HTMLParser
+from typing import Optional
+
+BLOCK_TAGS = frozenset(["p", "div", "section", "article", "figure", "figcaption"])
+CELL_TAGS = frozenset(["td", "th"])
+HEADING_TAGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+INLINE_MARKS = {"strong": "**", "b": "**", "em": "*", "i": "*", "s": "~~", "del": "~~", "strike": "~~"}
+DROPPED_TAGS = frozenset(["script", "style", "edge-media"])
+
+_SPACE_RE = re.compile(r"\s+")
+_BLANK_LINES_RE = re.compile(r"\n[ \t]*\n(?:[ \t]*\n)+")
+_LINE_END_SPACE_RE = re.compile(r"[ \t]+\n")
+_CELL_BREAK_RE = re.compile(r"\s*\n\s*")
+# Characters that would start Markdown syntax anywhere in text (& only before an entity)
+_ESCAPE_RE = re.compile(r"([\\`*_\[\]<~]|&(?=#?\w+;))")
+# Text at the start of a line that would become a heading, quote or list
+_LINE_START_RE = re.compile(r"^(?:#{1,6}(?=\s|$)|>|[-+](?=\s|$)|\d+(?=[.)](?:\s|$)))")
+
+
+class _Image:
+    __slots__ = ("url", "alt")
+
+    def __init__(self, url: str, alt: str):
+        self.url = url
+        self.alt = alt
+
+
+class DescriptionDocument:
+    """
+    Parsed description: Markdown segments with image placeholders.
+
+    Attributes:
+        image_urls: URLs of the embedded images in document order (unique)
+    """
+
+    def __init__(self, segments: list):
+        self._segments = segments
+        self.image_urls = list(dict.fromkeys(s.url for s in segments if isinstance(s, _Image)))
+
+    def render(self, image_names: Optional[dict[str, str]] = None) -> str:
+        """
+        Renders the Markdown.
+
+        Args:
+            image_names: Saved filename by image URL (local embed); images
+                without a name keep their remote URL
+        """
+        image_names = image_names or {}
+        parts = []
+        for segment in self._segments:
+            if isinstance(segment, _Image):
+                name = image_names.get(segment.url)
+                parts.append(f"![[{name}]]" if name else f"![{segment.alt}]({segment.url})")
+            else:
+                parts.append(segment)
+
+        text = _LINE_END_SPACE_RE.sub("\n", "".join(parts))
+        return _BLANK_LINES_RE.sub("\n\n", text).strip()
+
+
+class _MarkdownParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.segments: list = []
+        # Open lists: [ordered, next number]
+        self._lists: list[list] = []
+        self._links: list[Optional[str]] = []
+        self._quote_depth = 0
+        self._pre = 0
+        self._dropped = 0
+        # Pending whitespace between inline text / line breaks before the next output
+        self._space = False
+        self._breaks = 0
+        self._opened = False
+        self._quote_start = False
+        # Content indent of the open <li> elements; set right after a list marker was written
+        self._item_indents: list[str] = []
+        self._after_marker = False
+        # Open tables: rows of cells, each cell a list of segments
+        self._tables: list[list[list[list]]] = []
+        # Output state outside the open cells (cell content is collected apart)
+        self._cells: list[tuple] = []
+
+    # -------------------------------
+    # Output helpers
+    # -------------------------------
+    def _emit(self, segment) -> None:
+        if not segment:
+            return
+        prefix = self._prefix()
+        if self._breaks and self.segments:
+            # Line breaks are written lazily, so repeated block ends collapse
+            breaks = 1 if self._quote_start else self._breaks
+            self.segments.append(("\n" + prefix.rstrip()) * (breaks - 1) + "\n" + prefix)
+        elif not self.segments:
+            self.segments.append(prefix)
+        self._breaks = 0
+        self._quote_start = False
+        self._opened = False
+        self._after_marker = False
+        self.segments.append(segment)
+        self._space = False
+
+    def _open_mark(self, mark: str) -> None:
+        self._flush_space()
+        self._emit(mark)
+        self._opened = True
+
+    def _close_mark(self, mark: str, opening: str) -> None:
+        # Whitespace before a closing mark goes after it ("*a *b" -> "*a* b")
+        space = self._space
+        if self.segments and self.segments[-1] == opening:
+            # Empty element
+            self.segments.pop()
+        else:
+            self._emit(mark)
+        self._space = space
+
+    def _prefix(self) -> str:
+        if self._cells:
+            return ""
+        # Continuation lines of a list item are indented to its content
+        return "> " * self._quote_depth + "".join(self._item_indents)
+
+    def _newline(self, blank: bool = False) -> None:
+        self._space = False
+        self._breaks = max(self._breaks, 2 if blank else 1)
+
+    # -------------------------------
+    # HTMLParser callbacks
+    # -------------------------------
+    def handle_starttag(self, tag, attrs):
+        if tag in DROPPED_TAGS:
+            if tag != "edge-media":
+                self._dropped += 1
+            return
+        if self._dropped:
+            return
+
+        attrs = dict(attrs)
+        if tag == "table":
+            self._block_break()
+            self._tables.append([])
+        elif tag == "tr" and self._tables:
+            self._close_cell()
+            self._tables[-1].append([])
+        elif tag in CELL_TAGS and self._tables:
+            self._close_cell()
+            if not self._tables[-1]:
+                self._tables[-1].append([])
+            self._cells.append((
+                self.segments, self._breaks, self._space, self._opened, self._after_marker, self._quote_start
+            ))
+            self.segments = []
+            self._breaks = 0
+            self._space = self._opened = self._after_marker = self._quote_start = False
+        elif tag in BLOCK_TAGS or tag in HEADING_TAGS:
+            self._block_break()
+            if tag in HEADING_TAGS:
+                self._emit("#" * HEADING_TAGS[tag] + " ")
+        elif tag == "br":
+            self._newline()
+        elif tag == "hr":
+            self._newline(blank=True)
+            self._emit("---")
+            self._newline(blank=True)
+        elif tag == "blockquote":
+            # The blank line before the quote has the outer prefix
+            if self.segments:
+                self.segments.append("\n" + self._prefix().rstrip())
+            self._quote_depth += 1
+            self._breaks = 1
+            self._quote_start = True
+        elif tag in ("ul", "ol"):
+            if not self._lists:
+                self._newline(blank=True)
+            self._lists.append([tag == "ol", 1])
+        elif tag == "li":
+            self._newline()
+            if self._lists and self._lists[-1][0]:
+                marker = f"{self._lists[-1][1]}. "
+                self._lists[-1][1] += 1
+            else:
+                marker = "- "
+            self._emit(marker)
+            self._item_indents.append(" " * len(marker))
+            self._after_marker = True
+        elif tag == "pre":
+            self._pre += 1
+            self._newline(blank=True)
+            self._emit("```")
+            self._newline()
+        elif tag == "code" and not self._pre:
+            self._open_mark("`")
+        elif tag in INLINE_MARKS:
+            self._open_mark(INLINE_MARKS[tag])
+        elif tag == "a":
+            self._links.append(attrs.get("href"))
+            if attrs.get("href"):
+                self._open_mark("[")
+        elif tag == "img":
+            url = (attrs.get("src") or "").strip()
+            if url:
+                self._flush_space()
+                self._emit(_Image(url, (attrs.get("alt") or "").replace("]", "")))
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in ("br", "hr", "img"):
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROPPED_TAGS:
+            if tag != "edge-media":
+                self._dropped = max(0, self._dropped - 1)
+            return
+        if self._dropped:
+            return
+
+        if tag == "table":
+            if self._tables:
+                self._close_cell()
+                self._write_table(self._tables.pop())
+        elif tag in ("tr", "td", "th"):
+            self._close_cell()
+        elif tag in BLOCK_TAGS or tag in HEADING_TAGS:
+            self._block_break()
+        elif tag == "li":
+            if self._item_indents:
+                self._item_indents.pop()
+        elif tag == "blockquote":
+            self._quote_depth = max(0, self._quote_depth - 1)
+            self._newline(blank=True)
+        elif tag in ("ul", "ol"):
+            if self._lists:
+                self._lists.pop()
+            if not self._lists:
+                self._newline(blank=True)
+        elif tag == "pre":
+            self._pre = max(0, self._pre - 1)
+            if not _ends_line(self.segments[-1]):
+                self._newline()
+            self._emit("```")
+            self._newline(blank=True)
+        elif tag == "code" and not self._pre:
+            self._close_mark("`", "`")
+        elif tag in INLINE_MARKS:
+            self._close_mark(INLINE_MARKS[tag], INLINE_MARKS[tag])
+        elif tag == "a" and self._links:
+            href = self._links.pop()
+            if href:
+                self._close_mark(f"]({href})", "[")
+
+    def handle_data(self, data):
+        if self._dropped or not data:
+            return
+        if self._pre:
+            self._emit(data.replace("\n", "\n" + self._prefix()))
+            return
+
+        leading = data[0].isspace()
+        trailing = data[-1].isspace()
+        text = _SPACE_RE.sub(" ", data).strip()
+        if leading and self._opened:
+            # Whitespace after an opening mark goes before it
+            if len(self.segments) > 1 and not _ends_line(self.segments[-2]):
+                self.segments.insert(len(self.segments) - 1, " ")
+            self._opened = False
+        elif leading:
+            self._space = True
+        if not text:
+            return
+        self._flush_space()
+        line_start = bool(self._breaks) or self._after_marker or not self.segments
+        text = _escape(text, line_start)
+        if self._cells:
+            text = text.replace("|", "\\|")
+        self._emit(text)
+        self._space = trailing
+
+    # -------------------------------
+    # Tables
+    # -------------------------------
+    def _close_cell(self) -> None:
+        # Cells of the innermost table only (</td> may be missing)
+        if not self._tables or len(self._cells) < len(self._tables):
+            return
+        cell = [
+            _CELL_BREAK_RE.sub(" ", segment) if isinstance(segment, str) else segment
+            for segment in self.segments
+        ]
+        (
+            self.segments, self._breaks, self._space, self._opened, self._after_marker, self._quote_start
+        ) = self._cells.pop()
+        self._tables[-1][-1].append(cell)
+
+    def _write_table(self, rows: list[list[list]]) -> None:
+        rows = [row for row in rows if row]
+        if not rows:
+            return
+        if self._cells:
+            # A table inside a cell keeps only its text
+            for row in rows:
+                for cell in row:
+                    self._space = True
+                    for segment in cell:
+                        self._flush_space()
+                        self._emit(segment)
+            return
+        columns = max(len(row) for row in rows)
+        # Tables need a blank line before them, also inside list items
+        self._newline(blank=True)
+        for idx, row in enumerate(rows):
+            self._emit("|")
+            for column in range(columns):
+                self._emit(" ")
+                for segment in row[column] if column < len(row) else []:
+                    self._emit(segment)
+                self._emit(" |")
+            self._newline()
+            if idx == 0:
+                self._emit("|" + " --- |" * columns)
+                self._newline()
+        self._block_break()
+
+    def _block_break(self) -> None:
+        # Blocks inside a list item stay in the item: the first one on the
+        # marker line, later ones on the next line
+        if not self._item_indents:
+            self._newline(blank=True)
+        elif not self._after_marker:
+            self._newline()
+
+    def _flush_space(self) -> None:
+        if self._space and not self._breaks and self.segments and not _ends_line(self.segments[-1]):
+            self.segments.append(" ")
+        self._space = False
+
+
+def _escape(text: str, line_start: bool) -> str:
+    """
+    Escapes text so it renders literally (no emphasis, HTML, headings, ...).
+    """
+    text = _ESCAPE_RE.sub(r"\\\1", text)
+    if line_start:
+        match = _LINE_START_RE.match(text)
+        if match:
+            end = match.end()
+            # "1. x" -> "1\. x", "# x" -> "\# x"
+            text = f"{text[:end]}\\{text[end:]}" if match.group().isdigit() else f"\\{text}"
+    return text
+
+
+def _ends_line(segment) -> bool:
+    return isinstance(segment, str) and segment.endswith(("\n", " "))
+
+
+def parse_description(html: str) -> DescriptionDocument:
+    """
+    Parses description HTML (the API field "description") in one pass.
+    """
+    parser = _MarkdownParser()
+    parser.feed((html or "").strip())
+    parser.close()
+    return DescriptionDocument(parser.segments)
+
+
+def html_to_markdown(html: str, image_names: Optional[dict[str, str]] = None) -> str:
+    """
+    Converts description HTML to Markdown (see DescriptionDocument.render).
+    """
+    return parse_description(html).render(image_names)
@@ -0,0 +1,175 @@
+# generation_stats.py
+"""
+Distribution statistics of generation parameters (steps, CFG, clip skip,
+VAE, seed) over the images of a version.
+
+GenerationStats is fed one image meta at a time, so the images of the
+version payload and further pages of the image API can be aggregated in a
+single streaming pass. Only value counts are kept, which is small even for
+thousands of images (parameters take few distinct values).
+"""
+
+from collections import Counter
+from typing import Iterable, Optional
+
+# Parameter -> meta field names (different API versions / generators)
+NUMERIC_PARAMS = {
+    "steps": ["steps", "Steps"],
+    "cfg": ["cfgScale", "cfg_scale", "CFG scale", "cfg"],
+    "clip_skip": ["clipSkip", "Clip skip", "clip_skip"],
+}
+CATEGORICAL_PARAMS = {
+    "vae": ["VAE", "vae"],
+    "seed": ["seed", "Seed"],
+}
+
+# Meta field names of the text parameters (read by the notes, image
+# selection and dataset export)
+PROMPT_FIELD_NAMES = ["prompt"]
+NEGATIVE_PROMPT_FIELD_NAMES = ["negativePrompt", "negativeprompt", "negative_prompt"]
+SAMPLER_FIELD_NAMES = ["sampler", "samplerName", "Sampler"]
+SCHEDULER_FIELD_NAMES = ["scheduler", "schedulerName", "Scheduler"]
+SIZE_FIELD_NAMES = ["size", "resolution", "Size"]
+
+
+def _meta_value(meta: dict, field_names: list[str]):
+    return next((meta.get(f) for f in field_names if meta.get(f) not in (None, "")), None)
+
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else f"{value:.2f}".rstrip("0").rstrip(".")
+
+
+class GenerationStats:
+    """
+    Streaming aggregation of generation parameters.
+    """
+
+    def __init__(self):
+        self.images = 0
+        self.counts: dict[str, Counter] = {
+            name: Counter() for name in (*NUMERIC_PARAMS, *CATEGORICAL_PARAMS)
+        }
+
+    def add(self, meta: Optional[dict]) -> None:
+        """
+        Adds the generation metadata of one image.
+        """
+        self.images += 1
+        if not meta:
+            return
+
+        for name, fields in NUMERIC_PARAMS.items():
+            value = _meta_value(meta, fields)
+            try:
+                self.counts[name][float(value)] += 1
+            except (TypeError, ValueError):
+                pass
+
+        for name, fields in CATEGORICAL_PARAMS.items():
+            value = _meta_value(meta, fields)
+            if value is not None:
+                self.counts[name][str(value).strip()] += 1
+
+    def add_images(self, images: Iterable[dict]) -> "GenerationStats":
+        for img in images:
+            self.add(img.get("meta"))
+        return self
+
+    # -------------------------------
+    # Results
+    # -------------------------------
+    @staticmethod
+    def _median(counter: Counter) -> float:
+        total = sum(counter.values())
+        lower_idx, upper_idx = (total - 1) // 2, total // 2
+        lower = upper = None
+        seen = 0
+        for value in sorted(counter):
+            seen += counter[value]
+            if lower is None and seen > lower_idx:
+                lower = value
+            if seen > upper_idx:
+                upper = value
+                break
+        return (lower + upper) / 2
+
+    def summary(self, name: str) -> dict:
+        """
+        Returns the statistics of a parameter (empty dict if no image has it).
+
+        Numeric parameters: count, median, mode, min, max
+        Categorical parameters: count, mode, mode_count, distinct
+        """
+        counter = self.counts[name]
+        if not counter:
+            return {}
+
+        mode, mode_count = counter.most_common(1)[0]
+        result = {"count": sum(counter.values()), "mode": mode}
+        if name in NUMERIC_PARAMS:
+            result.update(median=self._median(counter), min=min(counter), max=max(counter))
+        else:
+            result.update(mode_count=mode_count, distinct=len(counter))
+        return result
+
+    def template_variables(self) -> dict:
+        """
+        Returns the statistics as template variables:
+        {param} (display value), {param}_median/_mode/_min/_max/_range/_count
+        for numeric parameters and {param}/_mode/_count/_distinct otherwise.
+        Parameters missing in all images are empty strings.
+        """
+        variables = {"stats_image_count": self.images}
+
+        for name in NUMERIC_PARAMS:
+            stats = self.summary(name)
+            if not stats:
+                variables.update({f"{name}{suffix}": "" for suffix in ("", "_median", "_mode", "_min", "_max", "_range", "_count")})
+                continue
+
+            value_range = _format_number(stats["min"])
+            if stats["max"] != stats["min"]:
+                value_range += f"–{_format_number(stats['max'])}"
+            variables.update({
+                name: f"{_format_number(stats['median'])} ({value_range}, n={stats['count']})",
+                f"{name}_median": _format_number(stats["median"]),
+                f"{name}_mode": _format_number(stats["mode"]),
+                f"{name}_min": _format_number(stats["min"]),
+                f"{name}_max": _format_number(stats["max"]),
+                f"{name}_range": value_range,
+                f"{name}_count": stats["count"],
+            })
+
+        for name in CATEGORICAL_PARAMS:
+            stats = self.summary(name)
+            if not stats:
+                variables.update({f"{name}{suffix}": "" for suffix in ("", "_mode", "_count", "_distinct")})
+                continue
+
+            variables.update({
+                name: f"{stats['mode']} ({stats['mode_count']}/{stats['count']})",
+                f"{name}_mode": stats["mode"],
+                f"{name}_count": stats["count"],
+                f"{name}_distinct": stats["distinct"],
+            })
+
+        return variables
+
+    # -------------------------------
+    # Persistence (snapshot manifests)
+    # -------------------------------
+    def to_dict(self) -> dict:
+        return {
+            "images": self.images,
+            "counts": {name: [[value, n] for value, n in counter.items()] for name, counter in self.counts.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "GenerationStats":
+        stats = cls()
+        stats.images = data.get("images", 0)
+        for name, items in data.get("counts", {}).items():
+            if name in stats.counts:
+                stats.counts[name] = Counter({value: n for value, n in items})
+        return stats
@@ -0,0 +1,295 @@
+# image_dedupe.py
+"""
+Perceptual-hash deduplication of sample images.
+
+Every downloaded image gets a 64-bit difference hash (dHash), which is
+stable under rescaling and recompression. Hashes are indexed in a BK-tree,
+so looking up all hashes within a Hamming distance only visits a small part
+of the index. Near-duplicates are detected per version and optionally
+across the whole library (hashes persisted in image_hash_index_file).
+
+Library entries are keyed by version ID and image URL, not by the output
+filename: image order (and with it the filename slots) changes between
+runs. A refetched version replaces its entries and is never compared with
+its own earlier runs.
+
+Index file lines: <hash hex> TAB <version id> TAB <image url> TAB <filename>
+(later lines replace earlier ones with the same key; the file is compacted
+on load).
+"""
+
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image
+
+DEDUPE_OFF = "off"
+DEDUPE_FLAG = "flag"
+DEDUPE_DROP = "drop"
+DEDUPE_MODES = (DEDUPE_OFF, DEDUPE_FLAG, DEDUPE_DROP)
+
+# Maximum Hamming distance (of 64 bits) between near-duplicates
+DEFAULT_THRESHOLD = 5
+HASH_SIZE = 8
+
+# One lock per index file, shared by all deduplicators of the process
+# (each job creates its own deduplicator for the same file)
+_index_locks: dict[Path, threading.Lock] = {}
+_index_locks_guard = threading.Lock()
+
+
+def _index_lock(path: Path) -> threading.Lock:
+    with _index_locks_guard:
+        return _index_locks.setdefault(path.resolve(), threading.Lock())
+
+
+class DuplicateImage(Exception):
+    """
+    Raised for an image that is a near-duplicate of an already kept one.
+    """
+
+    def __init__(self, duplicate_of: str, distance: int):
+        super().__init__(f"near-duplicate of {duplicate_of} (distance {distance})")
+        self.duplicate_of = duplicate_of
+        self.distance = distance
+
+
+def dhash(img: Image.Image) -> int:
+    """
+    Computes the 64-bit difference hash of an image (first frame if animated).
+    """
+    small = img.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS)
+    pixels = list(small.getdata())
+
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """
+    BK-tree over image hashes with the Hamming distance as metric.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Node: [hash, name, {distance: child node}]
+        self._root: Optional[list] = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, value: int, name: str) -> None:
+        with self._lock:
+            self._size += 1
+            if self._root is None:
+                self._root = [value, name, {}]
+                return
+
+            node = self._root
+            while True:
+                distance = hamming(value, node[0])
+                child = node[2].get(distance)
+                if child is None:
+                    node[2][distance] = [value, name, {}]
+                    return
+                node = child
+
+    def find(self, value: int, max_distance: int) -> list[tuple[int, str]]:
+        """
+        Returns (distance, name) of all hashes within max_distance, closest first.
+        """
+        results = []
+        with self._lock:
+            stack = [self._root] if self._root is not None else []
+            while stack:
+                node = stack.pop()
+                distance = hamming(value, node[0])
+                if distance <= max_distance:
+                    results.append((distance, node[1]))
+                # Triangle inequality: only children in this distance band can match
+                for child_distance, child in node[2].items():
+                    if distance - max_distance <= child_distance <= distance + max_distance:
+                        stack.append(child)
+        return sorted(results)
+
+
+class DedupeScope:
+    """
+    Duplicate check of one version (plus the shared library index).
+    """
+
+    def __init__(self, deduplicator: "ImageDeduplicator", version_id: Optional[int] = None):
+        self.deduplicator = deduplicator
+        self.version_id = version_id
+        self.tree = BKTree()
+        self.flagged: list[tuple[str, str]] = []
+
+    def check(self, img: Image.Image, name: str, image_key: Optional[str] = None) -> None:
+        """
+        Hashes an image and registers it under name.
+
+        Args:
+            name: Output filename (for messages)
+            image_key: Stable identity of the image (URL; default: name)
+
+        Raises:
+            DuplicateImage: In drop mode, if a near-duplicate is already known
+        """
+        dedupe = self.deduplicator
+        value = dhash(img)
+
+        # Lookup and insert are atomic, so parallel downloads of the same
+        # image cannot both pass
+        with dedupe.lock:
+            self._check(value, name, image_key or name)
+
+    def _check(self, value: int, name: str, image_key: str) -> None:
+        dedupe = self.deduplicator
+        matches = self.tree.find(value, dedupe.threshold)
+        if dedupe.library is not None:
+            for distance, key in dedupe.library.find(value, dedupe.threshold):
+                entry = dedupe.entries.get(key)
+                # Stale node (entry replaced since) or an earlier run of this version
+                if hamming(entry[0], value) != distance or entry[1] == str(self.version_id):
+                    continue
+                matches.append((distance, entry[2]))
+
+        if matches:
+            distance, duplicate_of = min(matches)
+            if dedupe.mode == DEDUPE_DROP:
+                raise DuplicateImage(duplicate_of, distance)
+            self.flagged.append((name, duplicate_of))
+            print(f"[WARN] {name} is a near-duplicate of {duplicate_of} (distance {distance})")
+
+        self.tree.add(value, name)
+        if self.version_id is not None:
+            dedupe.remember(value, self.version_id, image_key, name)
+
+
+class ImageDeduplicator:
+    """
+    Near-duplicate detection settings and the optional library-wide index.
+    """
+
+    def __init__(
+        self,
+        mode: str = DEDUPE_DROP,
+        threshold: int = DEFAULT_THRESHOLD,
+        library_index_file: Optional[Path] = None
+    ):
+        """
+        Initialize ImageDeduplicator.
+
+        Args:
+            mode: DEDUPE_FLAG (keep and log) or DEDUPE_DROP (skip the download)
+            threshold: Maximum Hamming distance of near-duplicates
+            library_index_file: Hash index file for library-wide detection
+                                (None = per version only)
+        """
+        if mode not in DEDUPE_MODES:
+            raise ValueError(f"Unknown dedupe mode: {mode} (expected one of {', '.join(DEDUPE_MODES)})")
+
+        self.mode = mode
+        self.threshold = threshold
+        self.library_index_file = Path(library_index_file) if library_index_file else None
+        self.library: Optional[BKTree] = None
+        # Library entry key -> (hash, version id, filename); the tree holds keys
+        self.entries: dict[str, tuple[int, str, str]] = {}
+        self._file_lock = _index_lock(self.library_index_file) if self.library_index_file else threading.Lock()
+        self.lock = threading.Lock()
+
+        if self.library_index_file:
+            self.library = BKTree()
+            # Compaction replaces the file; no other job may append meanwhile
+            with self._file_lock:
+                self._load_index()
+
+    @classmethod
+    def from_config(cls, config) -> Optional["ImageDeduplicator"]:
+        """
+        Returns the configured deduplicator (None if image_dedupe is "off").
+        """
+        mode = config.get("image_dedupe", DEDUPE_OFF)
+        if mode == DEDUPE_OFF:
+            return None
+        index_file = config.get("image_hash_index_file", "") if config.get("image_dedupe_library", False) else ""
+        return cls(mode, config.get("image_dedupe_threshold", DEFAULT_THRESHOLD), index_file or None)
+
+    @staticmethod
+    def _entry_key(version_id, image_key: str) -> str:
+        return f"{version_id}\t{image_key}"
+
+    def _load_index(self) -> None:
+        if not self.library_index_file.exists():
+            return
+        lines = 0
+        skipped = 0
+        try:
+            for line in self.library_index_file.read_text(encoding="utf-8").splitlines():
+                lines += 1
+                fields = line.split("\t")
+                if len(fields) != 4:
+                    # Entries keyed by filename only (older index format)
+                    skipped += 1
+                    continue
+                value, version_id, image_key, name = fields
+                self.entries[self._entry_key(version_id, image_key)] = (int(value, 16), version_id, name)
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Image hash index could not be loaded: {e}")
+            return
+
+        for key, (value, _, _) in self.entries.items():
+            self.library.add(value, key)
+        if skipped:
+            print(f"[INFO] Image hash index: {skipped} entries of the old format ignored")
+        if lines > len(self.entries):
+            self._rewrite_index()
+
+    def _rewrite_index(self) -> None:
+        tmp_file = self.library_index_file.with_name(f".{self.library_index_file.name}.{os.getpid()}.tmp")
+        try:
+            with tmp_file.open("w", encoding="utf-8") as f:
+                for key, (value, _, name) in self.entries.items():
+                    f.write(f"{value:016x}\t{key}\t{name}\n")
+            tmp_file.replace(self.library_index_file)
+        except OSError as e:
+            print(f"[WARN] Image hash index could not be compacted: {e}")
+
+    def remember(self, value: int, version_id: int, image_key: str, name: str) -> None:
+        """
+        Adds or replaces the library entry of a kept image.
+        """
+        if self.library is None:
+            return
+        key = self._entry_key(version_id, image_key)
+        entry = (value, str(version_id), name)
+        if self.entries.get(key) == entry:
+            return
+        # Replaced entries stay in the tree; lookups skip them by their hash
+        self.entries[key] = entry
+        self.library.add(value, key)
+        with self._file_lock:
+            try:
+                self.library_index_file.parent.mkdir(parents=True, exist_ok=True)
+                with self.library_index_file.open("a", encoding="utf-8") as f:
+                    f.write(f"{value:016x}\t{key}\t{name}\n")
+            except OSError as e:
+                print(f"[WARN] Image hash index could not be written: {e}")
+
+    def scope(self, version_id: Optional[int] = None) -> DedupeScope:
+        """
+        Returns a new duplicate check for one version (without a version ID
+        nothing is added to the library index).
+        """
+        return DedupeScope(self, version_id)
@@ -0,0 +1,198 @@
+# image_policy.py
+"""
+Selection of the sample images to download.
+
+The policy works on the image records of the model payload only, so it is
+applied before any network I/O: filter (media type, NSFW level), rank
+(API order, reactions or sampler/resolution diversity) and cut to the
+configured count and byte budget. Byte sizes are estimated from the image
+dimensions since the payload does not contain them.
+
+The policy also decides the download resolution: with a target width the
+CDN-scaled variants are fetched, except for the first originals_count
+selected images. Images embedded in the model description are downloaded
+as well (at the target width) unless localize_description is off.
+
+Videos are saved per video_mode (see video_media.py): as a poster frame
+(counted like an image in the byte budget), as the clip, or not at all
+(filtered here already).
+"""
+
+from typing import Optional
+
+from generation_stats import SAMPLER_FIELD_NAMES, SIZE_FIELD_NAMES
+from video_media import VIDEO_MODES, VIDEO_POSTER, VIDEO_SKIP, DEFAULT_POSTER_PROBE_BYTES
+
+ORDER_API = "api"
+ORDER_REACTIONS = "reactions"
+ORDER_DIVERSITY = "diversity"
+ORDERS = (ORDER_API, ORDER_REACTIONS, ORDER_DIVERSITY)
+
+# Estimated encoded bytes per pixel by media type (budget estimation)
+BYTES_PER_PIXEL = {"image": 0.35, "video": 4.0}
+DEFAULT_BYTES_PER_PIXEL = 0.35
+# Estimate for images without dimensions
+DEFAULT_IMAGE_BYTES = 512 * 1024
+
+# fetch_width() value for full-resolution originals
+FETCH_ORIGINAL = -1
+
+REACTION_FIELDS = ("likeCount", "heartCount", "laughCount", "cryCount", "commentCount")
+
+
+def estimate_image_bytes(img, target_width: int = 0, still: bool = False) -> int:
+    """
+    Estimates the download size of an image from its dimensions and type
+    (scaled down to target_width if given; still: videos are fetched as a
+    poster frame).
+    """
+    width, height = img.get("width"), img.get("height")
+    if not width or not height:
+        return DEFAULT_IMAGE_BYTES
+    if target_width > 0 and width > target_width:
+        width, height = target_width, height * target_width / width
+    media_type = "image" if still else img.get("type") or "image"
+    factor = BYTES_PER_PIXEL.get(media_type, DEFAULT_BYTES_PER_PIXEL)
+    return int(width * height * factor)
+
+
+def reaction_score(img) -> int:
+    """
+    Sum of the reaction counts of an image.
+    """
+    stats = img.get("stats") or {}
+    return sum(int(stats.get(field) or 0) for field in REACTION_FIELDS)
+
+
+def _diversity_key(img) -> tuple[str, str]:
+    meta = img.get("meta") or {}
+    sampler = next((meta.get(f) for f in SAMPLER_FIELD_NAMES if f in meta), "")
+    size = next((meta.get(f) for f in SIZE_FIELD_NAMES if f in meta), "")
+    if not size and img.get("width") and img.get("height"):
+        size = f"{img.get('width')}x{img.get('height')}"
+    return str(sampler or "").strip(), str(size or "").strip()
+
+
+class ImagePolicy:
+    """
+    Decides which images of a version are downloaded.
+
+    Attributes:
+        max_images: Maximum number of images (0 = unlimited)
+        max_total_bytes: Estimated byte budget per version (0 = unlimited)
+        media_types: Allowed media types in order of preference (empty = all)
+        max_nsfw_level: Highest allowed nsfwLevel (0 = no filter)
+        order: ORDER_API, ORDER_REACTIONS or ORDER_DIVERSITY
+        target_width: Width of the fetched CDN variants (0 = URL as given)
+        originals_count: Number of selected images fetched as originals anyway
+        localize_description: Download the images embedded in the description
+        video_mode: VIDEO_POSTER, VIDEO_FULL or VIDEO_SKIP
+        poster_probe_bytes: Leading video bytes fetched for a poster frame
+    """
+
+    def __init__(
+        self,
+        max_images: int = 0,
+        max_total_bytes: int = 0,
+        media_types: Optional[list[str]] = None,
+        max_nsfw_level: int = 0,
+        order: str = ORDER_API,
+        target_width: int = 0,
+        originals_count: int = 0,
+        localize_description: bool = True,
+        video_mode: str = VIDEO_POSTER,
+        poster_probe_bytes: int = DEFAULT_POSTER_PROBE_BYTES
+    ):
+        if order not in ORDERS:
+            raise ValueError(f"Unknown image order: {order} (expected one of {', '.join(ORDERS)})")
+        if video_mode not in VIDEO_MODES:
+            raise ValueError(f"Unknown video mode: {video_mode} (expected one of {', '.join(VIDEO_MODES)})")
+
+        self.max_images = max_images
+        self.max_total_bytes = max_total_bytes
+        self.media_types = [t.lower() for t in media_types or []]
+        self.max_nsfw_level = max_nsfw_level
+        self.order = order
+        self.target_width = target_width
+        self.originals_count = originals_count
+        self.localize_description = localize_description
+        self.video_mode = video_mode
+        self.poster_probe_bytes = max(64 * 1024, poster_probe_bytes)
+
+    @classmethod
+    def from_config(cls, config) -> "ImagePolicy":
+        return cls(
+            max_images=config.get("image_max_count", 0),
+            max_total_bytes=config.get("image_max_total_bytes", 0),
+            media_types=config.get("image_media_types", []),
+            max_nsfw_level=config.get("image_max_nsfw_level", 0),
+            order=config.get("image_order", ORDER_API),
+            target_width=config.get("image_target_width", 0),
+            originals_count=config.get("image_originals_count", 0),
+            localize_description=config.get("image_localize_description", True),
+            video_mode=config.get("image_video_mode", VIDEO_POSTER),
+            poster_probe_bytes=config.get("image_poster_probe_bytes", DEFAULT_POSTER_PROBE_BYTES)
+        )
+
+    def fetch_width(self, rank: int) -> int:
+        """
+        Returns the width to fetch the selected image at position rank with
+        (0 = URL as given, FETCH_ORIGINAL = full resolution).
+        """
+        if not self.target_width:
+            return 0
+        if rank < self.originals_count:
+            return FETCH_ORIGINAL
+        return self.target_width
+
+    def _allowed(self, img) -> bool:
+        if not img.get("url"):
+            return False
+        media_type = (img.get("type") or "image").lower()
+        if self.media_types and media_type not in self.media_types:
+            return False
+        if self.video_mode == VIDEO_SKIP and media_type == "video":
+            return False
+        if self.max_nsfw_level and (img.get("nsfwLevel") or 0) > self.max_nsfw_level:
+            return False
+        return True
+
+    def _rank(self, images: list) -> list:
+        if self.order == ORDER_REACTIONS:
+            # sorted() is stable: equal scores keep the API order
+            images = sorted(images, key=reaction_score, reverse=True)
+        elif self.order == ORDER_DIVERSITY:
+            # Images with a sampler/resolution combination not seen yet come first
+            seen = set()
+            first, rest = [], []
+            for img in sorted(images, key=reaction_score, reverse=True):
+                key = _diversity_key(img)
+                (rest if key in seen else first).append(img)
+                seen.add(key)
+            images = first + rest
+
+        if self.media_types:
+            preference = {media_type: idx for idx, media_type in enumerate(self.media_types)}
+            images = sorted(images, key=lambda img: preference[(img.get("type") or "image").lower()])
+
+        return images
+
+    def select(self, images: list) -> list:
+        """
+        Returns the images to download in display order.
+        """
+        selected = []
+        budget = self.max_total_bytes
+
+        for img in self._rank([img for img in images if self._allowed(img)]):
+            if self.max_images and len(selected) >= self.max_images:
+                break
+            if self.max_total_bytes:
+                size = estimate_image_bytes(img, self.fetch_width(len(selected)), self.video_mode == VIDEO_POSTER)
+                if size > budget:
+                    # A smaller image further down may still fit
+                    continue
+                budget -= size
+            selected.append(img)
+
+        return selected
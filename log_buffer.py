@@ -0,0 +1,167 @@
+# log_buffer.py
+"""
+Bounded log model for the GUI console.
+
+Collects everything written to stdout/stderr into a ring buffer with a fixed
+line cap. The GUI drains pending lines on a timer instead of touching the
+Text widget for every print fragment. Optionally, the complete log is
+written to a rotating file so the widget only has to hold the tail.
+"""
+
+import collections
+import logging
+import logging.handlers
+import threading
+from pathlib import Path
+from typing import Optional
+
+# Log tags in ascending severity (matches the prefixes used by print())
+LOG_LEVELS = ["INFO", "OK", "WARN", "ERROR"]
+LOG_LEVEL_RANK = {level: rank for rank, level in enumerate(LOG_LEVELS)}
+
+DEFAULT_MAX_LINES = 2000
+DEFAULT_FILE_MAX_BYTES = 1024 * 1024
+DEFAULT_FILE_BACKUP_COUNT = 3
+
+
+def detect_level(line: str) -> str:
+    """
+    Returns the log tag of a line based on its [OK]/[WARN]/[ERROR] prefix.
+    """
+    if line.startswith("[OK]"):
+        return "OK"
+    if line.startswith("[WARN]"):
+        return "WARN"
+    if line.startswith("[ERROR]"):
+        return "ERROR"
+    return "INFO"
+
+
+class LogBuffer:
+    """
+    Thread-safe ring buffer of log lines.
+
+    write() may be called from any thread; drain() is meant to be called
+    periodically from the UI thread and returns only the lines that arrived
+    since the last drain and pass the current level filter.
+    """
+
+    def __init__(
+        self,
+        max_lines: int = DEFAULT_MAX_LINES,
+        min_level: str = "INFO",
+        log_file: Optional[Path] = None,
+        file_max_bytes: int = DEFAULT_FILE_MAX_BYTES,
+        file_backup_count: int = DEFAULT_FILE_BACKUP_COUNT
+    ):
+        """
+        Initialize LogBuffer.
+
+        Args:
+            max_lines: Maximum number of lines kept in memory
+            min_level: Lowest tag that is passed on to the widget
+            log_file: Optional path of a rotating log file receiving every line
+            file_max_bytes: Size at which the log file is rotated
+            file_backup_count: Number of rotated log files to keep
+        """
+        self.max_lines = max(1, int(max_lines))
+        self.min_level = min_level if min_level in LOG_LEVEL_RANK else "INFO"
+
+        self._lock = threading.Lock()
+        self._lines: collections.deque = collections.deque(maxlen=self.max_lines)
+        self._pending: collections.deque = collections.deque(maxlen=self.max_lines)
+        self._partial = ""
+        self._dropped = 0
+
+        self._file_logger: Optional[logging.Logger] = None
+        if log_file:
+            self._file_logger = self._create_file_logger(
+                Path(log_file), file_max_bytes, file_backup_count
+            )
+
+    @staticmethod
+    def _create_file_logger(log_file: Path, max_bytes: int, backup_count: int) -> logging.Logger:
+        """
+        Creates a dedicated logger writing plain lines to a rotating file.
+        """
+        log_file.parent.mkdir(parents=True, exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            log_file,
+            maxBytes=max_bytes,
+            backupCount=backup_count,
+            encoding="utf-8"
+        )
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+
+        logger = logging.getLogger(f"ai_model_fetcher.log_buffer.{id(handler)}")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.addHandler(handler)
+        return logger
+
+    def _passes(self, level: str) -> bool:
+        return LOG_LEVEL_RANK[level] >= LOG_LEVEL_RANK[self.min_level]
+
+    def write(self, message: str) -> None:
+        """
+        Adds a fragment of output. Fragments are joined until a newline
+        completes a line (print() writes text and newline separately).
+        """
+        if not message:
+            return
+
+        with self._lock:
+            text = self._partial + message
+            *complete, self._partial = text.split("\n")
+
+            for line in complete:
+                entry = (detect_level(line), line + "\n")
+                self._lines.append(entry)
+                if len(self._pending) == self._pending.maxlen:
+                    self._dropped += 1
+                self._pending.append(entry)
+
+                if self._file_logger:
+                    self._file_logger.info(line)
+
+    def drain(self) -> tuple[list[tuple[str, str]], int]:
+        """
+        Returns lines added since the last drain that pass the level filter.
+
+        Returns:
+            Tuple of ([(tag, line), ...], number of lines dropped because the
+            UI did not drain fast enough)
+        """
+        with self._lock:
+            pending = list(self._pending)
+            self._pending.clear()
+            dropped, self._dropped = self._dropped, 0
+
+        return [entry for entry in pending if self._passes(entry[0])], dropped
+
+    def snapshot(self) -> list[tuple[str, str]]:
+        """
+        Returns all buffered lines that pass the current level filter.
+        """
+        with self._lock:
+            lines = list(self._lines)
+        return [entry for entry in lines if self._passes(entry[0])]
+
+    def set_level(self, level: str) -> None:
+        """
+        Changes the level filter. Use snapshot() afterwards to rebuild the view.
+        """
+        if level not in LOG_LEVEL_RANK:
+            raise ValueError(f"Unknown log level: {level}")
+        with self._lock:
+            self.min_level = level
+            self._pending.clear()
+
+    def clear(self) -> None:
+        """
+        Removes all buffered lines (the log file is kept).
+        """
+        with self._lock:
+            self._lines.clear()
+            self._pending.clear()
+            self._dropped = 0
@@ -0,0 +1,431 @@
+# model_payload.py
+"""
+Memory-efficient parsing of model payloads (/v1/models/{id}).
+
+The full API document contains every version, every image and large meta
+blobs (e.g. ComfyUI workflows). parse_model_payload() walks the raw JSON
+text and decodes one version at a time, keeping only the fields the
+pipeline uses in compact __slots__ records. Versions other than the
+selected one can be reduced to id/name.
+
+The records offer dict-style read access (get / []) with the API field
+names, so the extract_* helpers work on them unchanged.
+"""
+
+import json
+import re
+import sys
+import tracemalloc
+from json.decoder import scanstring
+from typing import Any, Callable, Optional
+
+from generation_stats import (
+    CATEGORICAL_PARAMS, NUMERIC_PARAMS, NEGATIVE_PROMPT_FIELD_NAMES, PROMPT_FIELD_NAMES,
+    SAMPLER_FIELD_NAMES, SCHEDULER_FIELD_NAMES, SIZE_FIELD_NAMES,
+)
+
+# Meta keys kept from image["meta"] (everything else is dropped). Built from
+# the field names the readers use, so a new alias cannot be dropped here.
+META_FIELDS = frozenset([
+    *(name for names in NUMERIC_PARAMS.values() for name in names),
+    *(name for names in CATEGORICAL_PARAMS.values() for name in names),
+    *PROMPT_FIELD_NAMES, *NEGATIVE_PROMPT_FIELD_NAMES,
+    *SAMPLER_FIELD_NAMES, *SCHEDULER_FIELD_NAMES, *SIZE_FIELD_NAMES,
+    # Resources used for the image (LoRAs, embeddings; see resource_resolver)
+    "resources", "civitaiResources",
+])
+
+# Reaction counts kept from image["stats"] (image selection)
+STATS_FIELDS = frozenset(["likeCount", "heartCount", "laughCount", "cryCount", "commentCount"])
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_DECODER = json.JSONDecoder()
+
+
+# =========================================================
+# COMPACT RECORDS
+# =========================================================
+
+class _CompactRecord:
+    """
+    Base class of the compact records. _FIELDS maps API keys to attributes.
+    """
+
+    __slots__ = ()
+    _FIELDS: dict = {}
+
+    def get(self, key: str, default: Any = None) -> Any:
+        attr = self._FIELDS.get(key)
+        if attr is None:
+            return default
+        value = getattr(self, attr)
+        return default if value is None else value
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._FIELDS:
+            raise KeyError(key)
+        return getattr(self, self._FIELDS[key])
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._FIELDS and getattr(self, self._FIELDS[key]) is not None
+
+    def to_dict(self) -> dict:
+        """
+        Returns the record as a plain dict with the API field names.
+        """
+        result = {}
+        for key, attr in self._FIELDS.items():
+            value = getattr(self, attr)
+            if value is None:
+                continue
+            if isinstance(value, list):
+                value = [v.to_dict() if isinstance(v, _CompactRecord) else v for v in value]
+            result[key] = value
+        return result
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{attr}={getattr(self, attr)!r}" for attr in self.__slots__[:2])
+        return f"{type(self).__name__}({fields})"
+
+
+class ImageInfo(_CompactRecord):
+    """Sample image of a version (url, meta, reactions and basic properties)."""
+
+    __slots__ = ("url", "meta", "type", "width", "height", "nsfw_level", "stats")
+    _FIELDS = {
+        "url": "url",
+        "meta": "meta",
+        "type": "type",
+        "width": "width",
+        "height": "height",
+        "nsfwLevel": "nsfw_level",
+        "stats": "stats",
+    }
+
+    def __init__(self, data: dict):
+        self.url = data.get("url")
+        meta = data.get("meta")
+        self.meta = {k: v for k, v in meta.items() if k in META_FIELDS} if isinstance(meta, dict) else None
+        self.type = data.get("type")
+        self.width = data.get("width")
+        self.height = data.get("height")
+        self.nsfw_level = data.get("nsfwLevel")
+        stats = data.get("stats")
+        self.stats = {k: v for k, v in stats.items() if k in STATS_FIELDS} if isinstance(stats, dict) else None
+
+
+class FileInfo(_CompactRecord):
+    """Downloadable file of a version."""
+
+    __slots__ = ("name", "type", "format", "size_kb", "download_url", "hashes", "training")
+    _FIELDS = {
+        "name": "name",
+        "type": "type",
+        "format": "format",
+        "sizeKB": "size_kb",
+        "downloadUrl": "download_url",
+        "hashes": "hashes",
+        "training": "training",
+    }
+
+    def __init__(self, data: dict):
+        self.name = data.get("name")
+        self.type = data.get("type")
+        self.format = data.get("format")
+        self.size_kb = data.get("sizeKB")
+        self.download_url = data.get("downloadUrl")
+        self.hashes = data.get("hashes")
+        self.training = data.get("training")
+
+
+class VersionInfo(_CompactRecord):
+    """Model version. images/files are None for versions parsed as stubs."""
+
+    __slots__ = ("id", "name", "base_model", "trained_words", "images", "files")
+    _FIELDS = {
+        "id": "id",
+        "name": "name",
+        "baseModel": "base_model",
+        "trainedWords": "trained_words",
+        "images": "images",
+        "files": "files",
+    }
+
+    def __init__(self, data: dict, full: bool = True):
+        self.id = data.get("id")
+        self.name = data.get("name")
+        self.base_model = data.get("baseModel")
+        self.trained_words = data.get("trainedWords")
+        if full:
+            self.images = [ImageInfo(img) for img in data.get("images") or []]
+            self.files = [FileInfo(f) for f in data.get("files") or []]
+        else:
+            self.images = None
+            self.files = None
+
+
+class ModelInfo(_CompactRecord):
+    """Model with its versions."""
+
+    __slots__ = ("id", "name", "type", "description", "image", "base_model", "versions")
+    _FIELDS = {
+        "id": "id",
+        "name": "name",
+        "type": "type",
+        "description": "description",
+        "image": "image",
+        "baseModel": "base_model",
+        "modelVersions": "versions",
+    }
+
+    def __init__(self):
+        self.id = None
+        self.name = None
+        self.type = None
+        self.description = None
+        self.image = None
+        self.base_model = None
+        self.versions: list[VersionInfo] = []
+
+
+# =========================================================
+# INCREMENTAL PARSER
+# =========================================================
+
+def _skip_ws(text: str, idx: int) -> int:
+    return _WHITESPACE.match(text, idx).end()
+
+
+def _walk_object(text: str, idx: int, on_field: Callable[[str, int], int]) -> int:
+    """
+    Walks the object starting at text[idx] == "{" without decoding it.
+    on_field(key, value_idx) must consume the value and return its end index.
+    Returns the index after the closing brace.
+    """
+    if text[idx] != "{":
+        raise ValueError(f"Expected object at position {idx}")
+
+    idx = _skip_ws(text, idx + 1)
+    if text[idx] == "}":
+        return idx + 1
+
+    while True:
+        if text[idx] != '"':
+            raise ValueError(f"Expected key at position {idx}")
+        key, idx = scanstring(text, idx + 1)
+        idx = _skip_ws(text, idx)
+        if text[idx] != ":":
+            raise ValueError(f"Expected ':' at position {idx}")
+
+        idx = on_field(key, _skip_ws(text, idx + 1))
+        idx = _skip_ws(text, idx)
+
+        if text[idx] == ",":
+            idx = _skip_ws(text, idx + 1)
+        elif text[idx] == "}":
+            return idx + 1
+        else:
+            raise ValueError(f"Expected ',' or '}}' at position {idx}")
+
+
+def _walk_array(text: str, idx: int, on_item: Callable[[int], int]) -> int:
+    """
+    Walks the array starting at text[idx] == "[".
+    on_item(value_idx) must consume the item and return its end index.
+    """
+    if text[idx] != "[":
+        raise ValueError(f"Expected array at position {idx}")
+
+    idx = _skip_ws(text, idx + 1)
+    if text[idx] == "]":
+        return idx + 1
+
+    while True:
+        idx = _skip_ws(text, on_item(idx))
+        if text[idx] == ",":
+            idx = _skip_ws(text, idx + 1)
+        elif text[idx] == "]":
+            return idx + 1
+        else:
+            raise ValueError(f"Expected ',' or ']' at position {idx}")
+
+
+def parse_model_payload(raw, version_name: Optional[str] = None, full_versions: bool = True) -> ModelInfo:
+    """
+    Parses a model payload into a compact ModelInfo.
+
+    Only one version object is decoded into Python dicts at a time.
+
+    Args:
+        raw: Response body (bytes or str)
+        version_name: If given, only the matching version (case-insensitive)
+                      keeps images and files; all others are id/name stubs
+        full_versions: If False, every version is parsed as a stub
+
+    Returns:
+        ModelInfo
+    """
+    text = raw.decode("utf-8") if isinstance(raw, (bytes, bytearray)) else raw
+    wanted = version_name.lower() if version_name is not None else None
+    model = ModelInfo()
+
+    scalar_fields = {
+        "id": "id",
+        "name": "name",
+        "type": "type",
+        "description": "description",
+        "image": "image",
+        "baseModel": "base_model",
+    }
+
+    def on_version(idx: int) -> int:
+        data, end = _DECODER.raw_decode(text, idx)
+        if isinstance(data, dict):
+            full = full_versions and (wanted is None or str(data.get("name", "")).lower() == wanted)
+            model.versions.append(VersionInfo(data, full=full))
+        return end
+
+    def on_field(key: str, idx: int) -> int:
+        if key == "modelVersions" and text[idx] == "[":
+            return _walk_array(text, idx, on_version)
+
+        value, end = _DECODER.raw_decode(text, idx)
+        attr = scalar_fields.get(key)
+        if attr:
+            setattr(model, attr, value)
+        return end
+
+    _walk_object(text, _skip_ws(text, 0), on_field)
+    return model
+
+
+def walk_model_payload(raw, on_version: Callable[[dict], None]) -> dict:
+    """
+    Decodes a model payload one version at a time without keeping the
+    versions: on_version(version) is called for every entry of
+    modelVersions (in order).
+
+    Returns: the model-level fields (without modelVersions).
+    """
+    text = raw.decode("utf-8") if isinstance(raw, (bytes, bytearray)) else raw
+    model: dict = {}
+
+    def on_item(idx: int) -> int:
+        data, end = _DECODER.raw_decode(text, idx)
+        on_version(data)
+        return end
+
+    def on_field(key: str, idx: int) -> int:
+        if key == "modelVersions" and text[idx] == "[":
+            return _walk_array(text, idx, on_item)
+        model[key], end = _DECODER.raw_decode(text, idx)
+        return end
+
+    _walk_object(text, _skip_ws(text, 0), on_field)
+    return model
+
+
+# =========================================================
+# MEMORY BENCHMARK
+# =========================================================
+
+def synthetic_payload(versions: int = 20, images: int = 100, workflow_size: int = 4000) -> bytes:
+    """
+    Creates a model payload resembling a large real-world model.
+    """
+    workflow = {"nodes": [{"id": i, "widgets": ["x" * 16] * 4} for i in range(workflow_size // 80)]}
+    data = {
+        "id": 1,
+        "name": "Benchmark Model",
+        "type": "Checkpoint",
+        "description": "<p>" + "Lorem ipsum " * 200 + "</p>",
+        "stats": {"downloadCount": 1, "rating": 5},
+        "modelVersions": [
+            {
+                "id": v,
+                "name": f"v{v}.0",
+                "baseModel": "SDXL 1.0",
+                "stats": {"downloadCount": v},
+                "files": [{
+                    "name": f"model_v{v}.safetensors",
+                    "sizeKB": 6_500_000,
+                    "type": "Model",
+                    "format": "SafeTensor",
+                    "downloadUrl": f"https://civitai.com/api/download/models/{v}",
+                    "hashes": {"SHA256": "0" * 64, "AutoV2": "0" * 10},
+                }],
+                "images": [
+                    {
+                        "url": f"https://image.civitai.com/x/{v}-{i}/width=1024/{i}.jpeg",
+                        "nsfwLevel": 1,
+                        "width": 1024,
+                        "height": 1536,
+                        "hash": "U" * 28,
+                        "type": "image",
+                        "stats": {"likeCount": i, "heartCount": i},
+                        "meta": {
+                            "prompt": f"masterpiece, best quality, 1girl, solo, image {i}",
+                            "negativePrompt": "lowres, bad anatomy, worst quality",
+                            "sampler": "DPM++ 2M Karras",
+                            "steps": 30,
+                            "cfgScale": 7,
+                            "seed": i,
+                            "Size": "1024x1536",
+                            "comfy": workflow,
+                        },
+                    }
+                    for i in range(images)
+                ],
+            }
+            for v in range(versions)
+        ],
+    }
+    return json.dumps(data).encode("utf-8")
+
+
+def _measure(func: Callable[[], Any]) -> tuple[int, int]:
+    """
+    Returns (peak bytes, retained bytes) allocated while running func.
+    """
+    tracemalloc.start()
+    try:
+        result = func()
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return peak, retained
+
+
+def benchmark_memory(raw: bytes, version_name: Optional[str] = None) -> dict:
+    """
+    Compares json.loads() with parse_model_payload() on the same payload.
+
+    Returns:
+        Dict with peak/retained bytes for "dict" and "compact"
+    """
+    dict_peak, dict_retained = _measure(lambda: json.loads(raw))
+    compact_peak, compact_retained = _measure(lambda: parse_model_payload(raw, version_name))
+    return {
+        "payload_bytes": len(raw),
+        "dict": {"peak": dict_peak, "retained": dict_retained},
+        "compact": {"peak": compact_peak, "retained": compact_retained},
+    }
+
+
+if __name__ == "__main__":
+    # Usage: python model_payload.py [payload.json] [version name]
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "rb") as f:
+            payload = f.read()
+    else:
+        payload = synthetic_payload()
+    selected = sys.argv[2] if len(sys.argv) > 2 else None
+
+    stats = benchmark_memory(payload, selected)
+    print(f"[INFO] Payload: {stats['payload_bytes'] / 1024 / 1024:.2f} MB")
+    for name in ("dict", "compact"):
+        print(
+            f"[INFO] {name:8s} peak {stats[name]['peak'] / 1024 / 1024:8.2f} MB | "
+            f"retained {stats[name]['retained'] / 1024 / 1024:8.2f} MB"
+        )
@@ -0,0 +1,465 @@
+# output_sinks.py
+"""
+Output sinks for generated notes and images.
+
+A sink receives (kind, relative path, bytes) and decides where the data ends
+up: plain directories (default), a single append-only zip/tar archive per
+batch, or an S3-compatible object store. Archive and S3 sinks buffer writes
+and flush them in bulk.
+"""
+
+import datetime
+import hashlib
+import hmac
+import io
+import itertools
+import mimetypes
+import tarfile
+import threading
+import time
+import warnings
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+from typing import Any, Iterable, Optional
+from urllib.parse import quote, urlparse
+
+import requests
+
+# Kinds of output (each kind has its own root / prefix)
+SINK_MARKDOWN = "markdown"
+SINK_IMAGES = "images"
+
+DEFAULT_PREFIXES = {
+    SINK_MARKDOWN: "models",
+    SINK_IMAGES: "images",
+}
+
+DEFAULT_BUFFER_BYTES = 8 * 1024 * 1024
+DEFAULT_S3_WORKERS = 8
+
+# Appends of several sinks (concurrent jobs) to one archive are serialized per path
+_archive_locks: dict[Path, threading.Lock] = {}
+_archive_locks_guard = threading.Lock()
+
+
+def _archive_lock(path: Path) -> threading.Lock:
+    with _archive_locks_guard:
+        return _archive_locks.setdefault(path.resolve(), threading.Lock())
+
+
+# Formats that are already compressed (stored, not deflated, in zip archives)
+_COMPRESSED_SUFFIXES = {".jpeg", ".jpg", ".png", ".gif", ".webp", ".mp4", ".webm", ".zst", ".gz"}
+
+
+class OutputSink:
+    """
+    Base class of all output sinks. Implementations must be thread-safe.
+    """
+
+    def write_bytes(self, kind: str, relpath, data: bytes) -> str:
+        """
+        Stores data under the given kind and relative path.
+        Returns: location of the written object (for log output).
+        """
+        raise NotImplementedError
+
+    def write_text(self, kind: str, relpath, text: str) -> str:
+        """
+        Stores text (UTF-8) under the given kind and relative path.
+        """
+        return self.write_bytes(kind, relpath, text.encode("utf-8"))
+
+    def write_stream(self, kind: str, relpath, chunks: Iterable[bytes]) -> str:
+        """
+        Stores data arriving in chunks (large downloads). Buffering sinks
+        collect the chunks; LocalDirSink writes them as they arrive.
+        """
+        return self.write_bytes(kind, relpath, b"".join(chunks))
+
+    def flush(self) -> None:
+        """
+        Writes all buffered data.
+        """
+
+    def close(self) -> None:
+        """
+        Flushes and releases the sink.
+        """
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def write_file_stream(out_file: Path, chunks: Iterable[bytes]) -> None:
+    """
+    Writes chunks to out_file under a temporary name and renames it when
+    complete, so an aborted download leaves no truncated file.
+    """
+    out_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = out_file.with_name(f".{out_file.name}.part")
+    try:
+        with tmp_file.open("wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        tmp_file.replace(out_file)
+    finally:
+        tmp_file.unlink(missing_ok=True)
+
+
+def _posix_relpath(relpath) -> str:
+    """
+    Normalizes a relative path to a forward-slash string without leading slash.
+    """
+    return PurePosixPath(*Path(relpath).parts).as_posix().lstrip("/")
+
+
+# =========================================================
+# LOCAL DIRECTORIES
+# =========================================================
+
+class LocalDirSink(OutputSink):
+    """
+    Writes directly into the markdown and image output directories
+    (the original behavior).
+    """
+
+    def __init__(self, md_output_dir: Path, img_output_dir: Path):
+        self.roots = {
+            SINK_MARKDOWN: Path(md_output_dir),
+            SINK_IMAGES: Path(img_output_dir),
+        }
+
+    def path_for(self, kind: str, relpath) -> Path:
+        """
+        Returns the local file path of an output.
+        """
+        return self.roots[kind] / relpath
+
+    def write_bytes(self, kind: str, relpath, data: bytes) -> str:
+        out_file = self.path_for(kind, relpath)
+        out_file.parent.mkdir(parents=True, exist_ok=True)
+        out_file.write_bytes(data)
+        return str(out_file)
+
+    def write_stream(self, kind: str, relpath, chunks: Iterable[bytes]) -> str:
+        out_file = self.path_for(kind, relpath)
+        write_file_stream(out_file, chunks)
+        return str(out_file)
+
+
+# =========================================================
+# ARCHIVES
+# =========================================================
+
+class ArchiveSink(OutputSink):
+    """
+    Appends all outputs of a batch to a single archive.
+
+    Supported formats (by suffix): .zip and .tar are opened in append mode
+    on every flush, so the archive stays valid between flushes; sinks of
+    concurrent jobs append to the same file one flush at a time (within one
+    process - separate processes need separate archive paths). .tar.gz/.tgz
+    is written as one stream that is finalized on close(), so every sink
+    writes its own archive: if the path exists already (earlier run or a
+    concurrent job), a numbered sibling (batch-1.tar.gz, ...) is created
+    instead of replacing it.
+    Writing the same path twice appends a second member (the last one wins
+    on extraction).
+    """
+
+    def __init__(
+        self,
+        archive_path: Path,
+        prefixes: Optional[dict] = None,
+        buffer_bytes: int = DEFAULT_BUFFER_BYTES
+    ):
+        self.archive_path = Path(archive_path)
+        self.archive_path.parent.mkdir(parents=True, exist_ok=True)
+        self.prefixes = prefixes or DEFAULT_PREFIXES
+        self.buffer_bytes = buffer_bytes
+
+        name = self.archive_path.name.lower()
+        if name.endswith(".zip"):
+            self.format = "zip"
+        elif name.endswith(".tar"):
+            self.format = "tar"
+        elif name.endswith((".tar.gz", ".tgz")):
+            self.format = "tar.gz"
+        else:
+            raise ValueError(f"Unsupported archive format: {self.archive_path}")
+
+        self._lock = threading.Lock()
+        self._archive_lock = _archive_lock(self.archive_path)
+        self._buffer: list[tuple[str, bytes]] = []
+        self._buffered = 0
+        self._stream: Optional[tarfile.TarFile] = None
+        self._stream_file = None
+
+    def _member_name(self, kind: str, relpath) -> str:
+        prefix = self.prefixes.get(kind, kind)
+        return f"{prefix}/{_posix_relpath(relpath)}" if prefix else _posix_relpath(relpath)
+
+    def write_bytes(self, kind: str, relpath, data: bytes) -> str:
+        name = self._member_name(kind, relpath)
+        with self._lock:
+            self._buffer.append((name, data))
+            self._buffered += len(data)
+            if self._buffered >= self.buffer_bytes:
+                self._flush_locked()
+        return f"{self.archive_path}:{name}"
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if not self._buffer:
+            return
+
+        entries, self._buffer, self._buffered = self._buffer, [], 0
+
+        if self.format == "zip":
+            with self._archive_lock, zipfile.ZipFile(self.archive_path, "a") as zf, warnings.catch_warnings():
+                # Re-written paths are appended on purpose
+                warnings.simplefilter("ignore", UserWarning)
+                date_time = time.localtime()[:6]
+                for name, data in entries:
+                    info = zipfile.ZipInfo(name, date_time=date_time)
+                    info.compress_type = (
+                        zipfile.ZIP_STORED
+                        if PurePosixPath(name).suffix.lower() in _COMPRESSED_SUFFIXES
+                        else zipfile.ZIP_DEFLATED
+                    )
+                    zf.writestr(info, data)
+        elif self.format == "tar":
+            with self._archive_lock, tarfile.open(self.archive_path, "a") as tf:
+                self._add_tar_members(tf, entries)
+        else:
+            if self._stream is None:
+                self._stream_file = self._create_stream_file()
+                self._stream = tarfile.open(fileobj=self._stream_file, mode="w:gz")
+            self._add_tar_members(self._stream, entries)
+
+    def _create_stream_file(self):
+        """
+        Creates the .tar.gz file of this sink (exclusively, so an existing
+        archive is never truncated).
+        """
+        name = self.archive_path.name
+        suffix = name[-len(".tar.gz"):] if name.lower().endswith(".tar.gz") else self.archive_path.suffix
+        stem = name[:-len(suffix)]
+        for idx in itertools.count():
+            path = self.archive_path if idx == 0 else self.archive_path.with_name(f"{stem}-{idx}{suffix}")
+            try:
+                stream_file = path.open("xb")
+            except FileExistsError:
+                continue
+            if idx:
+                print(f"[INFO] {self.archive_path} exists, writing {path}")
+                self.archive_path = path
+            return stream_file
+
+    @staticmethod
+    def _add_tar_members(tf: tarfile.TarFile, entries: list[tuple[str, bytes]]) -> None:
+        now = time.time()
+        for name, data in entries:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = now
+            tf.addfile(info, io.BytesIO(data))
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_locked()
+            if self._stream is not None:
+                self._stream.close()
+                self._stream_file.close()
+                self._stream = None
+                self._stream_file = None
+
+
+# =========================================================
+# S3-COMPATIBLE OBJECT STORE
+# =========================================================
+
+class S3Sink(OutputSink):
+    """
+    Uploads outputs to an S3-compatible endpoint (AWS S3, MinIO, ...)
+    using path-style URLs and AWS Signature Version 4.
+
+    Objects are buffered and uploaded in parallel once the buffer is full
+    or on flush()/close().
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        bucket: str,
+        access_key: str,
+        secret_key: str,
+        region: str = "us-east-1",
+        prefix: str = "",
+        prefixes: Optional[dict] = None,
+        buffer_bytes: int = DEFAULT_BUFFER_BYTES,
+        max_workers: int = DEFAULT_S3_WORKERS,
+        timeout: int = 30
+    ):
+        if not endpoint or not bucket:
+            raise ValueError("S3 sink requires an endpoint and a bucket")
+
+        self.endpoint = endpoint.rstrip("/")
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.prefix = prefix.strip("/")
+        self.prefixes = prefixes or DEFAULT_PREFIXES
+        self.buffer_bytes = buffer_bytes
+        self.max_workers = max_workers
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._buffer: list[tuple[str, bytes]] = []
+        self._buffered = 0
+
+    def _object_key(self, kind: str, relpath) -> str:
+        parts = [self.prefix, self.prefixes.get(kind, kind), _posix_relpath(relpath)]
+        return "/".join(p for p in parts if p)
+
+    def write_bytes(self, kind: str, relpath, data: bytes) -> str:
+        key = self._object_key(kind, relpath)
+        with self._lock:
+            self._buffer.append((key, data))
+            self._buffered += len(data)
+            entries = None
+            if self._buffered >= self.buffer_bytes:
+                entries, self._buffer, self._buffered = self._buffer, [], 0
+        if entries:
+            self._upload_all(entries)
+        return f"s3://{self.bucket}/{key}"
+
+    def flush(self) -> None:
+        with self._lock:
+            entries, self._buffer, self._buffered = self._buffer, [], 0
+        if entries:
+            self._upload_all(entries)
+
+    def _upload_all(self, entries: list[tuple[str, bytes]]) -> None:
+        with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as executor:
+            results = list(executor.map(lambda e: self._put_object(*e), entries))
+
+        failed = [key for key, ok in zip((k for k, _ in entries), results) if not ok]
+        if failed:
+            raise RuntimeError(f"S3 upload failed for {len(failed)} objects (first: {failed[0]})")
+
+    def _put_object(self, key: str, data: bytes) -> bool:
+        url = f"{self.endpoint}/{self.bucket}/{quote(key, safe='/~')}"
+        headers = self._signed_headers("PUT", url, data)
+        content_type = mimetypes.guess_type(key)[0]
+        if content_type:
+            headers["Content-Type"] = content_type
+
+        try:
+            response = requests.put(url, data=data, headers=headers, timeout=self.timeout)
+            response.raise_for_status()
+            return True
+        except requests.exceptions.RequestException as e:
+            print(f"[WARN] S3 upload failed: {key} ({e})")
+            return False
+
+    def _signed_headers(self, method: str, url: str, payload: bytes) -> dict:
+        """
+        Creates the AWS Signature Version 4 headers for a request.
+        """
+        now = datetime.datetime.now(datetime.timezone.utc)
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        date_stamp = now.strftime("%Y%m%d")
+
+        parsed = urlparse(url)
+        payload_hash = hashlib.sha256(payload).hexdigest()
+
+        canonical_headers = (
+            f"host:{parsed.netloc}\n"
+            f"x-amz-content-sha256:{payload_hash}\n"
+            f"x-amz-date:{amz_date}\n"
+        )
+        signed_headers = "host;x-amz-content-sha256;x-amz-date"
+        canonical_request = "\n".join([
+            method,
+            parsed.path or "/",
+            parsed.query,
+            canonical_headers,
+            signed_headers,
+            payload_hash,
+        ])
+
+        scope = f"{date_stamp}/{self.region}/s3/aws4_request"
+        string_to_sign = "\n".join([
+            "AWS4-HMAC-SHA256",
+            amz_date,
+            scope,
+            hashlib.sha256(canonical_request.encode("utf-8")).hexdigest(),
+        ])
+
+        def _hmac(key: bytes, msg: str) -> bytes:
+            return hmac.new(key, msg.encode("utf-8"), hashlib.sha256).digest()
+
+        signing_key = _hmac(f"AWS4{self.secret_key}".encode("utf-8"), date_stamp)
+        signing_key = _hmac(signing_key, self.region)
+        signing_key = _hmac(signing_key, "s3")
+        signing_key = _hmac(signing_key, "aws4_request")
+        signature = hmac.new(signing_key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+
+        return {
+            "x-amz-date": amz_date,
+            "x-amz-content-sha256": payload_hash,
+            "Authorization": (
+                f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+                f"SignedHeaders={signed_headers}, Signature={signature}"
+            ),
+        }
+
+
+# =========================================================
+# FACTORY
+# =========================================================
+
+def create_sink(config: Any, md_output_dir: Path, img_output_dir: Path) -> OutputSink:
+    """
+    Creates the sink selected by the "output_sink" config key.
+
+    Args:
+        config: ConfigManager (or any object with get(key, default))
+        md_output_dir: Markdown output directory (local sink)
+        img_output_dir: Image output directory (local sink)
+    """
+    kind = config.get("output_sink", "local")
+    buffer_bytes = config.get("output_buffer_bytes", DEFAULT_BUFFER_BYTES)
+
+    if kind == "local":
+        return LocalDirSink(md_output_dir, img_output_dir)
+
+    if kind == "archive":
+        return ArchiveSink(
+            Path(config.get("output_archive_path", "./output/batch.zip")),
+            buffer_bytes=buffer_bytes
+        )
+
+    if kind == "s3":
+        return S3Sink(
+            endpoint=config.get("s3_endpoint", ""),
+            bucket=config.get("s3_bucket", ""),
+            access_key=config.get("s3_access_key", ""),
+            secret_key=config.get("s3_secret_key", ""),
+            region=config.get("s3_region", "us-east-1"),
+            prefix=config.get("s3_prefix", ""),
+            buffer_bytes=buffer_bytes,
+            timeout=config.get("api_timeout", 30)
+        )
+
+    raise ValueError(f"Unknown output sink: {kind}")
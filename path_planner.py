@@ -0,0 +1,186 @@
+# path_planner.py
+"""
+Output path planning for fetch jobs.
+
+All output paths of a version (image directory, image base names, note
+filename) are computed once before any I/O. Sanitization is memoized,
+Unicode-aware (NFC-normalized, \\w matches non-ASCII letters), names are
+capped to a safe byte length, and names that collide after sanitization
+(e.g. "v1.0" and "v1_0", or different case on case-insensitive
+filesystems) get a numeric suffix.
+"""
+
+import functools
+import hashlib
+import re
+import threading
+import unicodedata
+from pathlib import Path
+from typing import Optional
+
+# Characters allowed in sanitized names (\w is Unicode-aware)
+_UNSAFE_CHARS_RE = re.compile(r"[^\w\d\-_ ]")
+# Characters not allowed in path components on common filesystems
+_PATH_UNSAFE_CHARS_RE = re.compile(r'[\x00-\x1f<>:"/\\|?*]')
+
+# Most filesystems limit a single path component to 255 bytes
+MAX_COMPONENT_BYTES = 255
+# Room kept for suffixes (".jpeg", "_123", collision counters)
+SUFFIX_RESERVE_BYTES = 16
+
+
+@functools.lru_cache(maxsize=4096)
+def sanitize_filename(text: str) -> str:
+    """
+    Removes problematic characters from filenames.
+    """
+    text = unicodedata.normalize("NFC", text)
+    return _UNSAFE_CHARS_RE.sub("_", text).strip()
+
+
+@functools.lru_cache(maxsize=4096)
+def sanitize_path_component(text: str) -> str:
+    """
+    Replaces only characters that are invalid in a path component
+    (keeps dots, so "v16.0" stays "v16.0").
+    """
+    text = unicodedata.normalize("NFC", text)
+    return _PATH_UNSAFE_CHARS_RE.sub("_", text).strip().rstrip(".")
+
+
+def cap_length(name: str, max_bytes: int) -> str:
+    """
+    Shortens a name to max_bytes (UTF-8). Shortened names end with a short
+    hash of the full name so different long names stay distinct.
+    """
+    encoded = name.encode("utf-8")
+    if len(encoded) <= max_bytes:
+        return name
+
+    digest = hashlib.sha1(encoded).hexdigest()[:8]
+    head = encoded[:max(0, max_bytes - len(digest) - 1)].decode("utf-8", errors="ignore")
+    return f"{head.rstrip()}~{digest}"
+
+
+class PathPlan:
+    """
+    Output paths of one version, relative to the sink roots.
+
+    Attributes:
+        sanitized_model_name: Sanitized model name
+        image_dir: Directory of the version images (relative to the image root)
+        image_bases: Target paths without suffix, one per image (index 0 = image 1)
+        note_relpath: Note path (relative to the markdown root)
+    """
+
+    __slots__ = ("sanitized_model_name", "image_dir", "image_bases", "note_relpath")
+
+    def __init__(self, sanitized_model_name: str, image_dir: Path, image_bases: list[Path], note_relpath: Path):
+        self.sanitized_model_name = sanitized_model_name
+        self.image_dir = image_dir
+        self.image_bases = image_bases
+        self.note_relpath = note_relpath
+
+    @property
+    def note_stem(self) -> str:
+        """Note filename without .md (target of wiki links)."""
+        return self.note_relpath.stem
+
+
+class PathPlanner:
+    """
+    Plans output paths for a job and detects collisions between them.
+    One planner should be shared by all versions written in the same batch.
+    """
+
+    def __init__(self, max_component_bytes: int = MAX_COMPONENT_BYTES):
+        self.max_bytes = max(SUFFIX_RESERVE_BYTES + 16, max_component_bytes) - SUFFIX_RESERVE_BYTES
+        self._lock = threading.Lock()
+        # casefolded "namespace:path" -> owner key
+        self._claimed: dict[str, tuple] = {}
+        self._plans: dict[tuple, PathPlan] = {}
+
+    def _claim(self, namespace: str, path: Path, owner: tuple) -> Path:
+        """
+        Reserves a path for owner. Returns the path, or a numbered variant
+        if another owner already holds it.
+        """
+        candidate = path
+        counter = 2
+        while True:
+            key = f"{namespace}:{candidate}".casefold()
+            holder = self._claimed.get(key)
+            if holder is None or holder == owner:
+                self._claimed[key] = owner
+                return candidate
+            candidate = path.with_name(f"{path.name}_{counter}")
+            counter += 1
+
+    def plan_version(
+        self,
+        model_name: str,
+        version_name: str,
+        image_count: int,
+        model_id: Optional[int] = None
+    ) -> PathPlan:
+        """
+        Computes all output paths of a version.
+
+        Args:
+            model_name: Model name from the API
+            version_name: Version name from the API
+            image_count: Number of sample images
+            model_id: Model ID (distinguishes models with the same name)
+        """
+        owner = (model_id, model_name, version_name)
+
+        with self._lock:
+            cached = self._plans.get(owner)
+            if cached is not None and len(cached.image_bases) >= image_count:
+                return cached
+
+            model_part = cap_length(sanitize_filename(model_name), self.max_bytes)
+            version_part = cap_length(sanitize_filename(version_name), self.max_bytes)
+
+            model_dir = self._claim("dir", Path(model_part), (model_id, model_name))
+            model_part = model_dir.name
+
+            image_dir = self._claim("images", model_dir / version_part, owner)
+            version_part = image_dir.name
+
+            image_prefix = cap_length(f"{model_part}_{version_part}", self.max_bytes)
+            image_bases = [
+                image_dir / f"{image_prefix}_{idx}" for idx in range(1, image_count + 1)
+            ]
+
+            note_stem = cap_length(
+                f"{model_part}{sanitize_path_component(version_name)}", self.max_bytes
+            )
+            note_stem = self._claim("notes", model_dir / note_stem, owner).name
+
+            plan = PathPlan(model_part, image_dir, image_bases, model_dir / f"{note_stem}.md")
+            self._plans[owner] = plan
+            return plan
+
+    def plan_description(self, model_name: str, image_count: int, model_id: Optional[int] = None) -> list[Path]:
+        """
+        Returns the target paths without suffix of the images embedded in the
+        model description (relative to the image root; index 0 = image 1).
+        """
+        with self._lock:
+            model_part = cap_length(sanitize_filename(model_name), self.max_bytes)
+            model_dir = self._claim("dir", Path(model_part), (model_id, model_name))
+            # Claimed like a version directory, so a version named "_description" gets another one
+            image_dir = self._claim("images", model_dir / "_description", (model_id, model_name, None))
+            image_prefix = cap_length(f"{model_dir.name}_{image_dir.name}", self.max_bytes)
+            return [image_dir / f"{image_prefix}_{idx}" for idx in range(1, image_count + 1)]
+
+    def plan_index(self, model_name: str, model_id: Optional[int] = None) -> Path:
+        """
+        Returns the path of the model index note (relative to the markdown root).
+        """
+        with self._lock:
+            model_part = cap_length(sanitize_filename(model_name), self.max_bytes)
+            model_dir = self._claim("dir", Path(model_part), (model_id, model_name))
+            stem = self._claim("notes", model_dir / model_dir.name, (model_id, model_name, None)).name
+            return model_dir / f"{stem}.md"
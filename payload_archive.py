@@ -0,0 +1,417 @@
+# payload_archive.py
+"""
+Compressed history of fetched model payloads with structural diffs.
+
+Every fetched payload is split into its model part and one part per
+version. Parts are stored as canonical JSON, compressed (zstd if the
+zstandard package is installed, zlib otherwise) and addressed by their
+SHA-256, so a version that did not change between two fetches is stored
+only once. Each part records its codec, so an archive written with zlib
+stays readable after zstandard is installed (and may mix both). The counters that change on every fetch (the "stats" of the
+model, its versions and their images) are kept out of those parts in one
+small stats part per snapshot. A snapshot row then only references part
+digests, which keeps thousands of snapshots cheap.
+
+Payloads are decoded one version at a time (model_payload.walk_model_payload),
+and a payload byte-identical to the latest snapshot is recognized by its
+digest without decoding it at all.
+
+Everything lives in one SQLite file; snapshots are indexed by model and
+fetch time for random access. Restored payloads are structurally equal to
+the fetched ones (key order and whitespace are canonicalized).
+
+Usage:
+    python payload_archive.py list <model_id>              snapshots of a model
+    python payload_archive.py show <model_id> [time]       payload as of a time
+    python payload_archive.py diff <model_id> [from] [to]  changes (default: last two)
+
+Times are Unix timestamps or ISO dates (2024-05-01, 2024-05-01T12:00).
+"""
+
+import argparse
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from config import ConfigManager
+from model_payload import walk_model_payload
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODEC_ZLIB = "zlib"
+CODEC_ZSTD = "zstd"
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 10
+ARCHIVE_FILE_NAME = "payloads.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    codec TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    model_id INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    model_blob TEXT NOT NULL,
+    version_blobs TEXT NOT NULL,
+    stats_blob TEXT,
+    raw_digest TEXT
+);
+CREATE INDEX IF NOT EXISTS snapshots_model ON snapshots (model_id, fetched_at);
+"""
+# Columns added after the first schema (archives written before get them on open)
+ADDED_COLUMNS = {"stats_blob": "TEXT", "raw_digest": "TEXT"}
+
+# Counters that change on every fetch, stored apart from the model/version parts
+VOLATILE_FIELD = "stats"
+
+# Version/file fields compared by the diff
+FILE_FIELDS = ("sizeKB", "format", "fp", "type", "downloadUrl")
+VERSION_FIELDS = ("name", "baseModel", "trainedWords", "publishedAt")
+MODEL_FIELDS = ("name", "type", "nsfw", "tags", "description")
+
+
+def _compress(data: bytes) -> tuple[str, bytes]:
+    if zstandard is not None:
+        return CODEC_ZSTD, zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return CODEC_ZLIB, zlib.compress(data, ZLIB_LEVEL)
+
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(data)
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Snapshot part is zstd-compressed; install the zstandard package")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+def _canonical(obj) -> bytes:
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _split_volatile(obj: dict) -> dict:
+    """
+    Removes the counters from a model or version part (in place).
+    Returns: the removed counters (see _merge_volatile).
+    """
+    removed = {}
+    if VOLATILE_FIELD in obj:
+        removed["stats"] = obj.pop(VOLATILE_FIELD)
+    images = {}
+    for idx, img in enumerate(obj.get("images") or []):
+        if isinstance(img, dict) and VOLATILE_FIELD in img:
+            images[str(idx)] = img.pop(VOLATILE_FIELD)
+    if images:
+        removed["images"] = images
+    return removed
+
+
+def _merge_volatile(obj: dict, removed: dict) -> dict:
+    if "stats" in removed:
+        obj[VOLATILE_FIELD] = removed["stats"]
+    images = obj.get("images") or []
+    for idx, stats in (removed.get("images") or {}).items():
+        if int(idx) < len(images):
+            images[int(idx)][VOLATILE_FIELD] = stats
+    return obj
+
+
+def parse_time(value: str) -> float:
+    """
+    Parses a Unix timestamp or an ISO date/time (local time).
+
+    Raises:
+        ValueError: On an unparseable value
+    """
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+class PayloadArchive:
+    """
+    Content-addressed, compressed payload history in SQLite.
+    """
+
+    def __init__(self, db_file: Path):
+        self.db_file = Path(db_file)
+        self._local = threading.local()
+        self.db_file.parent.mkdir(parents=True, exist_ok=True)
+        db = self._connection()
+        db.executescript(SCHEMA)
+        columns = {row[1] for row in db.execute("PRAGMA table_info(snapshots)")}
+        with db:
+            for column, kind in ADDED_COLUMNS.items():
+                if column not in columns:
+                    db.execute(f"ALTER TABLE snapshots ADD COLUMN {column} {kind}")
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared between threads
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_file, timeout=30)
+            self._local.db = db
+        return db
+
+    # -------------------------------
+    # Parts
+    # -------------------------------
+    def _put_blob(self, db: sqlite3.Connection, obj) -> str:
+        data = _canonical(obj)
+        digest = hashlib.sha256(data).hexdigest()
+        if db.execute("SELECT 1 FROM blobs WHERE digest = ?", (digest,)).fetchone() is None:
+            codec, compressed = _compress(data)
+            db.execute(
+                "INSERT OR IGNORE INTO blobs (digest, codec, size, data) VALUES (?, ?, ?, ?)",
+                (digest, codec, len(data), compressed)
+            )
+        return digest
+
+    def _get_blob(self, digest: str):
+        row = self._connection().execute("SELECT codec, data FROM blobs WHERE digest = ?", (digest,)).fetchone()
+        if row is None:
+            raise KeyError(f"Missing snapshot part {digest}")
+        return json.loads(_decompress(row[0], row[1]))
+
+    # -------------------------------
+    # Snapshots
+    # -------------------------------
+    def add(self, model_id: int, raw: bytes, fetched_at: Optional[float] = None) -> bool:
+        """
+        Stores a fetched payload. Payloads identical to the latest snapshot
+        of the model are not stored again; a payload whose only changes are
+        counters adds a snapshot that reuses all model/version parts.
+        Returns: True if a new snapshot was added.
+        """
+        raw_digest = hashlib.sha256(raw).hexdigest()
+        fetched_at = time.time() if fetched_at is None else fetched_at
+
+        db = self._connection()
+        with db:
+            latest = db.execute(
+                "SELECT model_blob, version_blobs, stats_blob, raw_digest FROM snapshots WHERE model_id = ? "
+                "ORDER BY fetched_at DESC LIMIT 1",
+                (model_id,)
+            ).fetchone()
+            if latest is not None and latest[3] == raw_digest:
+                return False
+
+            version_digests = []
+            version_stats = []
+
+            def on_version(version) -> None:
+                version_stats.append(_split_volatile(version) if isinstance(version, dict) else {})
+                version_digests.append(self._put_blob(db, version))
+
+            model = walk_model_payload(raw, on_version)
+            model.pop("modelVersions", None)
+            model_stats = _split_volatile(model)
+            model_blob = self._put_blob(db, model)
+            version_blobs = json.dumps(version_digests)
+            stats_blob = self._put_blob(db, {"model": model_stats, "versions": version_stats})
+
+            if latest is not None and latest[:3] == (model_blob, version_blobs, stats_blob):
+                return False
+
+            db.execute(
+                "INSERT INTO snapshots (model_id, fetched_at, model_blob, version_blobs, stats_blob, raw_digest) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (model_id, fetched_at, model_blob, version_blobs, stats_blob, raw_digest)
+            )
+        return True
+
+    def list(self, model_id: int) -> list[float]:
+        """
+        Returns the fetch times of all snapshots of a model (oldest first).
+        """
+        rows = self._connection().execute(
+            "SELECT fetched_at FROM snapshots WHERE model_id = ? ORDER BY fetched_at", (model_id,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def get(self, model_id: int, at: Optional[float] = None) -> Optional[tuple[float, dict]]:
+        """
+        Returns (fetched_at, payload) of the latest snapshot taken at or
+        before the given time (default: the latest), or None.
+        """
+        row = self._connection().execute(
+            "SELECT fetched_at, model_blob, version_blobs, stats_blob FROM snapshots "
+            "WHERE model_id = ? AND fetched_at <= ? ORDER BY fetched_at DESC LIMIT 1",
+            (model_id, float("inf") if at is None else at)
+        ).fetchone()
+        if row is None:
+            return None
+
+        stats = self._get_blob(row[3]) if row[3] else {}
+        version_stats = stats.get("versions") or []
+        payload = _merge_volatile(self._get_blob(row[1]), stats.get("model") or {})
+        payload["modelVersions"] = [
+            _merge_volatile(self._get_blob(digest), version_stats[idx] if idx < len(version_stats) else {})
+            for idx, digest in enumerate(json.loads(row[2]))
+        ]
+        return row[0], payload
+
+    def stats(self) -> dict:
+        db = self._connection()
+        snapshots = db.execute("SELECT COUNT(*) FROM snapshots").fetchone()[0]
+        parts, raw_bytes, stored_bytes = db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(data)), 0) FROM blobs"
+        ).fetchone()
+        return {"snapshots": snapshots, "parts": parts, "raw_bytes": raw_bytes, "stored_bytes": stored_bytes}
+
+
+# =========================================================
+# Structural diff
+# =========================================================
+
+def _files_by_name(version: dict) -> dict[str, dict]:
+    return {f.get("name", ""): f for f in version.get("files", []) or []}
+
+
+def _image_urls(version: dict) -> list[str]:
+    return [img.get("url") for img in version.get("images", []) or [] if img.get("url")]
+
+
+def _diff_version(old: dict, new: dict) -> list[str]:
+    changes = []
+    for field in VERSION_FIELDS:
+        if old.get(field) != new.get(field):
+            changes.append(f"{field}: {old.get(field)!r} -> {new.get(field)!r}")
+
+    old_files, new_files = _files_by_name(old), _files_by_name(new)
+    for name in new_files.keys() - old_files.keys():
+        changes.append(f"new file: {name}")
+    for name in old_files.keys() - new_files.keys():
+        changes.append(f"removed file: {name}")
+    for name in sorted(old_files.keys() & new_files.keys()):
+        before, after = old_files[name], new_files[name]
+        old_hashes, new_hashes = before.get("hashes") or {}, after.get("hashes") or {}
+        for algorithm in sorted(old_hashes.keys() | new_hashes.keys()):
+            if old_hashes.get(algorithm) != new_hashes.get(algorithm):
+                changes.append(
+                    f"file {name}: {algorithm} {old_hashes.get(algorithm)} -> {new_hashes.get(algorithm)}"
+                )
+        for field in FILE_FIELDS:
+            if before.get(field) != after.get(field):
+                changes.append(f"file {name}: {field} {before.get(field)!r} -> {after.get(field)!r}")
+
+    old_images = set(_image_urls(old))
+    new_images = [url for url in _image_urls(new) if url not in old_images]
+    removed_images = old_images - set(_image_urls(new))
+    if new_images:
+        changes.append(f"{len(new_images)} new image(s): " + ", ".join(new_images))
+    if removed_images:
+        changes.append(f"{len(removed_images)} removed image(s)")
+    return changes
+
+
+def diff_payloads(old: dict, new: dict) -> list[str]:
+    """
+    Lists the structural changes between two model payloads: model fields,
+    new/removed versions, changed files and hashes, new images.
+    """
+    changes = []
+    for field in MODEL_FIELDS:
+        if old.get(field) != new.get(field):
+            if field == "description":
+                changes.append("description changed")
+            else:
+                changes.append(f"{field}: {old.get(field)!r} -> {new.get(field)!r}")
+
+    old_versions = {v.get("id"): v for v in old.get("modelVersions", [])}
+    new_versions = {v.get("id"): v for v in new.get("modelVersions", [])}
+
+    for vid, version in new_versions.items():
+        if vid not in old_versions:
+            files = len(version.get("files", []) or [])
+            images = len(_image_urls(version))
+            changes.append(f"new version: {version.get('name', vid)} ({files} file(s), {images} image(s))")
+    for vid, version in old_versions.items():
+        if vid not in new_versions:
+            changes.append(f"removed version: {version.get('name', vid)}")
+
+    for vid, version in new_versions.items():
+        if vid in old_versions:
+            for change in _diff_version(old_versions[vid], version):
+                changes.append(f"version {version.get('name', vid)}: {change}")
+
+    return changes
+
+
+def _format_time(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).isoformat(timespec="seconds")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Payload snapshot history")
+    commands = parser.add_subparsers(dest="command", required=True)
+    list_cmd = commands.add_parser("list", help="snapshots of a model")
+    list_cmd.add_argument("model_id", type=int)
+    show = commands.add_parser("show", help="payload as of a time")
+    show.add_argument("model_id", type=int)
+    show.add_argument("time", nargs="?")
+    diff = commands.add_parser("diff", help="changes between two snapshots")
+    diff.add_argument("model_id", type=int)
+    diff.add_argument("from_time", nargs="?")
+    diff.add_argument("to_time", nargs="?")
+    args = parser.parse_args()
+
+    config = ConfigManager()
+    snapshot_dir = config.get("snapshot_dir", "")
+    if not snapshot_dir:
+        print("[ERROR] snapshot_dir is not configured")
+        return
+    archive = PayloadArchive(Path(snapshot_dir) / ARCHIVE_FILE_NAME)
+
+    if args.command == "list":
+        times = archive.list(args.model_id)
+        for fetched_at in times:
+            print(f"{_format_time(fetched_at)}  {fetched_at:.0f}")
+        print(f"[INFO] {len(times)} snapshot(s)")
+        return
+
+    if args.command == "show":
+        snapshot = archive.get(args.model_id, parse_time(args.time) if args.time else None)
+        if snapshot is None:
+            print("[ERROR] No snapshot found")
+            return
+        print(json.dumps(snapshot[1], indent=2, ensure_ascii=False))
+        return
+
+    times = archive.list(args.model_id)
+    if args.from_time:
+        old = archive.get(args.model_id, parse_time(args.from_time))
+        new = archive.get(args.model_id, parse_time(args.to_time) if args.to_time else None)
+    elif len(times) >= 2:
+        old, new = archive.get(args.model_id, times[-2]), archive.get(args.model_id, times[-1])
+    else:
+        old = new = None
+    if old is None or new is None:
+        print("[ERROR] Two snapshots are needed for a diff")
+        return
+
+    print(f"[INFO] {_format_time(old[0])} -> {_format_time(new[0])}")
+    changes = diff_payloads(old[1], new[1])
+    for change in changes:
+        print(f"  {change}")
+    if not changes:
+        print("[OK] No changes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# prefetch.py
+"""
+Speculative prefetching for the GUI.
+
+While the user is still typing or choosing a version, the model payload is
+loaded into the shared API metadata cache and the first selected images of
+the chosen version are downloaded into civitai_fetch_model.image_cache.
+Pressing Start then mostly finishes from warm data.
+
+Prefetching is bounded (few workers, max_images per version, byte-limited
+LRU cache) and every new request cancels the outstanding work of the
+previous one: queued jobs are dropped, running ones discard their result.
+Prefetch requests run in the bulk priority class, so they never delay the
+real fetch.
+"""
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+
+import civitai_api_helper as api_helper
+import civitai_fetch_model
+from image_policy import ImagePolicy
+from model_payload import parse_model_payload
+import scheduling
+
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_IMAGES = 8
+DEFAULT_DEBOUNCE_MS = 600
+
+
+class Prefetcher:
+    """
+    Background warm-up of model metadata and image bytes.
+    """
+
+    def __init__(
+        self,
+        image_policy: Optional[ImagePolicy] = None,
+        workers: int = DEFAULT_WORKERS,
+        max_images: int = DEFAULT_MAX_IMAGES
+    ):
+        """
+        Initialize Prefetcher.
+
+        Args:
+            image_policy: Policy of the real download (same images and widths)
+            workers: Number of prefetch threads
+            max_images: Maximum number of images prefetched per version
+        """
+        self.image_policy = image_policy or ImagePolicy()
+        self.max_images = max_images
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._pending: list[Future] = []
+        self.images_prefetched = 0
+        self.images_discarded = 0
+
+    @classmethod
+    def from_config(cls, config) -> Optional["Prefetcher"]:
+        """
+        Returns the configured prefetcher (None if prefetch_enabled is off).
+        Also applies prefetch_cache_bytes to the shared image cache.
+        """
+        if not config.get("prefetch_enabled", True):
+            return None
+        civitai_fetch_model.image_cache.max_bytes = config.get(
+            "prefetch_cache_bytes", civitai_fetch_model.DEFAULT_PREFETCH_CACHE_BYTES
+        )
+        return cls(
+            ImagePolicy.from_config(config),
+            max_images=config.get("prefetch_max_images", DEFAULT_MAX_IMAGES)
+        )
+
+    # -------------------------------
+    # Jobs
+    # -------------------------------
+    def _submit(self, generation: int, func: Callable, *args) -> None:
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._pending = [f for f in self._pending if not f.done()]
+            with scheduling.priority_class(scheduling.PRIORITY_BULK):
+                job = scheduling.propagate(func)
+            self._pending.append(self._executor.submit(job, generation, *args))
+
+    def _current(self, generation: int) -> bool:
+        with self._lock:
+            return generation == self._generation
+
+    def cancel(self) -> int:
+        """
+        Cancels all outstanding prefetch work; returns the new generation.
+        """
+        with self._lock:
+            self._generation += 1
+            for future in self._pending:
+                future.cancel()
+            self._pending = []
+            return self._generation
+
+    # -------------------------------
+    # Metadata
+    # -------------------------------
+    def prefetch_metadata(self, model_id: int) -> None:
+        """
+        Loads the model payload into the API metadata cache.
+        """
+        self._submit(self.cancel(), self._fetch_metadata, model_id)
+
+    def _fetch_metadata(self, generation: int, model_id: int) -> None:
+        if not self._current(generation):
+            return
+        try:
+            api_helper.fetch_model_raw(model_id)
+        except Exception:
+            # Speculative only; the real fetch reports errors
+            pass
+
+    # -------------------------------
+    # Images
+    # -------------------------------
+    def prefetch_version(self, model_id: int, version_name: str) -> None:
+        """
+        Downloads the first selected images of a version into the image cache.
+        """
+        if not version_name or version_name == civitai_fetch_model.ALL_VERSIONS:
+            self.cancel()
+            return
+        self._submit(self.cancel(), self._plan_version, model_id, version_name)
+
+    def _plan_version(self, generation: int, model_id: int, version_name: str) -> None:
+        try:
+            raw, _ = api_helper.fetch_model_raw(model_id)
+        except Exception:
+            return
+        version = civitai_fetch_model.find_version(parse_model_payload(raw, version_name), version_name)
+        if version is None:
+            return
+
+        selected = self.image_policy.select(version.get("images", []))[:self.max_images]
+        for rank, img in enumerate(selected):
+            if (img.get("type") or "").lower() == "video":
+                # Clips and poster frames are left to the real download
+                continue
+            url = civitai_fetch_model.cdn_image_url(img["url"], self.image_policy.fetch_width(rank))
+            if url not in civitai_fetch_model.image_cache:
+                self._submit(generation, self._fetch_image, url)
+
+    def _fetch_image(self, generation: int, url: str) -> None:
+        if not self._current(generation):
+            return
+        try:
+            # Coalesces with a real download of the same URL that starts meanwhile
+            content, shared = civitai_fetch_model._image_flight.do_shared(
+                url, lambda: civitai_fetch_model.fetch_image_bytes(url)
+            )
+        except Exception:
+            return
+
+        # Checked and cached under the lock, so a cancel cannot slip in between.
+        # A shared result already reached the real download and is not cached.
+        with self._lock:
+            if generation != self._generation:
+                self.images_discarded += 1
+            elif not shared:
+                civitai_fetch_model.image_cache.put(url, content)
+                self.images_prefetched += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {
+                "generation": self._generation,
+                "pending": sum(1 for f in self._pending if not f.done()),
+                "images_prefetched": self.images_prefetched,
+                "images_discarded": self.images_discarded,
+            }
+        stats["cache_hits"] = civitai_fetch_model.image_cache.hits
+        return stats
+
+    def shutdown(self) -> None:
+        self.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,204 @@
+# prompt_analytics.py
+"""
+Prompt analytics: token frequencies and near-duplicate prompt clusters.
+
+Prompts are split into tag-style tokens ("1girl, (masterpiece:1.2), ...").
+Token frequencies count each token once per prompt. Near-identical prompts
+are collapsed with MinHash signatures and LSH banding: only prompts sharing
+a band become candidates, so a version's prompt list is clustered in
+roughly linear time.
+
+Usage: python prompt_analytics.py  (library-wide top tokens from snapshot_dir)
+"""
+
+import random
+import re
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import Iterable, Optional
+
+from config import ConfigManager
+from model_payload import parse_model_payload
+from snapshots import SnapshotStore
+
+DEFAULT_TOP_TOKENS = 15
+# Estimated Jaccard similarity above which two prompts are considered the same
+DEFAULT_SIMILARITY = 0.7
+
+# MinHash parameters: NUM_BANDS * BAND_ROWS hash functions
+NUM_BANDS = 16
+BAND_ROWS = 4
+NUM_HASHES = NUM_BANDS * BAND_ROWS
+_MERSENNE_PRIME = (1 << 61) - 1
+
+# Fixed coefficients keep signatures (and rendered notes) stable between runs
+_rng = random.Random(0x5EED)
+_HASH_COEFFS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_HASHES)
+]
+
+# Tokenization patterns
+_LORA_TAG_RE = re.compile(r"<[^>]*>")
+_WEIGHT_RE = re.compile(r":\s*-?\d+(?:\.\d+)?\s*$")
+_BRACKETS_RE = re.compile(r"[()\[\]{}]")
+_SPACES_RE = re.compile(r"\s+")
+_SPLIT_RE = re.compile(r"[,\n|]")
+
+
+class PromptCluster:
+    """
+    Group of near-identical prompts.
+
+    Attributes:
+        prompt: Representative prompt (first occurrence)
+        count: Number of prompts in the cluster
+    """
+
+    __slots__ = ("prompt", "count", "_signature")
+
+    def __init__(self, prompt: str, signature: list[int]):
+        self.prompt = prompt
+        self.count = 1
+        self._signature = signature
+
+
+def tokenize_prompt(prompt: str) -> list[str]:
+    """
+    Splits a prompt into normalized tag tokens.
+    Attention brackets, weights and <lora:...> tags are removed.
+    """
+    tokens = []
+    for part in _SPLIT_RE.split(_LORA_TAG_RE.sub(",", prompt)):
+        part = _BRACKETS_RE.sub("", part)
+        part = _WEIGHT_RE.sub("", part)
+        part = _SPACES_RE.sub(" ", part).strip().lower()
+        if part:
+            tokens.append(part)
+    return tokens
+
+
+def count_tokens(prompts: Iterable[str], counter: Optional[Counter] = None) -> Counter:
+    """
+    Counts in how many prompts each token occurs.
+    An existing counter can be passed to aggregate over many versions.
+    """
+    counter = counter if counter is not None else Counter()
+    for prompt in prompts:
+        counter.update(set(tokenize_prompt(prompt)))
+    return counter
+
+
+def most_common_tokens(counter: Counter, limit: int = DEFAULT_TOP_TOKENS) -> list[tuple[str, int]]:
+    """
+    Returns the most frequent tokens of a counter as (token, prompt count).
+    Ties are ordered alphabetically, so results do not depend on hash order.
+    """
+    return sorted(counter.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+
+def top_tokens(prompts: Iterable[str], limit: int = DEFAULT_TOP_TOKENS) -> list[tuple[str, int]]:
+    """
+    Returns the most frequent tokens as (token, prompt count).
+    """
+    return most_common_tokens(count_tokens(prompts), limit)
+
+
+def minhash_signature(tokens: Iterable[str]) -> list[int]:
+    """
+    Computes the MinHash signature of a token set.
+    """
+    hashes = [zlib.crc32(token.encode("utf-8")) for token in set(tokens)]
+    if not hashes:
+        return [_MERSENNE_PRIME] * NUM_HASHES
+    return [
+        min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+        for a, b in _HASH_COEFFS
+    ]
+
+
+def signature_similarity(sig_a: list[int], sig_b: list[int]) -> float:
+    """
+    Estimates the Jaccard similarity of two token sets from their signatures.
+    """
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / NUM_HASHES
+
+
+def cluster_prompts(prompts: Iterable[str], threshold: float = DEFAULT_SIMILARITY) -> list[PromptCluster]:
+    """
+    Collapses near-identical prompts.
+
+    Args:
+        prompts: Prompts in display order
+        threshold: Minimum estimated Jaccard similarity of the token sets
+
+    Returns:
+        Clusters in order of their first prompt
+    """
+    clusters: list[PromptCluster] = []
+    # (band index, band hash values) -> clusters with that band
+    buckets: dict[tuple, list[int]] = {}
+
+    for prompt in prompts:
+        signature = minhash_signature(tokenize_prompt(prompt))
+        bands = [
+            (i, tuple(signature[i * BAND_ROWS:(i + 1) * BAND_ROWS]))
+            for i in range(NUM_BANDS)
+        ]
+
+        # Candidates share at least one band; verify with the full signature
+        candidates = sorted({idx for band in bands for idx in buckets.get(band, ())})
+        match = next(
+            (idx for idx in candidates
+             if signature_similarity(signature, clusters[idx]._signature) >= threshold),
+            None
+        )
+
+        if match is not None:
+            clusters[match].count += 1
+            continue
+
+        clusters.append(PromptCluster(prompt, signature))
+        for band in bands:
+            buckets.setdefault(band, []).append(len(clusters) - 1)
+
+    return clusters
+
+
+def library_top_tokens(snapshot_dir: Path, limit: int = DEFAULT_TOP_TOKENS) -> list[tuple[str, int]]:
+    """
+    Returns the most frequent positive prompt tokens over all stored snapshots.
+    """
+    store = SnapshotStore(snapshot_dir)
+    counter = Counter()
+    for model_id, _ in store.iter_models():
+        try:
+            data = parse_model_payload(store.load_payload(model_id))
+        except Exception as e:
+            print(f"[WARN] Snapshot of model {model_id} could not be read: {e}")
+            continue
+
+        for version in data.get("modelVersions", []):
+            prompts = {
+                str((img.get("meta") or {}).get("prompt") or "").strip()
+                for img in version.get("images", [])
+            }
+            count_tokens((p for p in prompts if p), counter)
+
+    return most_common_tokens(counter, limit)
+
+
+def main() -> None:
+    config = ConfigManager()
+    snapshot_dir = config.get("snapshot_dir", "")
+    if not snapshot_dir:
+        print("[ERROR] snapshot_dir is not configured")
+        return
+
+    for token, count in library_top_tokens(Path(snapshot_dir), limit=50):
+        print(f"{count:6d}  {token}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+# rerender.py
+"""
+Offline re-rendering of all notes from stored snapshots.
+
+Rebuilds every version note from the payload snapshots and image manifests
+in snapshot_dir (see snapshots.py) with the current model_template.md -
+without API requests or image downloads. Models are rendered in parallel on
+a process pool; the notes are written by the main process through the
+configured output sink (local directories, archive or S3). With the local
+sink only notes whose content actually changed are written; other sinks
+cannot be read back and receive every note.
+
+Usage: python rerender.py  (reads snapshot_dir / rerender_workers / output_sink from config.json)
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import civitai_fetch_model
+from config import ConfigManager
+from description_markdown import parse_description
+from generation_stats import GenerationStats
+from model_payload import parse_model_payload
+from output_sinks import OutputSink, LocalDirSink, SINK_MARKDOWN, create_sink
+from path_planner import PathPlan
+from resource_resolver import Resource
+from snapshots import SnapshotStore
+
+# Per-process state (set by _init_worker)
+_template: Optional[civitai_fetch_model.CompiledTemplate] = None
+_store: Optional[SnapshotStore] = None
+_compare_dir: Optional[Path] = None
+
+
+def _init_worker(template_text: str, snapshot_dir: str, compare_dir: str) -> None:
+    """
+    Compiles the template once per worker process.
+
+    Args:
+        compare_dir: Local markdown root to compare rendered notes with
+                     ("" = every note counts as changed)
+    """
+    global _template, _store, _compare_dir
+    _template = civitai_fetch_model.compile_template(template_text)
+    _store = SnapshotStore(Path(snapshot_dir))
+    _compare_dir = Path(compare_dir) if compare_dir else None
+
+
+def _is_unchanged(note_relpath: Path, md: str) -> bool:
+    if _compare_dir is None:
+        return False
+    try:
+        return (_compare_dir / note_relpath).read_text(encoding="utf-8") == md
+    except (OSError, UnicodeDecodeError):
+        return False
+
+
+def rerender_model(model_id: int, manifests: list[dict]) -> dict:
+    """
+    Re-renders the notes of one model (runs in a worker process).
+    Returns: changed notes as (relative path, markdown) pairs, counters
+    (unchanged, missing) and error messages.
+    """
+    result = {"notes": [], "unchanged": 0, "missing": 0, "errors": []}
+
+    try:
+        data = parse_model_payload(_store.load_payload(model_id))
+    except Exception as e:
+        result["errors"].append(f"Model {model_id}: snapshot could not be loaded ({e})")
+        return result
+
+    versions = {v.get("id"): v for v in data.get("modelVersions", [])}
+    # Parsed once; rendered per version with the images that version's fetch saved
+    description = parse_description(data.get("description", ""))
+
+    for manifest in manifests:
+        version = versions.get(manifest.get("version_id"))
+        if version is None:
+            # Version no longer in the snapshot payload
+            result["missing"] += 1
+            continue
+
+        note_relpath = Path(manifest["note"])
+        plan = PathPlan(manifest.get("sanitized_model_name", ""), Path(), [], note_relpath)
+        stats = manifest.get("generation_stats")
+        resources = manifest.get("resources")
+        try:
+            md = civitai_fetch_model.build_note(
+                data, version, manifest.get("images", []), model_id, _template,
+                description.render(manifest.get("description_images")), plan,
+                GenerationStats.from_dict(stats) if stats else None,
+                [Resource.from_dict(r) for r in resources] if resources is not None else None
+            )
+            if _is_unchanged(note_relpath, md):
+                result["unchanged"] += 1
+            else:
+                result["notes"].append((note_relpath.as_posix(), md))
+        except Exception as e:
+            result["errors"].append(f"{note_relpath}: {e}")
+
+    return result
+
+
+def rerender_all(
+    snapshot_dir: Path,
+    md_output_dir: Path,
+    template_text: Optional[str] = None,
+    workers: Optional[int] = None,
+    sink: Optional[OutputSink] = None
+) -> dict:
+    """
+    Re-renders every note with snapshot data.
+
+    Args:
+        snapshot_dir: Snapshot store directory
+        md_output_dir: Markdown root the notes were written to
+        template_text: Template source (default: model_template.md)
+        workers: Worker processes (default: CPU count)
+        sink: Output sink for the notes (default: write to md_output_dir)
+
+    Returns:
+        Dict with the totals of written, unchanged and missing notes and errors
+    """
+    if template_text is None:
+        template_text = civitai_fetch_model.load_template()
+
+    models = list(SnapshotStore(snapshot_dir).iter_models())
+    totals = {"models": len(models), "written": 0, "unchanged": 0, "missing": 0, "errors": []}
+    if not models:
+        print(f"[WARN] No snapshots found in {snapshot_dir}")
+        return totals
+
+    if sink is None:
+        sink = LocalDirSink(md_output_dir, md_output_dir)
+    # Only local notes can be compared with their current content
+    compare_dir = str(sink.path_for(SINK_MARKDOWN, "")) if isinstance(sink, LocalDirSink) else ""
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(models)))
+    print(f"[INFO] Re-rendering {len(models)} models with {workers} processes")
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(template_text, str(snapshot_dir), compare_dir)
+    ) as executor:
+        model_ids = [model_id for model_id, _ in models]
+        manifests = [m for _, m in models]
+        # Many small models per task keep the IPC overhead low
+        chunksize = max(1, len(models) // (workers * 8))
+        for result in executor.map(rerender_model, model_ids, manifests, chunksize=chunksize):
+            for note_relpath, md in result["notes"]:
+                try:
+                    sink.write_text(SINK_MARKDOWN, note_relpath, md)
+                    totals["written"] += 1
+                except Exception as e:
+                    totals["errors"].append(f"{note_relpath}: {e}")
+            for key in ("unchanged", "missing"):
+                totals[key] += result[key]
+            totals["errors"].extend(result["errors"])
+    sink.flush()
+
+    for error in totals["errors"]:
+        print(f"[ERROR] {error}")
+    print(
+        f"[OK] {totals['written']} notes written, {totals['unchanged']} unchanged, "
+        f"{totals['missing']} missing in snapshot"
+    )
+    return totals
+
+
+def main() -> None:
+    config = ConfigManager()
+
+    snapshot_dir = config.get("snapshot_dir", "")
+    if not snapshot_dir:
+        print("[ERROR] snapshot_dir is not configured")
+        return
+
+    md_dir = config.get_path("model_output_dir")
+    with create_sink(config, md_dir, config.get_path("image_output_dir")) as sink:
+        rerender_all(
+            Path(snapshot_dir),
+            md_dir,
+            workers=config.get("rerender_workers", 0) or None,
+            sink=sink
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+# resource_resolver.py
+"""
+Resolution of the resources (LoRAs, embeddings, ...) a version depends on.
+
+Resources are collected from the training information of the version
+files (requiredResources/optionalResources) and from the image metadata
+(civitaiResources with version IDs, resources with file hashes). Each one
+is resolved to its model and version through the cached API, concurrently.
+
+Resolved resources link to their note if it was fetched in this run or
+an earlier one (found through the version manifests of the snapshot
+store, which record the actual note path), otherwise to their model page. With a fetch depth, the notes of the
+resources are fetched as well - recursively up to the depth, at most
+max_per_version resources per version, and every version only once (cycle
+detection).
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import civitai_api_helper as api_helper
+import scheduling
+
+MODEL_PAGE_URL = "https://civitai.com/models/{}"
+DEFAULT_MAX_PER_VERSION = 10
+DEFAULT_WORKERS = 4
+# Base models are not dependencies
+IGNORED_TYPES = frozenset(["checkpoint", "model"])
+
+
+class Resource:
+    """
+    A resource referenced by a version (resolved or not).
+    """
+
+    __slots__ = (
+        "name", "type", "weight", "uses", "model_id", "version_id", "file_hash",
+        "model_name", "version_name", "note_stem"
+    )
+
+    def __init__(
+        self,
+        name: str = "",
+        type: str = "",
+        weight=None,
+        model_id: Optional[int] = None,
+        version_id: Optional[int] = None,
+        file_hash: Optional[str] = None
+    ):
+        self.name = name
+        self.type = type
+        self.weight = weight
+        self.uses = 1
+        self.model_id = model_id
+        self.version_id = version_id
+        self.file_hash = file_hash
+        self.model_name = ""
+        self.version_name = ""
+        # Note to link to (set by ResourceResolver.link_targets)
+        self.note_stem: Optional[str] = None
+
+    @property
+    def key(self):
+        if self.version_id:
+            return ("version", self.version_id)
+        if self.file_hash:
+            return ("hash", self.file_hash.lower())
+        if self.model_id:
+            return ("model", self.model_id)
+        return ("name", self.name.lower())
+
+    @property
+    def resolved(self) -> bool:
+        return bool(self.model_id and self.model_name)
+
+    @property
+    def display_name(self) -> str:
+        name = self.model_name or self.name
+        if self.version_name:
+            return f"{name} ({self.version_name})"
+        return name
+
+    @property
+    def url(self) -> str:
+        if not self.model_id:
+            return ""
+        url = MODEL_PAGE_URL.format(self.model_id)
+        return f"{url}?modelVersionId={self.version_id}" if self.version_id else url
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Resource":
+        resource = cls()
+        for name in cls.__slots__:
+            if name in data:
+                setattr(resource, name, data[name])
+        return resource
+
+    def link(self) -> str:
+        """
+        Markdown link: wiki link to the note, model page, or the bare name.
+        """
+        if self.note_stem:
+            return f"[[{self.note_stem}|{self.display_name}]]"
+        if self.url:
+            return f"[{self.display_name}]({self.url})"
+        return self.display_name
+
+
+def _int(value) -> Optional[int]:
+    try:
+        return int(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def collect_resources(version: dict) -> list[Resource]:
+    """
+    Collects the resources referenced by a version's files and images
+    (merged per resource; uses = number of references).
+    """
+    found: dict[tuple, Resource] = {}
+
+    def add(resource: Resource) -> None:
+        if resource.type.lower() in IGNORED_TYPES or resource.key[1] in ("", None):
+            return
+        known = found.get(resource.key)
+        if known is None:
+            found[resource.key] = resource
+        else:
+            known.uses += 1
+            known.name = known.name or resource.name
+
+    for file in version.get("files", []) or []:
+        training = file.get("training") or {}
+        for r in (training.get("requiredResources") or []) + (training.get("optionalResources") or []):
+            add(Resource(
+                name=str(r.get("name") or ""),
+                type=str(r.get("type") or ""),
+                model_id=_int(r.get("modelId")),
+                version_id=_int(r.get("modelVersionId") or r.get("versionId"))
+            ))
+
+    for img in version.get("images", []) or []:
+        meta = img.get("meta") or {}
+        for r in meta.get("civitaiResources") or []:
+            add(Resource(
+                name=str(r.get("modelVersionName") or ""),
+                type=str(r.get("type") or ""),
+                weight=r.get("weight"),
+                version_id=_int(r.get("modelVersionId"))
+            ))
+        for r in meta.get("resources") or []:
+            add(Resource(
+                name=str(r.get("name") or ""),
+                type=str(r.get("type") or ""),
+                weight=r.get("weight"),
+                file_hash=str(r.get("hash") or "") or None
+            ))
+
+    return sorted(found.values(), key=lambda r: (-r.uses, r.name.lower()))
+
+
+class ResourceResolver:
+    """
+    Resolves resources and tracks the dependency fetch of one job.
+    """
+
+    def __init__(
+        self,
+        fetch_depth: int = 0,
+        max_per_version: int = DEFAULT_MAX_PER_VERSION,
+        workers: int = DEFAULT_WORKERS,
+        md_output_dir: Optional[Path] = None
+    ):
+        """
+        Initialize ResourceResolver.
+
+        Args:
+            fetch_depth: Dependency levels whose notes are fetched as well (0 = link only)
+            max_per_version: Most used resources fetched per version
+            workers: Concurrent resolution requests
+            md_output_dir: Markdown root, checked for notes of earlier runs
+                           (notes removed since are not linked)
+        """
+        self.fetch_depth = fetch_depth
+        self.max_per_version = max_per_version
+        self.workers = max(1, workers)
+        self.md_output_dir = Path(md_output_dir) if md_output_dir else None
+        self._lock = threading.Lock()
+        # Version IDs fetched (or being fetched) in this job
+        self._claimed: set[int] = set()
+        self._notes: dict[int, str] = {}
+
+    @classmethod
+    def from_config(cls, config, md_output_dir: Optional[Path] = None) -> Optional["ResourceResolver"]:
+        """
+        Returns the configured resolver (None if resource_resolve is off).
+        """
+        if not config.get("resource_resolve", True):
+            return None
+        return cls(
+            config.get("resource_fetch_depth", 0),
+            config.get("resource_max_per_version", DEFAULT_MAX_PER_VERSION),
+            config.get("resource_workers", DEFAULT_WORKERS),
+            md_output_dir
+        )
+
+    # -------------------------------
+    # Resolution
+    # -------------------------------
+    def _resolve_one(self, resource: Resource) -> Resource:
+        try:
+            if resource.version_id or resource.file_hash:
+                info = api_helper.get_version_info(resource.version_id, resource.file_hash)
+                model = info.get("model") or {}
+                resource.model_id = _int(info.get("modelId")) or resource.model_id
+                resource.version_id = _int(info.get("id")) or resource.version_id
+                resource.version_name = info.get("name", "")
+                resource.model_name = model.get("name", "")
+                resource.type = model.get("type") or resource.type
+            elif resource.model_id:
+                metadata = api_helper.get_model_metadata(resource.model_id)
+                resource.model_name = metadata.get("name", "")
+        except RuntimeError as e:
+            print(f"[WARN] Resource '{resource.name or resource.key[1]}' could not be resolved: {e}")
+        return resource
+
+    def resolve(self, version: dict, own_model_id: Optional[int] = None) -> list[Resource]:
+        """
+        Collects and resolves the resources of a version (without the model itself).
+        """
+        resources = collect_resources(version)
+        if not resources:
+            return []
+
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(resources))) as executor:
+            resolved = list(executor.map(scheduling.propagate(self._resolve_one), resources))
+
+        # Different references (hash, version ID) can lead to the same version
+        merged: dict[tuple, Resource] = {}
+        for resource in resolved:
+            if own_model_id and resource.model_id == own_model_id:
+                continue
+            key = (resource.model_id, resource.version_id) if resource.resolved else resource.key
+            if key in merged:
+                merged[key].uses += resource.uses
+            else:
+                merged[key] = resource
+        return sorted(merged.values(), key=lambda r: (-r.uses, r.display_name.lower()))
+
+    # -------------------------------
+    # Dependency fetch
+    # -------------------------------
+    def claim(self, version_id: Optional[int]) -> bool:
+        """
+        Marks a version as fetched in this job. Returns False if it already was.
+        """
+        if not version_id:
+            return True
+        with self._lock:
+            if version_id in self._claimed:
+                return False
+            self._claimed.add(version_id)
+            return True
+
+    def register_note(self, version_id: Optional[int], note_stem: str) -> None:
+        if version_id:
+            with self._lock:
+                self._notes[version_id] = note_stem
+
+    def dependencies(self, resources: list[Resource], depth: int) -> list[Resource]:
+        """
+        Returns the resources whose notes should be fetched at this depth.
+        """
+        if depth >= self.fetch_depth:
+            return []
+        candidates = [r for r in resources if r.resolved and r.version_name]
+        return candidates[:self.max_per_version]
+
+    def _earlier_note(self, snapshots, resource: Resource) -> Optional[str]:
+        manifest = snapshots.load_manifest(resource.model_id, resource.version_id)
+        if not manifest or not manifest.get("note"):
+            return None
+        note = Path(manifest["note"])
+        if self.md_output_dir is not None and not (self.md_output_dir / note).exists():
+            return None
+        return note.stem
+
+    def link_targets(self, resources: list[Resource], snapshots=None) -> None:
+        """
+        Sets note_stem for resources with a note from this job or an earlier run.
+
+        Args:
+            resources: Resolved resources of a version
+            snapshots: SnapshotStore whose manifests record the notes of
+                       earlier runs (None = only notes of this job are linked)
+        """
+        for resource in resources:
+            if not resource.resolved or not resource.version_name:
+                continue
+            with self._lock:
+                stem = self._notes.get(resource.version_id)
+            if stem is None and snapshots is not None and resource.version_id:
+                stem = self._earlier_note(snapshots, resource)
+            resource.note_stem = stem
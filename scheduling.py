@@ -0,0 +1,177 @@
+# scheduling.py
+"""
+Priority classes for API and image requests.
+
+Every request runs in a priority class: interactive (GUI fetches, the
+default) or bulk (watch mode, API server jobs, prefetching). Waiting
+interactive requests get free concurrency slots before any bulk request
+(see AdaptiveLimiter.slot), and each class can have its own bandwidth cap.
+
+The class is carried in a context variable; worker threads started for a
+fetch inherit it through propagate(). A fetch that runs in a PriorityHandle
+can be raised while it runs (e.g. an interactive client joins a bulk job).
+"""
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BULK = "bulk"
+# Highest priority first
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_BULK)
+
+_priority: contextvars.ContextVar = contextvars.ContextVar("priority", default=PRIORITY_INTERACTIVE)
+
+
+def priority_rank(priority: str) -> int:
+    """
+    Returns the position of a class in PRIORITIES (0 = highest).
+
+    Raises:
+        ValueError: On an unknown class
+    """
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority class: {priority} (expected one of {', '.join(PRIORITIES)})")
+    return PRIORITIES.index(priority)
+
+
+class PriorityHandle:
+    """
+    Priority class of a fetch that can be raised while it runs. Requests
+    started after raise_to() use the new class, including those of worker
+    threads bound by propagate().
+    """
+
+    def __init__(self, priority: str = PRIORITY_BULK):
+        priority_rank(priority)
+        self.priority = priority
+
+    def raise_to(self, priority: str) -> bool:
+        """
+        Switches to priority if it is higher. Returns True if the class changed.
+        """
+        if priority_rank(priority) >= priority_rank(self.priority):
+            return False
+        self.priority = priority
+        return True
+
+
+def current_priority() -> str:
+    value = _priority.get()
+    return value.priority if isinstance(value, PriorityHandle) else value
+
+
+@contextmanager
+def priority_class(priority: "str | PriorityHandle"):
+    """
+    Runs the enclosed requests in the given priority class (or in the
+    current class of a PriorityHandle).
+    """
+    priority_rank(priority.priority if isinstance(priority, PriorityHandle) else priority)
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def propagate(func: Callable) -> Callable:
+    """
+    Binds func to the current priority class (for executor/thread targets).
+    """
+    priority = _priority.get()
+
+    def wrapper(*args, **kwargs):
+        with priority_class(priority):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+# =========================================================
+# Bandwidth caps
+# =========================================================
+
+class BandwidthBucket:
+    """
+    Token bucket limiting the average transfer rate of a class.
+    Transfers are paid afterwards: a large response makes the next
+    requests of the class wait.
+    """
+
+    def __init__(self, rate: float = 0.0):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._available = rate
+        self._updated = time.monotonic()
+        self.bytes = 0
+        self.throttled_seconds = 0.0
+
+    def set_rate(self, rate: float) -> None:
+        with self._lock:
+            self.rate = rate
+            self._available = rate
+            self._updated = time.monotonic()
+
+    def consume(self, nbytes: int) -> None:
+        """
+        Accounts nbytes and sleeps while the class is over its rate.
+        """
+        with self._lock:
+            self.bytes += nbytes
+            if self.rate <= 0:
+                return
+            now = time.monotonic()
+            # At most one second of burst
+            self._available = min(self.rate, self._available + (now - self._updated) * self.rate)
+            self._updated = now
+            self._available -= nbytes
+            delay = -self._available / self.rate if self._available < 0 else 0.0
+            self.throttled_seconds += delay
+
+        if delay:
+            time.sleep(delay)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rate": self.rate,
+                "bytes": self.bytes,
+                "throttled_seconds": round(self.throttled_seconds, 2),
+            }
+
+
+_buckets: dict[str, BandwidthBucket] = {priority: BandwidthBucket() for priority in PRIORITIES}
+
+
+def throttle(nbytes: int) -> None:
+    """
+    Accounts a transfer of the current class against its bandwidth cap.
+    """
+    _buckets[current_priority()].consume(nbytes)
+
+
+def configure_bandwidth(limits: dict[str, float]) -> None:
+    """
+    Sets the bandwidth caps in bytes per second by class (0 = unlimited).
+    """
+    for priority, rate in limits.items():
+        priority_rank(priority)
+        _buckets[priority].set_rate(float(rate or 0))
+
+
+def configure_from_config(config) -> None:
+    """
+    Applies the *_bandwidth_limit config keys.
+    """
+    configure_bandwidth({
+        priority: config.get(f"{priority}_bandwidth_limit", 0)
+        for priority in PRIORITIES
+    })
+
+
+def all_stats() -> dict:
+    return {priority: bucket.stats() for priority, bucket in _buckets.items()}
@@ -0,0 +1,101 @@
+# single_flight.py
+"""
+Request coalescing ("single flight") for concurrent identical calls.
+
+While a call for a key is in flight, further callers with the same key
+wait for it and receive the same result (or exception) instead of issuing
+their own request.
+"""
+
+import threading
+from typing import Any, Callable, Hashable
+
+# All SingleFlight instances by name (for metrics)
+_registry: dict[str, "SingleFlight"] = {}
+_registry_lock = threading.Lock()
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+        with _registry_lock:
+            _registry[name] = self
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        """
+        Runs func() unless a call with the same key is already in flight,
+        in which case its result is shared.
+        """
+        return self.do_shared(key, func)[0]
+
+    def do_shared(self, key: Hashable, func: Callable[[], Any]) -> tuple[Any, bool]:
+        """
+        Like do(). Returns: (result, shared), shared is True if the result
+        was also delivered to other callers.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        # No caller can join once the call is removed
+        return call.result, call.waiters > 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls),
+            }
+
+
+def all_stats() -> dict:
+    """
+    Returns the metrics of all SingleFlight instances.
+    """
+    with _registry_lock:
+        flights = list(_registry.values())
+    return {flight.name: flight.stats() for flight in flights}
@@ -0,0 +1,147 @@
+# snapshots.py
+"""
+Local store of fetched model payloads and image manifests.
+
+For every fetched version a manifest records which images were saved and
+where its note lives. Together with the raw model payload this is enough
+to re-render notes without touching the network (see rerender.py).
+
+Every fetched payload is also kept in the compressed payload history
+(see payload_archive.py) unless snapshot_history is off.
+
+Layout:
+    <snapshot_dir>/<model_id>/model.json              raw API payload (latest)
+    <snapshot_dir>/<model_id>/versions/<id>.json      version manifest
+    <snapshot_dir>/payloads.db                        payload history
+"""
+
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Iterator, Optional
+
+from generation_stats import GenerationStats
+from resource_resolver import Resource
+from path_planner import PathPlan
+from payload_archive import ARCHIVE_FILE_NAME, PayloadArchive
+
+
+class SnapshotStore:
+    """
+    Reads and writes payload snapshots and version manifests.
+    """
+
+    def __init__(self, root: Path, history: bool = False):
+        """
+        Initialize SnapshotStore.
+
+        Args:
+            root: Snapshot directory
+            history: Keep every fetched payload in the payload archive
+        """
+        self.root = Path(root)
+        self.archive = PayloadArchive(self.root / ARCHIVE_FILE_NAME) if history else None
+
+    @classmethod
+    def from_config(cls, config) -> Optional["SnapshotStore"]:
+        """
+        Returns the store configured by "snapshot_dir" (None if disabled).
+        """
+        snapshot_dir = config.get("snapshot_dir", "")
+        if not snapshot_dir:
+            return None
+        return cls(Path(snapshot_dir), config.get("snapshot_history", True))
+
+    def _model_dir(self, model_id: int) -> Path:
+        return self.root / str(model_id)
+
+    @staticmethod
+    def _write_atomic(path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp_file.write_bytes(data)
+        tmp_file.replace(path)
+
+    def save_payload(self, model_id: int, raw: bytes) -> None:
+        """
+        Stores the raw model payload (and adds it to the payload history).
+        """
+        self._write_atomic(self._model_dir(model_id) / "model.json", raw)
+        if self.archive is not None:
+            try:
+                self.archive.add(model_id, raw)
+            except (sqlite3.Error, ValueError) as e:
+                print(f"[WARN] Payload history could not be written: {e}")
+
+    def load_payload(self, model_id: int) -> bytes:
+        return (self._model_dir(model_id) / "model.json").read_bytes()
+
+    def save_manifest(
+        self,
+        model_id: int,
+        version,
+        saved_images: list[str],
+        plan: PathPlan,
+        stats: Optional[GenerationStats] = None,
+        resources: Optional[list[Resource]] = None,
+        description_images: Optional[dict[str, str]] = None
+    ) -> None:
+        """
+        Stores the manifest of a fetched version. Generation statistics are
+        only needed if they were aggregated beyond the payload images;
+        resolved resources and the saved description images (filename by
+        URL) keep their links when re-rendering.
+        """
+        manifest = {
+            "model_id": model_id,
+            "version_id": version.get("id"),
+            "version_name": version.get("name", ""),
+            "images": saved_images,
+            "note": plan.note_relpath.as_posix(),
+            "sanitized_model_name": plan.sanitized_model_name,
+            "fetched_at": time.time(),
+        }
+        if stats is not None:
+            manifest["generation_stats"] = stats.to_dict()
+        if resources is not None:
+            manifest["resources"] = [r.to_dict() for r in resources]
+        if description_images:
+            manifest["description_images"] = description_images
+        path = self._model_dir(model_id) / "versions" / f"{version.get('id')}.json"
+        self._write_atomic(path, json.dumps(manifest, indent=2, ensure_ascii=False).encode("utf-8"))
+
+    def load_manifest(self, model_id: int, version_id: int) -> Optional[dict]:
+        """
+        Returns the manifest of a fetched version (None if there is none).
+        """
+        path = self._model_dir(model_id) / "versions" / f"{version_id}.json"
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Manifest could not be read: {path} ({e})")
+            return None
+
+    def iter_models(self) -> Iterator[tuple[int, list[dict]]]:
+        """
+        Yields (model_id, manifests) for every model with a payload snapshot.
+        """
+        if not self.root.exists():
+            return
+
+        for model_dir in sorted(self.root.iterdir()):
+            if not model_dir.name.isdigit() or not (model_dir / "model.json").exists():
+                continue
+
+            manifests = []
+            for manifest_file in sorted((model_dir / "versions").glob("*.json")):
+                try:
+                    manifests.append(json.loads(manifest_file.read_text(encoding="utf-8")))
+                except (OSError, ValueError) as e:
+                    print(f"[WARN] Manifest could not be read: {manifest_file} ({e})")
+
+            if manifests:
+                yield int(model_dir.name), manifests
@@ -0,0 +1,158 @@
+# tests/test_adaptive_concurrency.py
+"""
+Tests of the AIMD concurrency limiter (fake requests, injected clock).
+
+Run from the repository root: python -m pytest tests
+"""
+
+import threading
+import time
+import unittest
+
+import requests
+
+import scheduling
+from adaptive_concurrency import ERROR_BACKOFF, LATENCY_BACKOFF, AdaptiveLimiter
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class _Response:
+    def __init__(self, status_code: int = 200):
+        self.status_code = status_code
+        self.content = b""
+
+    def close(self):
+        pass
+
+
+class AdaptiveLimiterTestCase(unittest.TestCase):
+    def limiter(self, min_limit: int = 1, max_limit: int = 16, initial_limit: int = 4) -> AdaptiveLimiter:
+        self.clock = _Clock()
+        return AdaptiveLimiter("test", min_limit, max_limit, initial_limit, clock=self.clock)
+
+    def request(self, limiter: AdaptiveLimiter, latency: float = 0.1, status_code: int = 200):
+        def func():
+            self.clock.now += latency
+            return _Response(status_code)
+        return limiter.request(func)
+
+
+class IncreaseTests(AdaptiveLimiterTestCase):
+    def test_limit_grows_additively(self):
+        limiter = self.limiter(initial_limit=4)
+        self.request(limiter)
+        self.assertEqual(limiter.limit, 4.25)
+        # About one more slot per "limit" successful requests
+        for _ in range(4):
+            self.request(limiter)
+        self.assertEqual(int(limiter.limit), 5)
+
+    def test_limit_is_clamped_to_max(self):
+        limiter = self.limiter(max_limit=5, initial_limit=4)
+        for _ in range(50):
+            self.request(limiter)
+        self.assertEqual(limiter.limit, 5)
+
+
+class DecreaseTests(AdaptiveLimiterTestCase):
+    def test_rate_limit_halves_the_limit(self):
+        limiter = self.limiter(initial_limit=8)
+        self.request(limiter, status_code=429)
+        self.assertEqual(limiter.limit, 8 * ERROR_BACKOFF)
+        self.assertEqual(limiter.failures, 1)
+
+    def test_server_errors_and_timeouts_count_as_overload(self):
+        limiter = self.limiter(initial_limit=16)
+        self.request(limiter, status_code=503)
+        self.clock.now += 10
+
+        def timeout():
+            raise requests.exceptions.Timeout()
+        with self.assertRaises(requests.exceptions.Timeout):
+            limiter.request(timeout)
+        self.assertEqual(limiter.limit, 16 * ERROR_BACKOFF * ERROR_BACKOFF)
+
+    def test_client_errors_are_no_overload(self):
+        limiter = self.limiter(initial_limit=4)
+        self.request(limiter, status_code=404)
+        self.assertEqual(limiter.failures, 0)
+        self.assertGreater(limiter.limit, 4)
+
+    def test_limit_is_clamped_to_min(self):
+        limiter = self.limiter(min_limit=2, initial_limit=4)
+        for _ in range(10):
+            self.request(limiter, status_code=429)
+            self.clock.now += 10
+        self.assertEqual(limiter.limit, 2)
+
+    def test_decrease_is_held_while_older_requests_finish(self):
+        limiter = self.limiter(initial_limit=8)
+        self.request(limiter, latency=1.0)
+        self.request(limiter, status_code=429)
+        # Within one latency of the first decrease: ignored
+        self.request(limiter, status_code=429)
+        self.assertEqual(limiter.limit, (8 + 1 / 8) * ERROR_BACKOFF)
+
+    def test_rising_latency_shrinks_the_limit(self):
+        limiter = self.limiter(initial_limit=8)
+        self.request(limiter, latency=0.1)
+        limit = limiter.limit
+        # Latency only counts as congestion while other requests are in flight
+        limiter.in_flight = 2
+        for _ in range(10):
+            self.request(limiter, latency=2.0)
+            if limiter.limit < limit:
+                break
+        limiter.in_flight = 0
+        self.assertEqual(limiter.limit, limit * LATENCY_BACKOFF)
+
+
+class StreamTests(AdaptiveLimiterTestCase):
+    def test_slot_and_latency_cover_the_body(self):
+        limiter = self.limiter(initial_limit=2)
+        with limiter.stream(lambda: _Response()):
+            self.assertEqual(limiter.in_flight, 1)
+            self.clock.now += 3.0
+        self.assertEqual(limiter.in_flight, 0)
+        self.assertEqual(limiter.latency, 3.0)
+
+    def test_broken_transfer_counts_as_overload(self):
+        limiter = self.limiter(initial_limit=8)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            with limiter.stream(lambda: _Response()):
+                raise requests.exceptions.ConnectionError("reset")
+        self.assertEqual((limiter.failures, limiter.successes), (1, 0))
+
+
+class PriorityTests(AdaptiveLimiterTestCase):
+    def test_interactive_requests_get_the_next_free_slot(self):
+        limiter = self.limiter(min_limit=1, max_limit=1, initial_limit=1)
+        order = []
+
+        def waiter(priority: str, name: str) -> None:
+            with scheduling.priority_class(priority), limiter.slot():
+                order.append(name)
+
+        with limiter.slot():
+            bulk = threading.Thread(target=waiter, args=(scheduling.PRIORITY_BULK, "bulk"))
+            bulk.start()
+            while limiter.waiting[1] == 0:
+                time.sleep(0.001)
+            interactive = threading.Thread(target=waiter, args=(scheduling.PRIORITY_INTERACTIVE, "interactive"))
+            interactive.start()
+            while limiter.waiting[0] == 0:
+                time.sleep(0.001)
+        bulk.join(5)
+        interactive.join(5)
+        self.assertEqual(order, ["interactive", "bulk"])
+
+
+if __name__ == "__main__":
+    unittest.main()
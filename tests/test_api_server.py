@@ -0,0 +1,77 @@
+# tests/test_api_server.py
+"""
+Tests of the API server job bookkeeping (coalescing, cancel, eviction).
+
+Run from the repository root: python -m pytest tests
+"""
+
+import threading
+import unittest
+from unittest import mock
+
+import api_server
+import scheduling
+
+
+class _Config(dict):
+    def get_path(self, key):
+        return ""
+
+
+class JobManagerTests(unittest.TestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.priorities = []
+        patcher = mock.patch.object(api_server.civitai_fetch_model, "run", self._run)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.manager = api_server.JobManager(_Config(api_server_max_finished_jobs=2), workers=1)
+        self.addCleanup(self.manager.shutdown)
+
+    def _run(self, model_id, version, priority=None, cancel_event=None, **kwargs):
+        with scheduling.priority_class(priority):
+            self.priorities.append(scheduling.current_priority())
+            self.started.set()
+            self.release.wait(5)
+            self.priorities.append(scheduling.current_priority())
+        return [f"{model_id}.md"]
+
+    def test_interactive_client_raises_running_bulk_job(self):
+        job, _ = self.manager.submit(1, "v1")
+        self.started.wait(5)
+        joined, coalesced = self.manager.submit(1, "v1", scheduling.PRIORITY_INTERACTIVE)
+        self.release.set()
+        job.future.result(5)
+
+        self.assertTrue(coalesced)
+        self.assertIs(joined, job)
+        self.assertEqual(self.priorities, [scheduling.PRIORITY_BULK, scheduling.PRIORITY_INTERACTIVE])
+
+    def test_job_runs_until_the_last_client_cancels(self):
+        job, _ = self.manager.submit(1, "v1")
+        self.manager.submit(1, "v1")
+        self.started.wait(5)
+
+        self.manager.cancel(job.id)
+        self.assertFalse(job.cancel_event.is_set())
+        self.assertEqual(job.clients, 1)
+        self.manager.cancel(job.id)
+        self.assertTrue(job.cancel_event.is_set())
+
+        # A new request starts a new job instead of joining the cancelled one
+        fresh, coalesced = self.manager.submit(1, "v1")
+        self.assertFalse(coalesced)
+        self.assertIsNot(fresh, job)
+        self.release.set()
+
+    def test_finished_jobs_are_evicted_beyond_the_cap(self):
+        self.release.set()
+        jobs = [self.manager.submit(model_id, "v1")[0] for model_id in range(4)]
+        for job in jobs:
+            job.future.result(5)
+        self.assertEqual(set(self.manager.jobs), {jobs[2].id, jobs[3].id})
+
+
+if __name__ == "__main__":
+    unittest.main()
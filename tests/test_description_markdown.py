@@ -0,0 +1,106 @@
+# tests/test_description_markdown.py
+"""
+Tests of the description HTML-to-Markdown conversion.
+
+Run from the repository root: python -m pytest tests
+"""
+
+import unittest
+
+from description_markdown import html_to_markdown, parse_description
+
+
+class ListTests(unittest.TestCase):
+    def test_paragraphs_in_list_items_stay_on_the_marker_line(self):
+        html = "<ul><li><p>first</p></li><li><p>second</p></li></ul>"
+        self.assertEqual(html_to_markdown(html), "- first\n- second")
+
+    def test_second_paragraph_is_indented_into_the_item(self):
+        html = "<ol><li><p>first</p><p>more</p></li></ol><p>after</p>"
+        self.assertEqual(html_to_markdown(html), "1. first\n   more\n\nafter")
+
+    def test_nested_list_is_indented_to_the_parent_content(self):
+        html = "<ul><li>a<ol><li>b</li><li>c</li></ol></li><li>d</li></ul>"
+        self.assertEqual(html_to_markdown(html), "- a\n  1. b\n  2. c\n- d")
+
+
+class EscapeTests(unittest.TestCase):
+    def test_html_entities_do_not_become_html(self):
+        self.assertEqual(html_to_markdown("<p>&lt;tag&gt;</p>"), "\\<tag>")
+
+    def test_hash_at_line_start_is_not_a_heading(self):
+        self.assertEqual(html_to_markdown("<p># x</p>"), "\\# x")
+
+    def test_number_at_line_start_is_not_a_list(self):
+        self.assertEqual(html_to_markdown("<p>1. x</p>"), "1\\. x")
+
+    def test_dash_and_quote_at_line_start(self):
+        self.assertEqual(html_to_markdown("<p>- x</p><p>&gt; y</p>"), "\\- x\n\n\\> y")
+
+    def test_asterisks_are_not_emphasis(self):
+        self.assertEqual(html_to_markdown("<p>2*3*4</p>"), "2\\*3\\*4")
+
+    def test_special_characters_mid_line(self):
+        self.assertEqual(html_to_markdown("<p>a_b [c] 1. d # e</p>"), "a\\_b \\[c\\] 1. d # e")
+
+    def test_escaped_entity_stays_literal(self):
+        self.assertEqual(html_to_markdown("<p>&amp;amp; &amp; x</p>"), "\\&amp; & x")
+
+
+class StructureTests(unittest.TestCase):
+    def test_inline_marks_and_links(self):
+        html = '<h2>About <b>this</b></h2><p>Use <i> this </i>and <a href="https://x.y">a link</a>.</p>'
+        self.assertEqual(html_to_markdown(html), "## About **this**\n\nUse *this* and [a link](https://x.y).")
+
+    def test_block_quote(self):
+        self.assertEqual(html_to_markdown("<p>a</p><blockquote><p>q</p><p>r</p></blockquote>"), "a\n\n> q\n>\n> r")
+
+    def test_code_block_is_not_escaped(self):
+        self.assertEqual(html_to_markdown("<pre><code>x = a*b\n</code></pre>"), "```\nx = a*b\n```")
+
+    def test_dropped_elements(self):
+        self.assertEqual(html_to_markdown("<p>Hello<edge-media src=x></p><script>alert(1)</script>"), "Hello")
+
+
+class TableTests(unittest.TestCase):
+    def test_cells_become_a_markdown_table(self):
+        html = "<table><tr><th>a</th><th>b</th></tr><tr><td>1</td><td>2</td></tr></table><p>after</p>"
+        self.assertEqual(html_to_markdown(html), "| a | b |\n| --- | --- |\n| 1 | 2 |\n\nafter")
+
+    def test_short_rows_are_padded(self):
+        html = "<p>before</p><table><tbody><tr><td>a</td><td>b</td></tr><tr><td>c</td></tr></tbody></table>"
+        self.assertEqual(html_to_markdown(html), "before\n\n| a | b |\n| --- | --- |\n| c |  |")
+
+    def test_cell_content_stays_on_one_line(self):
+        html = "<table><tr><td><p>x</p><p>y</p></td><td>1|2<br>3</td></tr></table>"
+        self.assertEqual(html_to_markdown(html), "| x y | 1\\|2 3 |\n| --- | --- |")
+
+    def test_unclosed_cells(self):
+        self.assertEqual(html_to_markdown("<table><tr><td>a<td>b<tr><td>c</table>"), "| a | b |\n| --- | --- |\n| c |  |")
+
+    def test_nested_table_keeps_its_text(self):
+        html = "<table><tr><td>a<table><tr><td>in</td><td>ner</td></tr></table></td><td>b</td></tr></table>"
+        self.assertEqual(html_to_markdown(html), "| a in ner | b |\n| --- | --- |")
+
+    def test_table_in_a_list_item(self):
+        html = "<ul><li>x<table><tr><td>a</td></tr></table></li><li>y</li></ul>"
+        self.assertEqual(html_to_markdown(html), "- x\n\n  | a |\n  | --- |\n- y")
+
+    def test_images_in_cells(self):
+        document = parse_description('<table><tr><td><img src="https://a/1.jpeg"></td></tr></table>')
+        self.assertEqual(document.image_urls, ["https://a/1.jpeg"])
+        self.assertEqual(document.render({"https://a/1.jpeg": "m_1.jpeg"}), "| ![[m_1.jpeg]] |\n| --- |")
+
+
+class ImageTests(unittest.TestCase):
+    def test_saved_images_are_embedded_locally(self):
+        document = parse_description('<p><img src="https://a/1.jpeg"><img src="https://b/2.png" alt="two"></p>')
+        self.assertEqual(document.image_urls, ["https://a/1.jpeg", "https://b/2.png"])
+        self.assertEqual(
+            document.render({"https://a/1.jpeg": "M__description_1.jpeg"}),
+            "![[M__description_1.jpeg]]![two](https://b/2.png)"
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
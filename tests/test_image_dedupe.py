@@ -0,0 +1,92 @@
+# tests/test_image_dedupe.py
+"""
+Tests of the library-wide near-duplicate index.
+
+Run from the repository root: python -m pytest tests
+"""
+
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from PIL import Image
+
+from image_dedupe import DEDUPE_DROP, DuplicateImage, ImageDeduplicator
+
+
+def _image(seed: int) -> Image.Image:
+    img = Image.new("L", (64, 64))
+    img.putdata([(i * seed) % 256 for i in range(64 * 64)])
+    return img
+
+
+class LibraryIndexTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.index_file = Path(self._tmp.name) / "hashes.tsv"
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _deduplicator(self) -> ImageDeduplicator:
+        return ImageDeduplicator(DEDUPE_DROP, 4, self.index_file)
+
+    def test_refetched_version_does_not_match_itself(self):
+        scope = self._deduplicator().scope(11)
+        scope.check(_image(3), "m_1.jpeg", "https://x/a")
+        scope.check(_image(7), "m_2.jpeg", "https://x/b")
+
+        # Image order changed: the filenames swap
+        scope = self._deduplicator().scope(11)
+        scope.check(_image(7), "m_1.jpeg", "https://x/b")
+        scope.check(_image(3), "m_2.jpeg", "https://x/a")
+
+        lines = self.index_file.read_text(encoding="utf-8").splitlines()
+        self.assertEqual(len(lines), 4)
+        # Compacted on load: one line per version and image
+        self._deduplicator()
+        lines = self.index_file.read_text(encoding="utf-8").splitlines()
+        self.assertEqual(sorted(line.split("\t")[3] for line in lines), ["m_1.jpeg", "m_2.jpeg"])
+
+    def test_other_version_matches_library(self):
+        self._deduplicator().scope(11).check(_image(3), "m_1.jpeg", "https://x/a")
+        with self.assertRaises(DuplicateImage) as raised:
+            self._deduplicator().scope(12).check(_image(3), "n_1.jpeg", "https://y/a")
+        self.assertEqual(raised.exception.duplicate_of, "m_1.jpeg")
+
+    def test_replaced_entry_no_longer_matches(self):
+        deduplicator = self._deduplicator()
+        deduplicator.scope(11).check(_image(3), "m_1.jpeg", "https://x/a")
+        deduplicator.scope(11).check(_image(5), "m_1.jpeg", "https://x/a")
+        deduplicator.scope(12).check(_image(3), "n_1.jpeg", "https://y/a")
+
+    def test_concurrent_jobs_append_whole_lines(self):
+        # Each job has its own deduplicator; they share the lock of the file
+        deduplicators = [self._deduplicator() for _ in range(4)]
+        self.assertTrue(all(d._file_lock is deduplicators[0]._file_lock for d in deduplicators))
+
+        def remember(job: int) -> None:
+            for idx in range(50):
+                deduplicators[job].remember(job * 1000 + idx, job, f"https://x/{idx}", f"m{job}_{idx}.jpeg")
+
+        threads = [threading.Thread(target=remember, args=(job,)) for job in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        lines = self.index_file.read_text(encoding="utf-8").splitlines()
+        self.assertEqual(len(lines), 200)
+        self.assertTrue(all(len(line.split("\t")) == 4 for line in lines))
+        self.assertEqual(len(self._deduplicator().entries), 200)
+
+    def test_entries_of_the_old_format_are_ignored(self):
+        self.index_file.write_text(f"{0:016x}\tm_1.jpeg\n", encoding="utf-8")
+        deduplicator = self._deduplicator()
+        self.assertEqual(deduplicator.entries, {})
+        self.assertEqual(self.index_file.read_text(encoding="utf-8"), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+# tests/test_model_payload.py
+"""
+Tests of the compact model payload parser.
+
+Run from the repository root: python -m pytest tests
+"""
+
+import json
+import unittest
+
+from dataset_export import image_record
+from generation_stats import GenerationStats
+from model_payload import parse_model_payload
+
+PAYLOAD = {
+    "id": 1,
+    "name": "Model",
+    "modelVersions": [{
+        "id": 11,
+        "name": "v1",
+        "images": [{
+            "url": "https://x/1.jpeg",
+            "meta": {
+                "prompt": "a cat", "Steps": 30, "CFG scale": 6.5, "clip_skip": 2,
+                "vae": "kl-f8", "Seed": 42, "Sampler": "Euler a",
+                "comfy": "{...workflow...}",
+            },
+        }],
+    }],
+}
+
+
+class MetaFieldTests(unittest.TestCase):
+    def setUp(self):
+        model = parse_model_payload(json.dumps(PAYLOAD))
+        self.image = model["modelVersions"][0]["images"][0]
+
+    def test_parameter_aliases_are_kept(self):
+        self.assertEqual(self.image["meta"], {
+            "prompt": "a cat", "Steps": 30, "CFG scale": 6.5, "clip_skip": 2,
+            "vae": "kl-f8", "Seed": 42, "Sampler": "Euler a",
+        })
+
+    def test_generation_stats_see_every_parameter(self):
+        stats = GenerationStats()
+        stats.add(self.image["meta"])
+        self.assertTrue(all(stats.counts[name] for name in stats.counts))
+
+    def test_dataset_row_has_every_parameter(self):
+        record = image_record(1, "Model", {"id": 11, "name": "v1"}, self.image, None)
+        self.assertEqual(
+            (record["steps"], record["cfg"], record["clip_skip"], record["vae"], record["seed"], record["sampler"]),
+            (30, 6.5, 2, "kl-f8", 42, "Euler a")
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
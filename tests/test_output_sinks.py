@@ -0,0 +1,64 @@
+# tests/test_output_sinks.py
+"""
+Tests of the archive sink with concurrent jobs.
+
+Run from the repository root: python -m pytest tests
+"""
+
+import tarfile
+import tempfile
+import threading
+import unittest
+import zipfile
+from pathlib import Path
+
+from output_sinks import ArchiveSink, SINK_MARKDOWN
+
+
+class ArchiveSinkTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self.addCleanup(self._tmp.cleanup)
+
+    def _run_jobs(self, archive_path: Path, jobs: int = 4, notes: int = 25) -> None:
+        def job(idx: int) -> None:
+            # One sink per job, as api_server / watcher / work_queue create them
+            with ArchiveSink(archive_path, buffer_bytes=1) as sink:
+                for note in range(notes):
+                    sink.write_text(SINK_MARKDOWN, f"job{idx}/{note}.md", "x" * 1000)
+
+        threads = [threading.Thread(target=job, args=(idx,)) for idx in range(jobs)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def test_concurrent_jobs_append_to_one_zip(self):
+        archive_path = self.root / "batch.zip"
+        self._run_jobs(archive_path)
+        with zipfile.ZipFile(archive_path) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(len(zf.namelist()), 100)
+
+    def test_concurrent_jobs_append_to_one_tar(self):
+        archive_path = self.root / "batch.tar"
+        self._run_jobs(archive_path)
+        with tarfile.open(archive_path) as tf:
+            self.assertEqual(len(tf.getnames()), 100)
+
+    def test_tar_gz_is_never_replaced(self):
+        archive_path = self.root / "batch.tar.gz"
+        self._run_jobs(archive_path, jobs=3, notes=2)
+
+        archives = sorted(p.name for p in self.root.iterdir())
+        self.assertEqual(archives, ["batch-1.tar.gz", "batch-2.tar.gz", "batch.tar.gz"])
+        names = []
+        for name in archives:
+            with tarfile.open(self.root / name) as tf:
+                names.extend(tf.getnames())
+        self.assertEqual(len(names), 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
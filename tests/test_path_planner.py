@@ -0,0 +1,130 @@
+# tests/test_path_planner.py
+"""
+Tests of the output path planner: Unicode normalization, the byte-length
+cap with its hash suffix and collision claims.
+
+Run from the repository root: python -m pytest tests
+"""
+
+import unicodedata
+import unittest
+from pathlib import Path
+
+from path_planner import MAX_COMPONENT_BYTES, PathPlanner, cap_length, sanitize_filename, sanitize_path_component
+
+
+def _utf8_len(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+
+class SanitizeTests(unittest.TestCase):
+    def test_nfc_normalization(self):
+        decomposed = unicodedata.normalize("NFD", "Café Crème")
+        self.assertNotEqual(decomposed, "Café Crème")
+        self.assertEqual(sanitize_filename(decomposed), "Café Crème")
+        self.assertEqual(sanitize_path_component(decomposed), "Café Crème")
+
+    def test_non_ascii_letters_are_kept(self):
+        self.assertEqual(sanitize_filename("猫 Modell ü"), "猫 Modell ü")
+        self.assertEqual(sanitize_filename("a/b:c"), "a_b_c")
+
+    def test_path_component_keeps_dots(self):
+        self.assertEqual(sanitize_path_component("v16.0"), "v16.0")
+        self.assertEqual(sanitize_path_component("v1:0."), "v1_0")
+
+    def test_decomposed_and_composed_names_share_a_plan(self):
+        planner = PathPlanner()
+        composed = planner.plan_version("Café", "v1", 1, model_id=1)
+        decomposed = planner.plan_version("Café", unicodedata.normalize("NFD", "v1"), 1, model_id=1)
+        self.assertEqual(composed.note_relpath, decomposed.note_relpath)
+
+
+class CapLengthTests(unittest.TestCase):
+    def test_short_names_are_unchanged(self):
+        self.assertEqual(cap_length("model", 20), "model")
+
+    def test_multibyte_name_at_the_cap(self):
+        # 3 bytes per character: the cut falls inside a character
+        name = "猫" * 100
+        capped = cap_length(name, 100)
+
+        self.assertLessEqual(_utf8_len(capped), 100)
+        self.assertRegex(capped, r"^猫+~[0-9a-f]{8}$")
+        self.assertEqual(capped, capped.encode("utf-8").decode("utf-8"))
+
+    def test_name_exactly_at_the_cap_is_unchanged(self):
+        name = "é" * 50
+        self.assertEqual(cap_length(name, 100), name)
+        self.assertNotEqual(cap_length(name + "é", 100), name + "é")
+
+    def test_long_names_with_a_common_prefix_stay_distinct(self):
+        first, second = cap_length("é" * 200 + "a", 100), cap_length("é" * 200 + "b", 100)
+        self.assertNotEqual(first, second)
+        self.assertEqual(first.split("~")[0], second.split("~")[0])
+
+    def test_planned_components_fit_the_filesystem_limit(self):
+        plan = PathPlanner().plan_version("模型" * 80, "版本" * 80, 12, model_id=1)
+
+        components = [*plan.note_relpath.parts, *plan.image_dir.parts, f"{plan.image_bases[-1].name}.jpeg"]
+        for component in components:
+            self.assertLessEqual(_utf8_len(component), MAX_COMPONENT_BYTES)
+
+
+class CollisionTests(unittest.TestCase):
+    def test_versions_sanitizing_to_the_same_stem(self):
+        planner = PathPlanner()
+        dotted = planner.plan_version("Model", "v1.0", 1, model_id=1)
+        underscored = planner.plan_version("Model", "v1_0", 1, model_id=1)
+
+        self.assertEqual(dotted.image_dir, Path("Model/v1_0"))
+        self.assertEqual(underscored.image_dir, Path("Model/v1_0_2"))
+        self.assertNotEqual(dotted.image_bases[0], underscored.image_bases[0])
+        self.assertNotEqual(dotted.note_relpath, underscored.note_relpath)
+
+    def test_case_only_collisions(self):
+        planner = PathPlanner()
+        first = planner.plan_version("Model", "Final", 1, model_id=1)
+        second = planner.plan_version("Model", "final", 1, model_id=1)
+
+        self.assertNotEqual(first.image_dir.as_posix().casefold(), second.image_dir.as_posix().casefold())
+        self.assertNotEqual(first.note_relpath.as_posix().casefold(), second.note_relpath.as_posix().casefold())
+
+    def test_models_with_the_same_name(self):
+        planner = PathPlanner()
+        first = planner.plan_version("Model", "v1", 1, model_id=1)
+        second = planner.plan_version("Model", "v1", 1, model_id=2)
+
+        self.assertEqual(first.sanitized_model_name, "Model")
+        self.assertEqual(second.sanitized_model_name, "Model_2")
+        self.assertEqual(planner.plan_index("Model", model_id=2).parent, Path("Model_2"))
+
+    def test_capped_names_with_a_common_prefix(self):
+        planner = PathPlanner(max_component_bytes=48)
+        first = planner.plan_version("Model", "ü" * 40 + "a", 1, model_id=1)
+        second = planner.plan_version("Model", "ü" * 40 + "b", 1, model_id=1)
+
+        self.assertIs(planner.plan_version("Model", "ü" * 40 + "a", 1, model_id=1), first)
+        self.assertRegex(first.image_dir.name, r"^ü+~[0-9a-f]{8}$")
+        self.assertNotEqual(first.image_dir, second.image_dir)
+        self.assertNotEqual(first.note_relpath, second.note_relpath)
+
+    def test_same_owner_keeps_its_paths(self):
+        planner = PathPlanner()
+        first = planner.plan_version("Model", "v1", 2, model_id=1)
+        more_images = planner.plan_version("Model", "v1", 4, model_id=1)
+
+        self.assertEqual(first.note_relpath, more_images.note_relpath)
+        self.assertEqual(more_images.image_bases[:2], first.image_bases)
+        self.assertEqual(len(more_images.image_bases), 4)
+
+    def test_description_images_do_not_take_a_version_directory(self):
+        planner = PathPlanner()
+        description = planner.plan_description("Model", 1, model_id=1)
+        version = planner.plan_version("Model", "_description", 1, model_id=1)
+
+        self.assertEqual(description[0].parent, Path("Model/_description"))
+        self.assertEqual(version.image_dir, Path("Model/_description_2"))
+
+
+if __name__ == "__main__":
+    unittest.main()
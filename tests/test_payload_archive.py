@@ -0,0 +1,158 @@
+# tests/test_payload_archive.py
+"""
+Tests of the payload history: content-addressed parts, the separately
+stored stats part, the structural diff and reading back parts of either
+codec.
+
+Run from the repository root: python -m pytest tests
+"""
+
+import copy
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import payload_archive
+from payload_archive import CODEC_ZLIB, CODEC_ZSTD, PayloadArchive, diff_payloads
+
+
+def _payload(downloads: int = 10) -> dict:
+    return {
+        "id": 1,
+        "name": "Model",
+        "type": "LORA",
+        "nsfw": False,
+        "tags": ["style"],
+        "description": "<p>Text</p>",
+        "stats": {"downloadCount": downloads},
+        "modelVersions": [
+            {
+                "id": 11,
+                "name": "v1",
+                "baseModel": "SDXL 1.0",
+                "stats": {"downloadCount": downloads},
+                "files": [{"name": "a.safetensors", "sizeKB": 100, "hashes": {"SHA256": "AA"}}],
+                "images": [{"url": "https://img/1.jpeg", "stats": {"likeCount": downloads}}],
+            },
+            {
+                "id": 12,
+                "name": "v2",
+                "baseModel": "SDXL 1.0",
+                "files": [],
+                "images": [],
+            },
+        ],
+    }
+
+
+def _raw(payload: dict) -> bytes:
+    return json.dumps(payload).encode("utf-8")
+
+
+class PayloadArchiveTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.archive = PayloadArchive(Path(self._tmp.name) / "payloads.db")
+
+    def codecs(self) -> list[str]:
+        rows = self.archive._connection().execute("SELECT codec FROM blobs").fetchall()
+        return sorted({row[0] for row in rows})
+
+    def test_identical_payload_is_not_stored_again(self):
+        self.assertTrue(self.archive.add(1, _raw(_payload()), fetched_at=100))
+        self.assertFalse(self.archive.add(1, _raw(_payload()), fetched_at=200))
+        # Whitespace changes only: same parts, no new snapshot
+        self.assertFalse(self.archive.add(1, json.dumps(_payload(), indent=2).encode("utf-8"), fetched_at=300))
+        self.assertEqual(self.archive.list(1), [100])
+
+    def test_stats_change_only_adds_the_stats_part(self):
+        self.archive.add(1, _raw(_payload(10)), fetched_at=100)
+        parts = self.archive.stats()["parts"]
+
+        self.assertTrue(self.archive.add(1, _raw(_payload(20)), fetched_at=200))
+
+        self.assertEqual(self.archive.stats()["snapshots"], 2)
+        self.assertEqual(self.archive.stats()["parts"], parts + 1)
+
+    def test_changed_version_reuses_unchanged_parts(self):
+        self.archive.add(1, _raw(_payload()), fetched_at=100)
+        parts = self.archive.stats()["parts"]
+        changed = _payload()
+        changed["modelVersions"][1]["name"] = "v2 fixed"
+
+        self.archive.add(1, _raw(changed), fetched_at=200)
+
+        # Only the changed version part is new
+        self.assertEqual(self.archive.stats()["parts"], parts + 1)
+
+    def test_get_restores_stats_per_snapshot(self):
+        self.archive.add(1, _raw(_payload(10)), fetched_at=100)
+        self.archive.add(1, _raw(_payload(20)), fetched_at=200)
+
+        self.assertEqual(self.archive.get(1, at=150), (100, _payload(10)))
+        self.assertEqual(self.archive.get(1), (200, _payload(20)))
+        self.assertIsNone(self.archive.get(1, at=50))
+        self.assertIsNone(self.archive.get(2))
+
+    def test_zlib_parts_read_back(self):
+        with mock.patch.object(payload_archive, "zstandard", None):
+            self.archive.add(1, _raw(_payload()), fetched_at=100)
+            self.assertEqual(self.codecs(), [CODEC_ZLIB])
+            self.assertEqual(self.archive.get(1), (100, _payload()))
+
+    def test_zstd_part_without_zstandard_raises(self):
+        db = self.archive._connection()
+        with db:
+            db.execute(
+                "INSERT INTO blobs (digest, codec, size, data) VALUES (?, ?, ?, ?)",
+                ("d", CODEC_ZSTD, 2, b"\x00")
+            )
+        with mock.patch.object(payload_archive, "zstandard", None):
+            with self.assertRaises(RuntimeError):
+                self.archive._get_blob("d")
+
+    @unittest.skipUnless(payload_archive.zstandard, "zstandard is not installed")
+    def test_mixed_codecs_read_back(self):
+        with mock.patch.object(payload_archive, "zstandard", None):
+            self.archive.add(1, _raw(_payload(10)), fetched_at=100)
+        self.archive.add(1, _raw(_payload(20)), fetched_at=200)
+
+        self.assertEqual(self.codecs(), [CODEC_ZLIB, CODEC_ZSTD])
+        self.assertEqual(self.archive.get(1, at=100), (100, _payload(10)))
+        self.assertEqual(self.archive.get(1), (200, _payload(20)))
+
+
+class DiffPayloadsTestCase(unittest.TestCase):
+    def test_identical_payloads(self):
+        self.assertEqual(diff_payloads(_payload(), _payload(99)), [])
+
+    def test_structural_changes(self):
+        old = _payload()
+        new = copy.deepcopy(old)
+        new["description"] = "<p>Other</p>"
+        new["tags"] = ["style", "anime"]
+        version = new["modelVersions"][0]
+        version["baseModel"] = "Pony"
+        version["files"][0]["hashes"]["SHA256"] = "BB"
+        version["files"].append({"name": "b.safetensors"})
+        version["images"].append({"url": "https://img/2.jpeg"})
+        del new["modelVersions"][1]
+        new["modelVersions"].append({"id": 13, "name": "v3", "files": [{"name": "c.safetensors"}], "images": []})
+
+        self.assertEqual(diff_payloads(old, new), [
+            "tags: ['style'] -> ['style', 'anime']",
+            "description changed",
+            "new version: v3 (1 file(s), 0 image(s))",
+            "removed version: v2",
+            "version v1: baseModel: 'SDXL 1.0' -> 'Pony'",
+            "version v1: new file: b.safetensors",
+            "version v1: file a.safetensors: SHA256 AA -> BB",
+            "version v1: 1 new image(s): https://img/2.jpeg",
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
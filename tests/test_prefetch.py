@@ -0,0 +1,86 @@
+# tests/test_prefetch.py
+"""
+Tests of the image prefetch: cancelled generations and downloads shared
+with a real fetch never fill the image cache.
+
+Run from the repository root: python -m pytest tests
+"""
+
+import threading
+import unittest
+from unittest import mock
+
+import civitai_fetch_model
+from prefetch import Prefetcher
+
+URL = "https://image.civitai.com/x/width=450/1.jpeg"
+
+
+class PrefetchImageTests(unittest.TestCase):
+    def setUp(self):
+        self.prefetcher = Prefetcher(workers=1)
+        self.addCleanup(self.prefetcher.shutdown)
+        civitai_fetch_model.image_cache.clear()
+        self.addCleanup(civitai_fetch_model.image_cache.clear)
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def patch_download(self, content: bytes = b"image"):
+        def fetch(url):
+            self.started.set()
+            self.release.wait(5)
+            return content
+
+        patcher = mock.patch.object(civitai_fetch_model, "fetch_image_bytes", side_effect=fetch)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_current_generation_is_cached(self):
+        self.patch_download()
+        self.release.set()
+        self.prefetcher._fetch_image(self.prefetcher.cancel(), URL)
+
+        self.assertIn(URL, civitai_fetch_model.image_cache)
+        self.assertEqual(self.prefetcher.images_prefetched, 1)
+
+    def test_cancel_during_download_discards_the_bytes(self):
+        self.patch_download()
+        generation = self.prefetcher.cancel()
+        thread = threading.Thread(target=self.prefetcher._fetch_image, args=(generation, URL))
+        thread.start()
+        self.assertTrue(self.started.wait(5))
+
+        self.prefetcher.cancel()
+        self.release.set()
+        thread.join(5)
+
+        self.assertNotIn(URL, civitai_fetch_model.image_cache)
+        self.assertEqual(self.prefetcher.images_discarded, 1)
+
+    def test_download_shared_with_a_real_fetch_is_not_cached(self):
+        self.patch_download()
+        generation = self.prefetcher.cancel()
+        thread = threading.Thread(target=self.prefetcher._fetch_image, args=(generation, URL))
+        thread.start()
+        self.assertTrue(self.started.wait(5))
+
+        # The real download joins the prefetch in flight and gets the bytes directly
+        coalesced = civitai_fetch_model._image_flight.stats()["coalesced"]
+        results = []
+        joiner = threading.Thread(target=lambda: results.append(
+            civitai_fetch_model._image_flight.do(URL, lambda: b"other")
+        ))
+        joiner.start()
+        while civitai_fetch_model._image_flight.stats()["coalesced"] == coalesced and joiner.is_alive():
+            joiner.join(0.01)
+        self.release.set()
+        thread.join(5)
+        joiner.join(5)
+
+        self.assertEqual(results, [b"image"])
+        self.assertNotIn(URL, civitai_fetch_model.image_cache)
+        self.assertEqual(self.prefetcher.images_prefetched, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
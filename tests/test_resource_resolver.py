@@ -0,0 +1,91 @@
+# tests/test_resource_resolver.py
+"""
+Tests of the link targets of resolved resources: notes of this job and
+notes of earlier runs found through the snapshot manifests.
+
+Run from the repository root: python -m pytest tests
+"""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from path_planner import PathPlanner
+from resource_resolver import Resource, ResourceResolver
+from snapshots import SnapshotStore
+
+
+def _resource(model_id: int, version_id: int, model_name: str = "Model", version_name: str = "v1") -> Resource:
+    resource = Resource(model_id=model_id, version_id=version_id)
+    resource.model_name = model_name
+    resource.version_name = version_name
+    return resource
+
+
+class LinkTargetTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.md_dir = Path(self._tmp.name) / "md"
+        self.snapshots = SnapshotStore(Path(self._tmp.name) / "snapshots")
+        self.resolver = ResourceResolver(md_output_dir=self.md_dir)
+
+    def fetch_earlier(self, planner: PathPlanner, model_id: int, version_id: int, model_name: str = "Model"):
+        """Writes the note and manifest of a version as an earlier run would."""
+        plan = planner.plan_version(model_name, "v1", 0, model_id)
+        note = self.md_dir / plan.note_relpath
+        note.parent.mkdir(parents=True, exist_ok=True)
+        note.write_text("note", encoding="utf-8")
+        self.snapshots.save_manifest(model_id, {"id": version_id, "name": "v1"}, [], plan)
+        return plan
+
+    def test_note_of_this_job(self):
+        resource = _resource(1, 11)
+        self.resolver.register_note(11, "ModelV1")
+        self.resolver.link_targets([resource])
+        self.assertEqual(resource.note_stem, "ModelV1")
+
+    def test_note_of_an_earlier_run_with_a_collision_suffix(self):
+        # Earlier run: another model with the same name took the plain paths
+        planner = PathPlanner()
+        self.fetch_earlier(planner, 1, 11)
+        plan = self.fetch_earlier(planner, 2, 21)
+        self.assertEqual(plan.sanitized_model_name, "Model_2")
+
+        resource = _resource(2, 21)
+        self.resolver.link_targets([resource], self.snapshots)
+
+        self.assertEqual(resource.note_stem, plan.note_stem)
+        self.assertIn("[[", resource.link())
+
+    def test_unknown_version_links_to_the_model_page(self):
+        # A note exists at the path a fresh planner would choose, but it
+        # belongs to another model with the same name
+        self.fetch_earlier(PathPlanner(), 1, 11)
+
+        resource = _resource(2, 21)
+        self.resolver.link_targets([resource], self.snapshots)
+
+        self.assertIsNone(resource.note_stem)
+        self.assertEqual(resource.link(), "[Model (v1)](https://civitai.com/models/2?modelVersionId=21)")
+
+    def test_removed_note_is_not_linked(self):
+        plan = self.fetch_earlier(PathPlanner(), 1, 11)
+        (self.md_dir / plan.note_relpath).unlink()
+
+        resource = _resource(1, 11)
+        self.resolver.link_targets([resource], self.snapshots)
+
+        self.assertIsNone(resource.note_stem)
+
+    def test_without_snapshots_only_this_job_is_linked(self):
+        self.fetch_earlier(PathPlanner(), 1, 11)
+
+        resource = _resource(1, 11)
+        self.resolver.link_targets([resource])
+
+        self.assertIsNone(resource.note_stem)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+# tests/test_transport_replay.py
+"""
+Record/replay tests of the HTTP transport, including a full fetch (main())
+served from a cassette without network access.
+
+Run from the repository root: python -m pytest tests
+"""
+
+import io
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import requests
+from PIL import Image
+
+import civitai_api_helper as api_helper
+import civitai_fetch_model
+import transport
+from image_policy import ImagePolicy
+
+MODEL = {
+    "id": 1,
+    "name": "Replay Model",
+    "type": "LORA",
+    "description": "<p>Hello</p>",
+    "modelVersions": [{
+        "id": 11,
+        "name": "v1.0",
+        "baseModel": "SDXL",
+        "files": [],
+        "images": [
+            {
+                "url": f"https://image.civitai.com/abc/uuid{i}/width=450/{i}.jpeg",
+                "type": "image",
+                "meta": {"prompt": f"a cat {i}", "steps": 20 + i},
+            }
+            for i in range(3)
+        ],
+    }],
+}
+VIDEO = bytes(range(256)) * 64
+
+
+def _jpeg(shade: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), (shade, 0, 0)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+class _Response:
+    def __init__(self, content: bytes, status: int = 200, headers: dict = None):
+        self.content = content
+        self.status_code = status
+        self.headers = requests.structures.CaseInsensitiveDict(headers or {})
+        self.ok = status < 400
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.exceptions.HTTPError(str(self.status_code))
+
+    def iter_content(self, chunk_size=65536):
+        for offset in range(0, len(self.content), chunk_size):
+            yield self.content[offset:offset + chunk_size]
+
+    def close(self):
+        pass
+
+
+def _server(url, timeout=None, headers=None, stream=False):
+    if "/models/" in url:
+        return _Response(json.dumps(MODEL).encode(), headers={"Content-Type": "application/json"})
+    if url.endswith(".mp4"):
+        start, _, end = (headers or {}).get("Range", "bytes=0-").partition("=")[2].partition("-")
+        body = VIDEO[int(start):int(end) + 1 if end else None]
+        return _Response(body, 206 if headers else 200, {"Content-Type": "video/mp4"})
+    return _Response(_jpeg(int(url.rsplit("/", 1)[1].split(".")[0]) * 80), headers={"Content-Type": "image/jpeg"})
+
+
+def _offline(*args, **kwargs):
+    raise AssertionError("Network access while replaying")
+
+
+class TransportTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self.cassette = self.root / "cassette.zip"
+        self.addCleanup(self._tmp.cleanup)
+        self.addCleanup(transport.set_transport, transport.HttpTransport())
+
+    def record(self, func):
+        with mock.patch.object(transport.requests, "get", _server):
+            transport.set_transport(transport.RecordingTransport(self.cassette))
+            func()
+            transport.set_transport(transport.HttpTransport())
+
+    def replay(self, func):
+        with mock.patch.object(transport.requests, "get", _offline):
+            transport.set_transport(transport.ReplayTransport(self.cassette))
+            return func()
+
+
+class RangeReplayTests(TransportTestCase):
+    def test_recorded_range_is_replayed(self):
+        url = "https://x/clip.mp4"
+        self.record(lambda: transport.get(url, headers={"Range": "bytes=0-99"}))
+        response = self.replay(lambda: transport.get(url, headers={"Range": "bytes=0-99"}))
+        self.assertEqual((response.status_code, response.content), (206, VIDEO[:100]))
+
+    def test_missing_range_is_cut_from_the_full_body(self):
+        url = "https://x/clip.mp4"
+        self.record(lambda: transport.get(url))
+        response = self.replay(lambda: transport.get(url, headers={"Range": "bytes=100-199"}))
+        self.assertEqual((response.status_code, response.content), (206, VIDEO[100:200]))
+        self.assertEqual(response.headers["Content-Range"], f"bytes 100-199/{len(VIDEO)}")
+
+        response = self.replay(lambda: transport.get(url, headers={"Range": f"bytes={len(VIDEO)}-"}))
+        self.assertEqual(response.status_code, 416)
+
+    def test_unrecorded_url_fails_like_an_unreachable_server(self):
+        self.record(lambda: transport.get("https://x/clip.mp4"))
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.replay(lambda: transport.get("https://x/other.mp4"))
+
+
+class ReplayFetchTests(TransportTestCase):
+    def fetch(self, name: str) -> Path:
+        # Fresh metadata cache, so the payload comes from the transport
+        api_helper.configure_cache()
+        out = self.root / name
+        civitai_fetch_model.main(
+            1, "v1.0",
+            md_output_dir=out / "md",
+            img_output_dir=out / "img",
+            image_policy=ImagePolicy()
+        )
+        return out
+
+    def test_replayed_fetch_matches_the_recorded_one(self):
+        self.record(lambda: self.fetch("recorded"))
+        self.replay(lambda: self.fetch("replayed"))
+
+        recorded = {p.relative_to(self.root / "recorded"): p.read_bytes()
+                    for p in (self.root / "recorded").rglob("*") if p.is_file()}
+        replayed = {p.relative_to(self.root / "replayed"): p.read_bytes()
+                    for p in (self.root / "replayed").rglob("*") if p.is_file()}
+        self.assertTrue(any(p.suffix == ".md" for p in recorded))
+        self.assertEqual(sum(p.suffix == ".jpeg" for p in recorded), 3)
+        self.assertEqual(recorded, replayed)
+
+
+if __name__ == "__main__":
+    unittest.main()
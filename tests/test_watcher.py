@@ -0,0 +1,129 @@
+# tests/test_watcher.py
+"""
+Tests of watch mode: failed versions are retried with backoff instead of
+on every poll, and the backoff survives a restart.
+
+Run from the repository root: python -m pytest tests
+"""
+
+import json
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import watcher
+from watcher import MAX_RETRY_DELAY, ModelWatcher
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _payload(*versions: tuple[int, str]) -> bytes:
+    return json.dumps({
+        "id": 1,
+        "name": "Model",
+        "modelVersions": [{"id": vid, "name": name} for vid, name in versions],
+    }).encode("utf-8")
+
+
+class FailedVersionTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.state_file = Path(self._tmp.name) / "watch_state.json"
+        self.clock = _Clock()
+        self.payload = _payload((11, "v1"))
+        patcher = mock.patch.object(watcher.api_helper, "fetch_model_raw", lambda *a, **k: (self.payload, False))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.watcher = self.create_watcher()
+
+    def create_watcher(self) -> ModelWatcher:
+        return ModelWatcher(
+            [1], [], self.state_file, Path(self._tmp.name), Path(self._tmp.name),
+            min_interval=100, fetch_existing=True, clock=self.clock
+        )
+
+    def fetch_queued(self, result) -> None:
+        """Runs the queued fetches with run() returning result (or raising it)."""
+        stop_event = threading.Event()
+        task_done = self.watcher.jobs.task_done
+
+        def done() -> None:
+            task_done()
+            if self.watcher.jobs.empty():
+                stop_event.set()
+
+        with mock.patch.object(watcher.civitai_fetch_model, "run", side_effect=[result] * self.watcher.jobs.qsize()), \
+                mock.patch.object(self.watcher.jobs, "task_done", done):
+            self.watcher._fetch_worker(stop_event)
+
+    def poll(self) -> int:
+        return self.watcher.poll_model(self.watcher.models[1])
+
+    def test_not_found_version_backs_off(self):
+        self.assertEqual(self.poll(), 1)
+        self.fetch_queued(None)
+
+        # Not queued again before the backoff passed
+        self.assertEqual(self.poll(), 0)
+        self.clock.now += 100
+        self.assertEqual(self.poll(), 1)
+        self.fetch_queued(None)
+
+        # The delay doubles per failure
+        self.assertEqual(self.watcher.models[1].failed[11], [2, self.clock.now + 200])
+        self.clock.now += 199
+        self.assertEqual(self.poll(), 0)
+        self.clock.now += 1
+        self.assertEqual(self.poll(), 1)
+
+    def test_exception_counts_as_failure(self):
+        self.poll()
+        self.fetch_queued(RuntimeError("404"))
+        self.assertEqual(self.watcher.models[1].failed[11][0], 1)
+        self.assertEqual(self.poll(), 0)
+
+    def test_delay_is_capped(self):
+        self.watcher.models[1].failed[11] = [30, 0.0]
+        self.watcher.jobs.put((1, 11, "v1"))
+        self.fetch_queued(None)
+        self.assertEqual(self.watcher.models[1].failed[11], [31, self.clock.now + MAX_RETRY_DELAY])
+
+    def test_success_clears_the_failure(self):
+        self.poll()
+        self.fetch_queued(None)
+        self.clock.now += 100
+        self.poll()
+        self.fetch_queued({"ok": True})
+
+        self.assertEqual(self.watcher.models[1].failed, {})
+        self.assertIn(11, self.watcher.models[1].known)
+        self.assertEqual(self.poll(), 0)
+
+    def test_removed_version_is_forgotten(self):
+        self.poll()
+        self.fetch_queued(None)
+        self.payload = _payload((12, "v2"))
+        self.poll()
+        self.assertNotIn(11, self.watcher.models[1].failed)
+
+    def test_backoff_is_persisted(self):
+        self.poll()
+        self.fetch_queued(None)
+        self.watcher.save_state()
+
+        restarted = self.create_watcher()
+        self.assertEqual(restarted.models[1].failed, {11: [1, self.clock.now + 100]})
+        self.assertEqual(restarted.poll_model(restarted.models[1]), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
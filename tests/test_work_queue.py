@@ -0,0 +1,158 @@
+# tests/test_work_queue.py
+"""
+Tests of the SQLite work queue: leases, heartbeats, expiry, re-claim and
+the retry/failed transitions.
+
+Run from the repository root: python -m pytest tests
+"""
+
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import work_queue
+from work_queue import JOB_DONE, JOB_FAILED, JOB_LEASED, JOB_QUEUED, QueueWorker, WorkQueue
+
+
+class _Config(dict):
+    def get_path(self, key):
+        return Path(self.get(key, "."))
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class WorkQueueTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.db_file = Path(self._tmp.name) / "queue.db"
+        self.clock = _Clock()
+        self.queue = WorkQueue(self.db_file, lease_seconds=100, max_attempts=2, clock=self.clock)
+
+    def status(self, job_id: int) -> tuple:
+        row = self.queue._connection().execute(
+            "SELECT status, worker, attempts, error FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return tuple(row)
+
+
+class EnqueueTests(WorkQueueTestCase):
+    def test_versions_are_queued_once(self):
+        self.assertTrue(self.queue.enqueue(1, "v1.0"))
+        self.assertFalse(self.queue.enqueue(1, "V1.0"))
+        job = self.queue.lease("a")
+        self.queue.complete(job, "a")
+        self.assertFalse(self.queue.enqueue(1, "v1.0"))
+        self.assertEqual(self.queue.stats()[JOB_DONE], 1)
+
+    def test_failed_job_is_queued_again_with_fresh_attempts(self):
+        self.queue.enqueue(1, "v1.0")
+        for _ in range(2):
+            self.queue.fail(self.queue.lease("a"), "a", "boom")
+        self.assertEqual(self.status(1)[0], JOB_FAILED)
+        self.assertFalse(self.queue.enqueue(1, "v1.0", retry_failed=False))
+
+        self.assertTrue(self.queue.enqueue(1, "v1.0"))
+        self.assertEqual(self.status(1), (JOB_QUEUED, None, 0, None))
+
+
+class LeaseTests(WorkQueueTestCase):
+    def test_oldest_job_is_leased_once(self):
+        self.queue.enqueue(1, "v1.0")
+        self.queue.enqueue(2, "v1.0")
+        first = self.queue.lease("a")
+        second = self.queue.lease("b")
+        self.assertEqual((first.model_id, second.model_id), (1, 2))
+        self.assertIsNone(self.queue.lease("c"))
+        self.assertEqual(self.status(first.id)[:3], (JOB_LEASED, "a", 1))
+
+    def test_concurrent_workers_never_share_a_job(self):
+        for model_id in range(20):
+            self.queue.enqueue(model_id, "v1.0")
+        leased = []
+        lock = threading.Lock()
+
+        def worker(name: str) -> None:
+            # Every thread has its own connection, like separate nodes
+            queue = WorkQueue(self.db_file, clock=self.clock)
+            while (job := queue.lease(name)) is not None:
+                with lock:
+                    leased.append(job.id)
+
+        threads = [threading.Thread(target=worker, args=(f"w{idx}",)) for idx in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(leased), list(range(1, 21)))
+
+    def test_heartbeat_keeps_the_lease(self):
+        self.queue.enqueue(1, "v1.0")
+        job = self.queue.lease("a")
+        self.clock.now += 90
+        self.assertTrue(self.queue.heartbeat(job, "a"))
+        self.clock.now += 90
+        self.assertIsNone(self.queue.lease("b"))
+
+    def test_expired_lease_is_reclaimed(self):
+        self.queue.enqueue(1, "v1.0")
+        job = self.queue.lease("a")
+        self.clock.now += 101
+
+        taken = self.queue.lease("b")
+        self.assertEqual((taken.id, taken.attempts), (job.id, 2))
+        # The first worker lost the job
+        self.assertFalse(self.queue.heartbeat(job, "a"))
+        self.assertFalse(self.queue.complete(job, "a"))
+        self.assertTrue(self.queue.complete(taken, "b"))
+        self.assertEqual(self.status(job.id)[:2], (JOB_DONE, "b"))
+
+    def test_expired_lease_without_attempts_left_fails(self):
+        self.queue.enqueue(1, "v1.0")
+        self.queue.lease("a")
+        self.clock.now += 101
+        self.queue.lease("b")
+        self.clock.now += 101
+
+        self.assertIsNone(self.queue.lease("c"))
+        self.assertEqual(self.status(1), (JOB_FAILED, "b", 2, "lease expired"))
+
+
+class RetryTests(WorkQueueTestCase):
+    def test_failed_job_is_retried_until_attempts_are_used_up(self):
+        self.queue.enqueue(1, "v1.0")
+        job = self.queue.lease("a")
+        self.assertTrue(self.queue.fail(job, "a", "timeout"))
+        self.assertEqual(self.status(1), (JOB_QUEUED, "a", 1, "timeout"))
+
+        job = self.queue.lease("b")
+        self.assertTrue(self.queue.fail(job, "b", "timeout"))
+        self.assertEqual(self.status(1), (JOB_FAILED, "b", 2, "timeout"))
+        self.assertIsNone(self.queue.lease("c"))
+
+    def test_worker_reports_outcomes(self):
+        worker = QueueWorker(self.queue, _Config(), worker_id="w")
+        stop_event = threading.Event()
+
+        outcomes = {1: ["1.md"], 2: None}
+        with mock.patch.object(work_queue.civitai_fetch_model, "run",
+                               side_effect=lambda model_id, *args, **kwargs: outcomes[model_id]), \
+                mock.patch.object(work_queue, "create_sink", return_value=mock.MagicMock()):
+            for model_id in outcomes:
+                self.queue.enqueue(model_id, "v1.0")
+                worker.process(self.queue.lease("w"), stop_event)
+
+        self.assertEqual(self.status(1)[0], JOB_DONE)
+        self.assertEqual(self.status(2), (JOB_QUEUED, "w", 1, "Version 'v1.0' not found"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,272 @@
+# transport.py
+"""
+Pluggable HTTP transport for all GET requests (API and images).
+
+Modes:
+    live    - requests over the network (default)
+    record  - like live, but every response is captured into a cassette
+    replay  - responses are served from a cassette without any network
+              access, optionally with injected latency and bandwidth limits
+
+A cassette is a single zip file: index.json maps URLs to status/headers and
+a body digest, and every distinct body is stored once under bodies/.
+Replaying the same cassette makes runs reproducible offline (tests,
+benchmarks). Ranged requests are recorded under URL and Range; on replay a
+range that was not recorded is cut from the recorded full body (206).
+"""
+
+import atexit
+import hashlib
+import json
+import re
+import threading
+import time
+import zipfile
+from pathlib import Path
+from typing import Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+MODE_LIVE = "live"
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+MODES = (MODE_LIVE, MODE_RECORD, MODE_REPLAY)
+
+# Response headers kept in cassettes
+RECORDED_HEADERS = ("Content-Type", "Content-Length", "Content-Range", "ETag", "Last-Modified")
+# Request headers dropped while recording, so full bodies are captured
+CONDITIONAL_HEADERS = ("If-None-Match", "If-Modified-Since")
+# Bodies of these content types are compressed in cassettes (images are stored as is)
+COMPRESSED_TYPES = ("application/json", "text/")
+
+# Single byte range ("bytes=0-1023", "bytes=1024-")
+_RANGE_RE = re.compile(r"bytes=(\d+)-(\d*)")
+
+
+def _index_key(url: str, byte_range: Optional[str] = None) -> str:
+    # Ranged responses are kept next to the full one (a tab never occurs in URLs)
+    return f"{url}\tRange: {byte_range}" if byte_range else url
+
+
+def _slice_range(entry: dict, content: bytes, byte_range: str) -> tuple[int, dict, bytes]:
+    """
+    Cuts a byte range from a recorded full response like a server would.
+    Returns (status, headers, body); unsupported ranges return the full body.
+    """
+    match = _RANGE_RE.fullmatch(byte_range.strip())
+    if entry["status"] != 200 or not match:
+        return entry["status"], entry["headers"], content
+
+    total = len(content)
+    start = int(match.group(1))
+    end = min(int(match.group(2)), total - 1) if match.group(2) else total - 1
+    headers = {k: v for k, v in entry["headers"].items() if k.lower() != "content-length"}
+    if start >= total or start > end:
+        headers["Content-Range"] = f"bytes */{total}"
+        return 416, headers, b""
+
+    body = content[start:end + 1]
+    headers.update({"Content-Range": f"bytes {start}-{end}/{total}", "Content-Length": str(len(body))})
+    return 206, headers, body
+
+
+class RecordedResponse:
+    """
+    Response served from a cassette (subset of requests.Response).
+    """
+
+    def __init__(self, url: str, status_code: int, headers: dict, content: bytes):
+        self.url = url
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self) -> None:
+        if not self.ok:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+    def iter_content(self, chunk_size: int = 65536):
+        for offset in range(0, len(self.content), chunk_size):
+            yield self.content[offset:offset + chunk_size]
+
+    def close(self) -> None:
+        pass
+
+
+class HttpTransport:
+    """
+    Live transport (requests).
+    """
+
+    def get(self, url: str, timeout: Optional[float] = None, headers: Optional[dict] = None, stream: bool = False):
+        return requests.get(url, timeout=timeout, headers=headers or {}, stream=stream)
+
+    def close(self) -> None:
+        pass
+
+
+class RecordingTransport(HttpTransport):
+    """
+    Live transport that captures every response into a cassette.
+    The cassette is written on close() (at the latest at interpreter exit).
+    """
+
+    def __init__(self, cassette: Path):
+        self.cassette = Path(cassette)
+        self._lock = threading.Lock()
+        self._index: dict[str, dict] = {}
+        self._bodies: dict[str, bytes] = {}
+
+    def get(self, url: str, timeout: Optional[float] = None, headers: Optional[dict] = None, stream: bool = False):
+        headers = {k: v for k, v in (headers or {}).items() if k not in CONDITIONAL_HEADERS}
+        # Recorded bodies are read completely, stream or not
+        response = super().get(url, timeout=timeout, headers=headers)
+
+        digest = hashlib.sha1(response.content).hexdigest()
+        content_type = response.headers.get("Content-Type", "")
+        entry = {
+            "status": response.status_code,
+            "headers": {k: response.headers[k] for k in RECORDED_HEADERS if k in response.headers},
+            "body": digest,
+            "compress": content_type.startswith(COMPRESSED_TYPES),
+        }
+        with self._lock:
+            self._index[_index_key(url, headers.get("Range"))] = entry
+            self._bodies[digest] = response.content
+        return response
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._index:
+                return
+            self.cassette.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.cassette.with_name(f".{self.cassette.name}.tmp")
+            with zipfile.ZipFile(tmp_file, "w") as archive:
+                archive.writestr("index.json", json.dumps(self._index, indent=1), zipfile.ZIP_DEFLATED)
+                compressed = {entry["body"] for entry in self._index.values() if entry["compress"]}
+                for digest, body in self._bodies.items():
+                    method = zipfile.ZIP_DEFLATED if digest in compressed else zipfile.ZIP_STORED
+                    archive.writestr(f"bodies/{digest}", body, method)
+            tmp_file.replace(self.cassette)
+        print(f"[OK] Cassette written: {self.cassette} ({len(self._index)} responses)")
+
+
+class ReplayTransport:
+    """
+    Serves responses from a cassette. Unknown URLs raise a ConnectionError,
+    exactly like an unreachable server.
+    """
+
+    def __init__(self, cassette: Path, latency: float = 0.0, bandwidth: float = 0.0):
+        """
+        Initialize ReplayTransport.
+
+        Args:
+            cassette: Cassette file written in record mode
+            latency: Injected delay per request in seconds
+            bandwidth: Injected transfer rate in bytes per second (0 = unlimited)
+        """
+        self.cassette = Path(cassette)
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self._lock = threading.Lock()
+        self._archive = zipfile.ZipFile(self.cassette)
+        self._index: dict[str, dict] = json.loads(self._archive.read("index.json"))
+
+    def get(self, url: str, timeout: Optional[float] = None, headers: Optional[dict] = None, stream: bool = False):
+        byte_range = (headers or {}).get("Range")
+        entry = self._index.get(_index_key(url, byte_range))
+        sliced = entry is None and byte_range is not None
+        if sliced:
+            entry = self._index.get(url)
+        if entry is None:
+            raise requests.exceptions.ConnectionError(f"No recorded response for {url}")
+
+        with self._lock:
+            content = self._archive.read(f"bodies/{entry['body']}")
+
+        status, response_headers = entry["status"], entry["headers"]
+        if sliced:
+            status, response_headers, content = _slice_range(entry, content, byte_range)
+
+        delay = self.latency + (len(content) / self.bandwidth if self.bandwidth else 0.0)
+        if delay:
+            time.sleep(delay)
+        return RecordedResponse(url, status, response_headers, content)
+
+    def close(self) -> None:
+        self._archive.close()
+
+
+# Active transport of the process (see configure_transport)
+_transport = HttpTransport()
+
+
+def get(url: str, timeout: Optional[float] = None, headers: Optional[dict] = None, stream: bool = False):
+    """
+    GETs url through the active transport. With stream, only the headers
+    are read; the body is read with iter_content() (close() the response).
+    """
+    return _transport.get(url, timeout=timeout, headers=headers, stream=stream)
+
+
+def set_transport(transport) -> None:
+    """
+    Replaces the active transport (closing the previous one).
+    """
+    global _transport
+    previous, _transport = _transport, transport
+    previous.close()
+
+
+def configure_transport(
+    mode: str = MODE_LIVE,
+    cassette: Optional[Path] = None,
+    latency: float = 0.0,
+    bandwidth: float = 0.0
+) -> None:
+    """
+    Activates the transport for a mode.
+
+    Raises:
+        ValueError: On an unknown mode or a missing cassette path
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown transport mode: {mode} (expected one of {', '.join(MODES)})")
+    if mode != MODE_LIVE and not cassette:
+        raise ValueError(f"Transport mode '{mode}' needs a cassette path")
+
+    if mode == MODE_RECORD:
+        transport = RecordingTransport(cassette)
+        atexit.register(transport.close)
+    elif mode == MODE_REPLAY:
+        transport = ReplayTransport(cassette, latency, bandwidth)
+        print(f"[INFO] Replaying responses from {cassette}")
+    else:
+        transport = HttpTransport()
+
+    set_transport(transport)
+
+
+def configure_from_config(config) -> None:
+    """
+    Activates the transport configured by the transport_* keys.
+    """
+    configure_transport(
+        config.get("transport_mode", MODE_LIVE),
+        config.get("transport_cassette", "") or None,
+        config.get("transport_replay_latency_ms", 0) / 1000,
+        config.get("transport_replay_bandwidth", 0)
+    )
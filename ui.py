@@ -7,12 +7,22 @@ import re
 from pathlib import Path
 from PIL import Image
 import io
-import requests
 from typing import Optional
 
 import civitai_fetch_model
 import civitai_api_helper as api_helper
 from config import ConfigManager
+from log_buffer import LogBuffer, LOG_LEVELS
+from output_sinks import create_sink
+from snapshots import SnapshotStore
+from image_policy import ImagePolicy
+from image_dedupe import ImageDeduplicator
+import transport
+import adaptive_concurrency
+import scheduling
+from prefetch import Prefetcher, DEFAULT_DEBOUNCE_MS
+import dataset_export
+from resource_resolver import ResourceResolver
 
 
 # =========================================================
@@ -21,45 +31,101 @@ from config import ConfigManager
 
 config = ConfigManager()
 
+# HTTP transport (live / record / replay)
+transport.configure_from_config(config)
+adaptive_concurrency.configure_from_config(config, api_helper.api_limiter, civitai_fetch_model.image_limiter)
+scheduling.configure_from_config(config)
+
+# Shared API metadata cache (conditional requests, optional persistence)
+api_helper.configure_cache(
+    config.get("metadata_cache_dir") or None,
+    config.get("metadata_cache_ttl", api_helper.DEFAULT_CACHE_TTL)
+)
+
 # Model Metadata (filled in fetch_versions)
 current_model_metadata: Optional[dict] = None
+current_model_id: Optional[int] = None
+
+# Speculative prefetching while the user types / picks a version (None = off)
+prefetcher = Prefetcher.from_config(config)
+prefetch_after_id: Optional[str] = None
 
 # TK Variables (defined later)
 root: Optional[tk.Tk] = None
 
 
 class TextRedirector:
-    def __init__(self, text_widget):
+    """
+    File-like object feeding stdout/stderr into a LogBuffer.
+    The Text widget is updated in batches by a fixed-interval timer.
+    """
+
+    def __init__(self, text_widget, buffer: LogBuffer, flush_interval_ms: int = 100):
         self.text_widget = text_widget
+        self.buffer = buffer
+        self.flush_interval_ms = max(10, int(flush_interval_ms))
 
     def write(self, message):
-        self.text_widget.after(0, self._append, message)
+        self.buffer.write(message)
+
+    def flush(self):
+        pass
+
+    def start(self):
+        """Starts the periodic flush loop (call from the UI thread)."""
+        self.text_widget.after(self.flush_interval_ms, self._flush_loop)
+
+    def _flush_loop(self):
+        try:
+            lines, dropped = self.buffer.drain()
+            if dropped:
+                lines.insert(0, ("WARN", f"[WARN] {dropped} log lines skipped (see log file)\n"))
+            if lines:
+                self._insert(lines)
+        finally:
+            self.text_widget.after(self.flush_interval_ms, self._flush_loop)
+
+    def _insert(self, lines: list[tuple[str, str]]):
+        # One insert call for the whole batch: text/tag pairs
+        args = []
+        for tag, line in lines:
+            args.extend((line, tag))
 
-    def _append(self, message):
         self.text_widget.configure(state="normal")
+        self.text_widget.insert("end", *args)
 
-        tag = "INFO"
-        if message.startswith("[OK]"):
-            tag = "OK"
-        elif message.startswith("[WARN]"):
-            tag = "WARN"
-        elif message.startswith("[ERROR]"):
-            tag = "ERROR"
+        # Trim the widget to the configured line cap
+        line_count = int(self.text_widget.index("end-1c").split(".")[0])
+        excess = line_count - self.buffer.max_lines - 1
+        if excess > 0:
+            self.text_widget.delete("1.0", f"{excess + 1}.0")
 
-        self.text_widget.insert("end", message, tag)
         self.text_widget.see("end")
         self.text_widget.configure(state="disabled")
 
-    def flush(self):
-        pass
+    def rebuild(self):
+        """Redraws the widget from the buffer (e.g. after a level change)."""
+        self.text_widget.configure(state="normal")
+        self.text_widget.delete("1.0", tk.END)
+        self.text_widget.configure(state="disabled")
+        lines = self.buffer.snapshot()
+        if lines:
+            self._insert(lines)
 
 
 def log_clear():
+    log_buffer.clear()
     log_text.configure(state="normal")
     log_text.delete("1.0", tk.END)
     log_text.configure(state="disabled")
 
 
+def change_log_level(level: str):
+    log_buffer.set_level(level)
+    config.set("log_level", level)
+    log_redirector.rebuild()
+
+
 # -------------------------------
 # Cancel Event (global)
 # -------------------------------
@@ -77,14 +143,24 @@ def worker(model_id: int, version: str, md_output_dir: Optional[Path] = None, im
         md_dir = md_output_dir or config.get_path("model_output_dir")
         img_dir = img_output_dir or config.get_path("image_output_dir")
 
-        civitai_fetch_model.run(
-            model_id,
-            version,
-            progress_callback=progress_callback,
-            cancel_event=cancel_event,
-            md_output_dir=md_dir,
-            img_output_dir=img_dir
-        )
+        with create_sink(config, md_dir, img_dir) as sink, dataset_export.open_from_config(config) as dataset:
+            civitai_fetch_model.run(
+                model_id,
+                version,
+                progress_callback=progress_callback,
+                cancel_event=cancel_event,
+                md_output_dir=md_dir,
+                img_output_dir=img_dir,
+                version_workers=config.get("version_workers", civitai_fetch_model.DEFAULT_VERSION_WORKERS),
+                write_index=config.get("write_model_index", True),
+                sink=sink,
+                snapshots=SnapshotStore.from_config(config),
+                stats_pages=config.get("stats_deep_fetch_pages", 0),
+                image_policy=ImagePolicy.from_config(config),
+                deduplicator=ImageDeduplicator.from_config(config),
+                dataset=dataset,
+                resolver=ResourceResolver.from_config(config, md_dir)
+            )
 
         if cancel_event.is_set():
             print("[WARN] Process was cancelled")
@@ -155,6 +231,8 @@ def start_script():
 # -------------------------------
 def cancel_script():
     cancel_event.set()
+    if prefetcher:
+        prefetcher.cancel()
     print("[WARN] Cancellation requested...")
 
 
@@ -162,7 +240,7 @@ def cancel_script():
 # Version Fetch
 # -------------------------------
 def fetch_versions():
-    global current_model_metadata
+    global current_model_metadata, current_model_id
     
     log_clear()
 
@@ -178,6 +256,7 @@ def fetch_versions():
 
     model_id = int(match.group(1))
     print(f"[INFO] Model ID recognized: {model_id}")
+    current_model_id = model_id
 
     fetch_versions_button.config(state="disabled")
     version_dropdown.config(state="disabled")
@@ -221,6 +300,12 @@ def update_dropdown(versions_list: list[str], metadata: Optional[dict] = None):
     for v in versions_list:
         menu.add_command(label=v, command=lambda value=v: dropdown_var.set(value))
 
+    # Fetch every version at once (shared model payload, parallel versions)
+    if len(versions_list) > 1:
+        all_versions = civitai_fetch_model.ALL_VERSIONS
+        menu.add_separator()
+        menu.add_command(label=all_versions, command=lambda: dropdown_var.set(all_versions))
+
     version_dropdown.config(state="normal")
     dropdown_var.set(versions_list[0])
     
@@ -245,7 +330,7 @@ def update_model_info(metadata: dict):
         image_url = metadata.get("image", "")
         if image_url:
             try:
-                response = requests.get(image_url, timeout=10)
+                response = transport.get(image_url, timeout=10)
                 response.raise_for_status()
                 
                 img = Image.open(io.BytesIO(response.content))
@@ -276,6 +361,58 @@ def progress_callback(percent: float):
         root.after(0, ui_update)
 
 
+# -------------------------------
+# Speculative Prefetch
+# -------------------------------
+def on_model_input(event=None):
+    """Debounced: prefetch the model payload once the input contains an ID."""
+    global prefetch_after_id
+    if not prefetcher:
+        return
+    if prefetch_after_id:
+        root.after_cancel(prefetch_after_id)
+    prefetch_after_id = root.after(config.get("prefetch_debounce_ms", DEFAULT_DEBOUNCE_MS), prefetch_model_input)
+
+
+def prefetch_model_input():
+    global prefetch_after_id
+    prefetch_after_id = None
+    match = re.search(r"(\d+)", entry_model.get().strip())
+    if match:
+        prefetcher.prefetch_metadata(int(match.group(1)))
+    else:
+        prefetcher.cancel()
+
+
+def on_version_selected(*args):
+    """Prefetch the images of the selected version."""
+    if not prefetcher or current_model_id is None:
+        return
+    version = dropdown_var.get()
+    if version and version != "Select version":
+        prefetcher.prefetch_version(current_model_id, version)
+
+
+# -------
+# Concurrency Display
+# -------
+def update_concurrency_label():
+    stats = adaptive_concurrency.all_stats()
+    parts = []
+    for name in ("images", "api"):
+        item = stats.get(name)
+        if not item:
+            continue
+        text = f"{name}: {item['limit']} (max {item['max_limit']}) {adaptive_concurrency.sparkline(item['history'])}"
+        if item["latency_ms"] is not None:
+            text += f" {item['latency_ms']:.0f} ms"
+        if item["failures"]:
+            text += f", {item['failures']} throttled"
+        parts.append(text)
+    concurrency_label.config(text="Concurrency - " + " | ".join(parts))
+    root.after(CONCURRENCY_REFRESH_MS, update_concurrency_label)
+
+
 # =========================================================
 # UI SETUP
 # =========================================================
@@ -302,6 +439,7 @@ input_frame.pack(pady=(0, 10), padx=10, fill="x")
 
 entry_model = tk.Entry(input_frame, width=50, font=("Arial", 10))
 entry_model.pack(side="left", fill="x", expand=True, padx=(0, 5))
+entry_model.bind("<KeyRelease>", on_model_input)
 
 fetch_versions_button = tk.Button(
     input_frame,
@@ -329,6 +467,7 @@ version_frame.pack(pady=5)
 
 dropdown_var = tk.StringVar(root)
 dropdown_var.set("Select version")
+dropdown_var.trace_add("write", on_version_selected)
 
 version_dropdown = tk.OptionMenu(version_frame, dropdown_var, "Select version")
 version_dropdown.pack(side="left", padx=5)
@@ -359,8 +498,23 @@ progress_var = tk.DoubleVar()
 progress_bar = ttk.Progressbar(fetch_frame, variable=progress_var, maximum=100)
 progress_bar.pack(fill="x", padx=10, pady=(10, 5))
 
+# Adaptive concurrency (current limits and their history)
+CONCURRENCY_REFRESH_MS = 500
+concurrency_label = tk.Label(fetch_frame, text="", fg="#888888", font=("Arial", 8), anchor="w")
+concurrency_label.pack(fill="x", padx=10)
+
 # Log Output
-tk.Label(fetch_frame, text="📋 Console Log", font=("Arial", 10, "bold")).pack(anchor="w", padx=10, pady=(10, 2))
+log_header = tk.Frame(fetch_frame)
+log_header.pack(fill="x", padx=10, pady=(10, 2))
+
+tk.Label(log_header, text="📋 Console Log", font=("Arial", 10, "bold")).pack(side="left")
+
+log_level_var = tk.StringVar(root)
+log_level_var.set(config.get("log_level", "INFO"))
+
+log_level_dropdown = tk.OptionMenu(log_header, log_level_var, *LOG_LEVELS, command=change_log_level)
+log_level_dropdown.pack(side="right")
+tk.Label(log_header, text="Level:", font=("Arial", 9)).pack(side="right", padx=(0, 5))
 
 log_frame = tk.Frame(fetch_frame)
 log_frame.pack(fill="both", expand=True, padx=10, pady=(0, 10))
@@ -454,9 +608,21 @@ log_text.tag_config("OK", foreground="#00ff00")
 log_text.tag_config("WARN", foreground="#ffcc00")
 log_text.tag_config("ERROR", foreground="#ff4c4c")
 
+# Bounded log buffer (optionally spilling the full log to a rotating file)
+log_buffer = LogBuffer(
+    max_lines=config.get("log_max_lines", 2000),
+    min_level=config.get("log_level", "INFO"),
+    log_file=config.get("log_file") or None,
+    file_max_bytes=config.get("log_file_max_bytes", 1024 * 1024),
+    file_backup_count=config.get("log_file_backup_count", 3)
+)
+
 # Redirect stdout/stderr to log
-sys.stdout = TextRedirector(log_text)
-sys.stderr = TextRedirector(log_text)
+log_redirector = TextRedirector(log_text, log_buffer, config.get("log_flush_interval_ms", 100))
+log_redirector.start()
+root.after(CONCURRENCY_REFRESH_MS, update_concurrency_label)
+sys.stdout = log_redirector
+sys.stderr = log_redirector
 
 # Footer
 footer_label = tk.Label(root, text="v0.1.0-beta | made with ❤️ by NoHuman", fg="#888888", font=("Arial", 8))
@@ -0,0 +1,114 @@
+# video_media.py
+"""
+Media-type detection and poster frames for video "images".
+
+Many sample images are MP4/WebM clips. Their type is detected from the
+response headers (Content-Type, URL suffix as fallback) before the body
+is read, so a video is never downloaded just to fail in the image
+decoder. What happens to it is decided by the video mode:
+
+    poster  - save a still frame as JPEG (default)
+    video   - stream the clip to the sink as is
+    skip    - drop it
+
+Poster frames are decoded with ffmpeg from the leading bytes of the clip
+only (a ranged request). ffmpeg is optional: without it - or if the
+leading bytes do not contain a decodable frame, e.g. an MP4 with its index
+at the end - the still variant of the image CDN is used instead.
+"""
+
+import shutil
+import subprocess
+from typing import Optional
+
+MEDIA_IMAGE = "image"
+MEDIA_VIDEO = "video"
+
+VIDEO_POSTER = "poster"
+VIDEO_FULL = "video"
+VIDEO_SKIP = "skip"
+VIDEO_MODES = (VIDEO_POSTER, VIDEO_FULL, VIDEO_SKIP)
+
+# Leading bytes fetched for a poster frame (the second attempt fetches 4x as much)
+DEFAULT_POSTER_PROBE_BYTES = 1024 * 1024
+POSTER_PROBE_GROWTH = 4
+FFMPEG_TIMEOUT = 30
+
+VIDEO_SUFFIXES = {
+    "video/mp4": ".mp4",
+    "video/webm": ".webm",
+    "video/quicktime": ".mov",
+}
+DEFAULT_VIDEO_SUFFIX = ".mp4"
+
+
+class VideoContent(Exception):
+    """
+    Raised by the image fetch when the response turns out to be a video
+    (detected from the headers; the body was not read).
+    """
+
+    def __init__(self, url: str, content_type: str = ""):
+        super().__init__(f"Video content ({content_type or 'unknown type'}): {url}")
+        self.url = url
+        self.content_type = content_type
+
+
+def media_kind(content_type: Optional[str], url: str = "") -> str:
+    """
+    Returns MEDIA_VIDEO or MEDIA_IMAGE for a response. Without a usable
+    Content-Type the URL suffix decides.
+    """
+    content_type = (content_type or "").split(";", 1)[0].strip().lower()
+    if content_type.startswith("video/"):
+        return MEDIA_VIDEO
+    if content_type.startswith("image/"):
+        return MEDIA_IMAGE
+    path = url.split("?", 1)[0].lower()
+    return MEDIA_VIDEO if path.endswith(tuple(VIDEO_SUFFIXES.values())) else MEDIA_IMAGE
+
+
+def sniff_media_kind(data: bytes) -> str:
+    """
+    Returns the media kind of already downloaded bytes (prefetched images).
+    """
+    if data[4:8] == b"ftyp" or data[:4] == b"\x1a\x45\xdf\xa3":
+        return MEDIA_VIDEO
+    return MEDIA_IMAGE
+
+
+def video_suffix(content_type: Optional[str], url: str = "") -> str:
+    """
+    Returns the file suffix of a video (from Content-Type or the URL).
+    """
+    content_type = (content_type or "").split(";", 1)[0].strip().lower()
+    if content_type in VIDEO_SUFFIXES:
+        return VIDEO_SUFFIXES[content_type]
+    path = url.split("?", 1)[0].lower()
+    return next((s for s in VIDEO_SUFFIXES.values() if path.endswith(s)), DEFAULT_VIDEO_SUFFIX)
+
+
+def ffmpeg_path() -> Optional[str]:
+    return shutil.which("ffmpeg")
+
+
+def extract_poster_frame(data: bytes) -> Optional[bytes]:
+    """
+    Decodes the first frame of (the leading bytes of) a video to JPEG.
+    Returns None if ffmpeg is missing or no frame could be decoded.
+    """
+    ffmpeg = ffmpeg_path()
+    if ffmpeg is None or not data:
+        return None
+    try:
+        result = subprocess.run(
+            [ffmpeg, "-v", "error", "-i", "pipe:0", "-frames:v", "1",
+             "-f", "image2pipe", "-c:v", "mjpeg", "-q:v", "2", "pipe:1"],
+            input=data,
+            capture_output=True,
+            timeout=FFMPEG_TIMEOUT
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    # Truncated input makes ffmpeg complain even if the frame was decoded
+    return result.stdout or None
@@ -0,0 +1,407 @@
+# watcher.py
+"""
+Watch mode: polls followed models and creators and fetches new versions.
+
+Each watched model is polled through the metadata cache with conditional
+requests. Its modelVersions are compared with the versions already
+fetched (persisted in the watch state file), and only new versions are
+queued for the fetch pipeline (or, with work_queue_file, for the
+distributed workers, see work_queue.py). Polling intervals adapt per target: they
+reset to the minimum when something changed and grow towards the maximum
+while nothing does. A version whose fetch fails (e.g. it is not found) is
+retried with exponential backoff instead of on every poll.
+
+Usage: python watcher.py  (reads the watch_* keys from config.json)
+"""
+
+import json
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+import civitai_api_helper as api_helper
+import civitai_fetch_model
+from config import ConfigManager
+from model_payload import parse_model_payload
+from output_sinks import create_sink
+from snapshots import SnapshotStore
+from image_policy import ImagePolicy
+from image_dedupe import ImageDeduplicator
+import transport
+import adaptive_concurrency
+import scheduling
+from work_queue import WorkQueue
+from dataset_export import DatasetExporter
+from resource_resolver import ResourceResolver
+
+DEFAULT_MIN_INTERVAL = 300
+DEFAULT_MAX_INTERVAL = 6 * 3600
+# Interval growth per unchanged poll / per failed poll
+INTERVAL_BACKOFF = 1.5
+ERROR_BACKOFF = 2.0
+# Longest delay before a failed version is queued again
+MAX_RETRY_DELAY = 7 * 24 * 3600
+
+
+class WatchTarget:
+    """
+    Polling state of a watched model or creator.
+    """
+
+    __slots__ = ("kind", "key", "interval", "next_poll", "known", "failed")
+
+    def __init__(
+        self,
+        kind: str,
+        key,
+        interval: float,
+        next_poll: float = 0.0,
+        known: Optional[list] = None,
+        failed: Optional[dict] = None
+    ):
+        self.kind = kind
+        self.key = key
+        self.interval = interval
+        self.next_poll = next_poll
+        # model: fetched version IDs / creator: known model IDs (None = never polled)
+        self.known = set(known) if known is not None else None
+        # model: version ID -> [failed fetches, time of the next attempt]
+        self.failed = {int(vid): list(entry) for vid, entry in (failed or {}).items()}
+
+    def to_dict(self) -> dict:
+        state = {
+            "interval": self.interval,
+            "next_poll": self.next_poll,
+            "known": sorted(self.known) if self.known is not None else None,
+        }
+        if self.failed:
+            state["failed"] = {str(vid): entry for vid, entry in sorted(self.failed.items())}
+        return state
+
+
+class ModelWatcher:
+    """
+    Polls watched models/creators and feeds new versions into a fetch queue.
+    """
+
+    def __init__(
+        self,
+        model_ids: list[int],
+        creators: list[str],
+        state_file: Path,
+        md_output_dir: Path,
+        img_output_dir: Path,
+        config=None,
+        min_interval: float = DEFAULT_MIN_INTERVAL,
+        max_interval: float = DEFAULT_MAX_INTERVAL,
+        fetch_existing: bool = False,
+        work_queue: Optional[WorkQueue] = None,
+        clock: Callable[[], float] = time.time
+    ):
+        """
+        Initialize ModelWatcher.
+
+        Args:
+            model_ids: Model IDs to watch
+            creators: Creator usernames whose new models are watched as well
+            state_file: JSON file with the polling state and fetched versions
+            md_output_dir: Markdown output directory
+            img_output_dir: Image output directory
+            config: ConfigManager (output sink settings)
+            min_interval: Shortest polling interval in seconds
+            max_interval: Longest polling interval in seconds
+            fetch_existing: Also fetch versions that exist when a model is first seen
+            work_queue: Shared queue of distributed workers (None = fetch locally)
+            clock: Time source (injectable for tests)
+        """
+        self.state_file = Path(state_file)
+        self.md_output_dir = md_output_dir
+        self.img_output_dir = img_output_dir
+        self.config = config
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.fetch_existing = fetch_existing
+        self.work_queue = work_queue
+        self.clock = clock
+
+        self.jobs: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._queued: set[tuple[int, int]] = set()
+
+        self.models: dict[int, WatchTarget] = {}
+        self.creators: dict[str, WatchTarget] = {}
+        self._load_state()
+
+        for model_id in model_ids:
+            self._add_model(int(model_id))
+        for username in creators:
+            if username not in self.creators:
+                self.creators[username] = WatchTarget("creator", username, self.min_interval)
+
+    # -------------------------------
+    # State
+    # -------------------------------
+    def _add_model(self, model_id: int, known: Optional[list] = None) -> None:
+        if model_id not in self.models:
+            self.models[model_id] = WatchTarget("model", model_id, self.min_interval, known=known)
+
+    def _load_state(self) -> None:
+        if not self.state_file.exists():
+            return
+        try:
+            state = json.loads(self.state_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Watch state could not be loaded: {e}")
+            return
+
+        for key, item in state.get("models", {}).items():
+            self.models[int(key)] = WatchTarget(
+                "model", int(key), item["interval"], item["next_poll"], item["known"], item.get("failed")
+            )
+        for key, item in state.get("creators", {}).items():
+            self.creators[key] = WatchTarget("creator", key, item["interval"], item["next_poll"], item["known"])
+
+    def save_state(self) -> None:
+        with self._lock:
+            state = {
+                "models": {str(k): t.to_dict() for k, t in self.models.items()},
+                "creators": {k: t.to_dict() for k, t in self.creators.items()},
+            }
+        tmp_file = self.state_file.with_suffix(".tmp")
+        tmp_file.write_text(json.dumps(state, indent=2), encoding="utf-8")
+        tmp_file.replace(self.state_file)
+
+    # -------------------------------
+    # Polling
+    # -------------------------------
+    def _reschedule(self, target: WatchTarget, changed: bool, failed: bool = False) -> None:
+        if failed:
+            target.interval = min(self.max_interval, target.interval * ERROR_BACKOFF)
+        elif changed:
+            target.interval = self.min_interval
+        else:
+            target.interval = min(self.max_interval, target.interval * INTERVAL_BACKOFF)
+        target.next_poll = self.clock() + target.interval
+
+    def _record_failure(self, model_id: int, version_id: int) -> float:
+        """
+        Counts a failed fetch of a version and schedules its next attempt.
+        Returns: delay in seconds until the version is queued again.
+        """
+        with self._lock:
+            failed = self.models[model_id].failed
+            failures = failed.get(version_id, [0, 0.0])[0] + 1
+            delay = min(MAX_RETRY_DELAY, self.min_interval * ERROR_BACKOFF ** (failures - 1))
+            failed[version_id] = [failures, self.clock() + delay]
+        return delay
+
+    def poll_model(self, target: WatchTarget) -> int:
+        """
+        Polls a model and queues its new versions.
+        Returns: number of queued versions.
+        """
+        raw, changed = api_helper.fetch_model_raw(target.key, max_age=0)
+        data = parse_model_payload(raw, full_versions=False)
+        versions = [(v.get("id"), v.get("name")) for v in data.get("modelVersions", []) if v.get("name")]
+
+        with self._lock:
+            if target.known is None and not self.fetch_existing:
+                # First sighting: existing versions count as fetched
+                target.known = {vid for vid, _ in versions}
+                new_versions = []
+            else:
+                if target.known is None:
+                    target.known = set()
+                # Diff even if unchanged, so failed fetches are retried (once their backoff passed)
+                now = self.clock()
+                new_versions = [
+                    (vid, name) for vid, name in versions
+                    if vid not in target.known and target.failed.get(vid, (0, 0.0))[1] <= now
+                ]
+                # Versions removed from the model are not retried any more
+                listed = {vid for vid, _ in versions}
+                for vid in [vid for vid in target.failed if vid not in listed]:
+                    del target.failed[vid]
+
+        for version_id, version_name in new_versions:
+            self._enqueue(target.key, version_id, version_name)
+
+        self._reschedule(target, changed=changed or bool(new_versions))
+        if new_versions:
+            print(f"[OK] {data.get('name', target.key)}: {len(new_versions)} new version(s)")
+        return len(new_versions)
+
+    def poll_creator(self, target: WatchTarget) -> int:
+        """
+        Polls a creator and starts watching their new models.
+        Returns: number of new models.
+        """
+        model_ids = api_helper.get_creator_model_ids(target.key, max_age=0)
+        first_poll = target.known is None
+        new_ids = [mid for mid in model_ids if first_poll or mid not in target.known]
+        target.known = (target.known or set()) | set(model_ids)
+
+        if first_poll and not self.fetch_existing:
+            # Existing models of the creator are watched but not fetched
+            for model_id in new_ids:
+                self._add_model(model_id)
+            self._reschedule(target, changed=False)
+            return 0
+
+        for model_id in new_ids:
+            # Models discovered later are new: every version gets fetched
+            self._add_model(model_id, known=[])
+            print(f"[OK] New model {model_id} by {target.key}")
+
+        self._reschedule(target, changed=bool(new_ids))
+        return len(new_ids)
+
+    def poll_due(self) -> int:
+        """
+        Polls every target whose next poll time has passed.
+        Returns: number of queued versions.
+        """
+        now = self.clock()
+        queued = 0
+
+        for target in [*self.creators.values(), *self.models.values()]:
+            if target.next_poll > now:
+                continue
+            try:
+                if target.kind == "creator":
+                    self.poll_creator(target)
+                else:
+                    queued += self.poll_model(target)
+            except Exception as e:
+                print(f"[WARN] Polling {target.kind} {target.key} failed: {e}")
+                self._reschedule(target, changed=False, failed=True)
+
+        self.save_state()
+        return queued
+
+    def seconds_until_next_poll(self) -> float:
+        targets = [*self.creators.values(), *self.models.values()]
+        if not targets:
+            return self.max_interval
+        return max(0.0, min(t.next_poll for t in targets) - self.clock())
+
+    # -------------------------------
+    # Fetching
+    # -------------------------------
+    def _enqueue(self, model_id: int, version_id: int, version_name: str) -> None:
+        if self.work_queue is not None:
+            # The shared queue de-duplicates and retries; the version counts as handed off
+            if self.work_queue.enqueue(model_id, version_name):
+                print(f"[INFO] Queued model {model_id} / Version {version_name} for workers")
+            with self._lock:
+                self.models[model_id].known.add(version_id)
+            return
+
+        with self._lock:
+            if (model_id, version_id) in self._queued:
+                return
+            self._queued.add((model_id, version_id))
+        self.jobs.put((model_id, version_id, version_name))
+
+    def _fetch_worker(self, stop_event: threading.Event) -> None:
+        while not stop_event.is_set():
+            try:
+                model_id, version_id, version_name = self.jobs.get(timeout=1)
+            except queue.Empty:
+                continue
+
+            try:
+                print(f"[INFO] Fetching model {model_id} / Version {version_name}")
+                sink = create_sink(self.config, self.md_output_dir, self.img_output_dir) if self.config else None
+                dataset = DatasetExporter.from_config(self.config) if self.config else None
+                try:
+                    result = civitai_fetch_model.run(
+                        model_id,
+                        version_name,
+                        cancel_event=stop_event,
+                        md_output_dir=self.md_output_dir,
+                        img_output_dir=self.img_output_dir,
+                        sink=sink,
+                        snapshots=SnapshotStore.from_config(self.config) if self.config else None,
+                        stats_pages=self.config.get("stats_deep_fetch_pages", 0) if self.config else 0,
+                        image_policy=ImagePolicy.from_config(self.config) if self.config else None,
+                        deduplicator=ImageDeduplicator.from_config(self.config) if self.config else None,
+                        priority=scheduling.PRIORITY_BULK,
+                        dataset=dataset,
+                        resolver=ResourceResolver.from_config(self.config, self.md_output_dir) if self.config else None
+                    )
+                finally:
+                    if sink:
+                        sink.close()
+                    if dataset:
+                        dataset.close()
+
+                # Only completed fetches count as known; cancelled ones are
+                # queued again by the next poll, failed ones after a backoff
+                if stop_event.is_set():
+                    print(f"[WARN] Model {model_id} / Version {version_name} not fetched, retrying on the next poll")
+                    continue
+                if not result:
+                    delay = self._record_failure(model_id, version_id)
+                    print(f"[WARN] Model {model_id} / Version {version_name} not fetched, retrying in {delay / 60:.0f} min")
+                else:
+                    with self._lock:
+                        self.models[model_id].known.add(version_id)
+                        self.models[model_id].failed.pop(version_id, None)
+                self.save_state()
+            except Exception as e:
+                delay = self._record_failure(model_id, version_id)
+                print(f"[ERROR] Fetch of model {model_id} / Version {version_name} failed: {e} (retrying in {delay / 60:.0f} min)")
+            finally:
+                with self._lock:
+                    self._queued.discard((model_id, version_id))
+                self.jobs.task_done()
+
+    def run_forever(self, stop_event: Optional[threading.Event] = None, workers: int = 1) -> None:
+        """
+        Polls and fetches until stop_event is set.
+        """
+        stop_event = stop_event or threading.Event()
+
+        for _ in range(0 if self.work_queue is not None else max(1, workers)):
+            threading.Thread(target=self._fetch_worker, args=(stop_event,), daemon=True).start()
+
+        print(f"[INFO] Watching {len(self.models)} models and {len(self.creators)} creators")
+        while not stop_event.is_set():
+            self.poll_due()
+            stop_event.wait(self.seconds_until_next_poll())
+
+
+def main() -> None:
+    config = ConfigManager()
+    transport.configure_from_config(config)
+    adaptive_concurrency.configure_from_config(config, api_helper.api_limiter, civitai_fetch_model.image_limiter)
+    scheduling.configure_from_config(config)
+
+    cache_dir = config.get("metadata_cache_dir") or None
+    api_helper.configure_cache(cache_dir, config.get("metadata_cache_ttl", api_helper.DEFAULT_CACHE_TTL))
+
+    watcher = ModelWatcher(
+        model_ids=config.get("watch_model_ids", []),
+        creators=config.get("watch_creators", []),
+        state_file=config.get_path("watch_state_file"),
+        md_output_dir=config.get_path("model_output_dir"),
+        img_output_dir=config.get_path("image_output_dir"),
+        config=config,
+        min_interval=config.get("watch_min_interval", DEFAULT_MIN_INTERVAL),
+        max_interval=config.get("watch_max_interval", DEFAULT_MAX_INTERVAL),
+        fetch_existing=config.get("watch_fetch_existing", False),
+        work_queue=WorkQueue.from_config(config)
+    )
+
+    try:
+        watcher.run_forever(workers=config.get("watch_fetch_workers", 1))
+    except KeyboardInterrupt:
+        print("[WARN] Watch mode stopped")
+        watcher.save_state()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,448 @@
+# work_queue.py
+"""
+Shared fetch queue for distributed workers.
+
+Model/version jobs live in a SQLite database that every node reaches over
+a shared volume. Workers lease one job at a time and renew the lease with
+heartbeats while fetching; a job whose lease expires (crashed or cut off
+worker) is handed out again, up to max_attempts times. Jobs are unique
+per model/version, so enqueueing the same version again while it is
+queued, running or done does not fetch it twice.
+
+The database is used in rollback-journal mode (WAL does not work on
+network file systems); every state change is a short IMMEDIATE
+transaction.
+
+Usage:
+    python work_queue.py enqueue <model_id> [version]   add a job (coordinator)
+    python work_queue.py worker                         fetch jobs until stopped
+    python work_queue.py status                         job counts by state
+
+With work_queue_file set, watch mode enqueues new versions here instead
+of fetching them itself.
+"""
+
+import argparse
+import os
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+import civitai_api_helper as api_helper
+import civitai_fetch_model
+from config import ConfigManager
+from output_sinks import create_sink
+from snapshots import SnapshotStore
+from image_policy import ImagePolicy
+from image_dedupe import ImageDeduplicator
+import transport
+import adaptive_concurrency
+import scheduling
+import dataset_export
+from resource_resolver import ResourceResolver
+
+JOB_QUEUED = "queued"
+JOB_LEASED = "leased"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_HEARTBEAT_SECONDS = 60
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_POLL_SECONDS = 5
+# Wait for locks held by other nodes
+BUSY_TIMEOUT = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    model_id INTEGER NOT NULL,
+    version TEXT NOT NULL,
+    version_key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    UNIQUE (model_id, version_key)
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_expires);
+"""
+
+
+class LeasedJob:
+    """
+    A job leased by a worker.
+    """
+
+    __slots__ = ("id", "model_id", "version", "attempts")
+
+    def __init__(self, job_id: int, model_id: int, version: str, attempts: int):
+        self.id = job_id
+        self.model_id = model_id
+        self.version = version
+        self.attempts = attempts
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue:
+    """
+    SQLite-backed job queue with leases.
+    """
+
+    def __init__(
+        self,
+        db_file: Path,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        clock: Callable[[], float] = time.time
+    ):
+        """
+        Initialize WorkQueue.
+
+        Args:
+            db_file: Queue database on the shared volume (created if missing)
+            lease_seconds: Time a job stays leased without a heartbeat
+            max_attempts: Leases per job before it is marked failed
+            clock: Wall clock shared by all nodes (injectable for tests)
+        """
+        self.db_file = Path(db_file)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.clock = clock
+        self._local = threading.local()
+
+        self.db_file.parent.mkdir(parents=True, exist_ok=True)
+        self._connection().executescript(SCHEMA)
+
+    @classmethod
+    def from_config(cls, config) -> Optional["WorkQueue"]:
+        """
+        Returns the configured queue (None if work_queue_file is empty).
+        """
+        db_file = config.get("work_queue_file", "")
+        if not db_file:
+            return None
+        return cls(
+            Path(db_file),
+            config.get("work_queue_lease_seconds", DEFAULT_LEASE_SECONDS),
+            config.get("work_queue_max_attempts", DEFAULT_MAX_ATTEMPTS)
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared between threads
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_file, timeout=BUSY_TIMEOUT, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            self._local.db = db
+        return db
+
+    def _transaction(self):
+        return _Transaction(self._connection())
+
+    # -------------------------------
+    # Coordinator
+    # -------------------------------
+    def enqueue(self, model_id: int, version: str, retry_failed: bool = True) -> bool:
+        """
+        Adds a job unless the version is already queued, leased or done.
+        Failed jobs are queued again (with fresh attempts) if retry_failed.
+        Returns: True if the job was (re)queued.
+        """
+        now = self.clock()
+        with self._transaction() as db:
+            row = db.execute(
+                "SELECT id, status FROM jobs WHERE model_id = ? AND version_key = ?",
+                (model_id, version.lower())
+            ).fetchone()
+            if row is None:
+                db.execute(
+                    "INSERT INTO jobs (model_id, version, version_key, status, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (model_id, version, version.lower(), JOB_QUEUED, now, now)
+                )
+                return True
+            if row["status"] == JOB_FAILED and retry_failed:
+                db.execute(
+                    "UPDATE jobs SET status = ?, attempts = 0, error = NULL, worker = NULL, updated_at = ? "
+                    "WHERE id = ?",
+                    (JOB_QUEUED, now, row["id"])
+                )
+                return True
+            return False
+
+    # -------------------------------
+    # Worker
+    # -------------------------------
+    def lease(self, worker_id: str) -> Optional[LeasedJob]:
+        """
+        Leases the oldest queued job (or one whose lease expired).
+        Returns: the job or None if there is nothing to do.
+        """
+        now = self.clock()
+        with self._transaction() as db:
+            # Expired leases that used up their attempts are given up
+            db.execute(
+                "UPDATE jobs SET status = ?, error = 'lease expired', updated_at = ? "
+                "WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+                (JOB_FAILED, now, JOB_LEASED, now, self.max_attempts)
+            )
+            row = db.execute(
+                "SELECT id, model_id, version, attempts FROM jobs "
+                "WHERE status = ? OR (status = ? AND lease_expires < ?) "
+                "ORDER BY id LIMIT 1",
+                (JOB_QUEUED, JOB_LEASED, now)
+            ).fetchone()
+            if row is None:
+                return None
+
+            db.execute(
+                "UPDATE jobs SET status = ?, worker = ?, lease_expires = ?, attempts = attempts + 1, "
+                "updated_at = ? WHERE id = ?",
+                (JOB_LEASED, worker_id, now + self.lease_seconds, now, row["id"])
+            )
+            return LeasedJob(row["id"], row["model_id"], row["version"], row["attempts"] + 1)
+
+    def heartbeat(self, job: LeasedJob, worker_id: str) -> bool:
+        """
+        Renews the lease of a job.
+        Returns: False if the lease was lost (expired and taken over).
+        """
+        now = self.clock()
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND status = ?",
+                (now + self.lease_seconds, now, job.id, worker_id, JOB_LEASED)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job: LeasedJob, worker_id: str) -> bool:
+        """
+        Marks a leased job as done. Returns: False if the lease was lost.
+        """
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET status = ?, lease_expires = NULL, error = NULL, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND status = ?",
+                (JOB_DONE, self.clock(), job.id, worker_id, JOB_LEASED)
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, job: LeasedJob, worker_id: str, error: str) -> bool:
+        """
+        Releases a failed job: queued again while attempts are left, else failed.
+        Returns: False if the lease was lost.
+        """
+        status = JOB_QUEUED if job.attempts < self.max_attempts else JOB_FAILED
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET status = ?, lease_expires = NULL, error = ?, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND status = ?",
+                (status, error, self.clock(), job.id, worker_id, JOB_LEASED)
+            )
+            return cursor.rowcount == 1
+
+    def stats(self) -> dict:
+        """
+        Returns the number of jobs per state.
+        """
+        rows = self._connection().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {status: 0 for status in (JOB_QUEUED, JOB_LEASED, JOB_DONE, JOB_FAILED)}
+        counts.update({row[0]: row[1] for row in rows})
+        return counts
+
+
+class _Transaction:
+    """
+    BEGIN IMMEDIATE ... COMMIT/ROLLBACK (takes the write lock up front, so
+    concurrent leases cannot pick the same job).
+    """
+
+    def __init__(self, db: sqlite3.Connection):
+        self.db = db
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+# =========================================================
+# Worker loop
+# =========================================================
+
+class QueueWorker:
+    """
+    Fetches leased jobs with the regular pipeline.
+    """
+
+    def __init__(
+        self,
+        work_queue: WorkQueue,
+        config,
+        worker_id: Optional[str] = None,
+        heartbeat_seconds: float = DEFAULT_HEARTBEAT_SECONDS,
+        poll_seconds: float = DEFAULT_POLL_SECONDS
+    ):
+        self.queue = work_queue
+        self.config = config
+        self.worker_id = worker_id or default_worker_id()
+        self.heartbeat_seconds = heartbeat_seconds
+        self.poll_seconds = poll_seconds
+
+    def _heartbeat_loop(
+        self,
+        job: LeasedJob,
+        done: threading.Event,
+        cancel_event: threading.Event,
+        stop_event: threading.Event
+    ) -> None:
+        next_beat = time.monotonic() + self.heartbeat_seconds
+        while not done.wait(1.0):
+            if stop_event.is_set():
+                cancel_event.set()
+                return
+            if time.monotonic() < next_beat:
+                continue
+            next_beat = time.monotonic() + self.heartbeat_seconds
+            try:
+                if not self.queue.heartbeat(job, self.worker_id):
+                    print(f"[WARN] Lease of job {job.id} lost, cancelling")
+                    cancel_event.set()
+                    return
+            except sqlite3.Error as e:
+                # Transient lock/volume problems; the lease is still valid for a while
+                print(f"[WARN] Heartbeat for job {job.id} failed: {e}")
+
+    def process(self, job: LeasedJob, stop_event: threading.Event) -> None:
+        """
+        Fetches one leased job and reports the outcome to the queue.
+        """
+        print(f"[INFO] Job {job.id}: model {job.model_id} / Version {job.version} (attempt {job.attempts})")
+        md_dir = self.config.get_path("model_output_dir")
+        img_dir = self.config.get_path("image_output_dir")
+
+        done = threading.Event()
+        # Set on lost lease or stop: the fetch is cancelled
+        cancel_event = threading.Event()
+        threading.Thread(
+            target=self._heartbeat_loop,
+            args=(job, done, cancel_event, stop_event),
+            daemon=True
+        ).start()
+
+        try:
+            with create_sink(self.config, md_dir, img_dir) as sink, \
+                    dataset_export.open_from_config(self.config) as dataset:
+                result = civitai_fetch_model.run(
+                    job.model_id,
+                    job.version,
+                    cancel_event=cancel_event,
+                    md_output_dir=md_dir,
+                    img_output_dir=img_dir,
+                    version_workers=self.config.get("version_workers", civitai_fetch_model.DEFAULT_VERSION_WORKERS),
+                    write_index=self.config.get("write_model_index", True),
+                    sink=sink,
+                    snapshots=SnapshotStore.from_config(self.config),
+                    stats_pages=self.config.get("stats_deep_fetch_pages", 0),
+                    image_policy=ImagePolicy.from_config(self.config),
+                    deduplicator=ImageDeduplicator.from_config(self.config),
+                    priority=scheduling.PRIORITY_BULK,
+                    dataset=dataset,
+                    resolver=ResourceResolver.from_config(self.config, md_dir)
+                )
+        except Exception as e:
+            done.set()
+            print(f"[ERROR] Job {job.id} failed: {e}")
+            self.queue.fail(job, self.worker_id, str(e))
+            return
+        done.set()
+
+        if cancel_event.is_set():
+            # Lost lease: another worker owns the job now; stop: retried later
+            self.queue.fail(job, self.worker_id, "cancelled")
+        elif not result:
+            self.queue.fail(job, self.worker_id, f"Version '{job.version}' not found")
+        else:
+            self.queue.complete(job, self.worker_id)
+            print(f"[OK] Job {job.id} done")
+
+    def run_forever(self, stop_event: Optional[threading.Event] = None) -> None:
+        """
+        Leases and fetches jobs until stop_event is set.
+        """
+        stop_event = stop_event or threading.Event()
+        print(f"[INFO] Worker {self.worker_id} polling {self.queue.db_file}")
+        while not stop_event.is_set():
+            try:
+                job = self.queue.lease(self.worker_id)
+            except sqlite3.Error as e:
+                print(f"[WARN] Queue not available: {e}")
+                job = None
+
+            if job is None:
+                stop_event.wait(self.poll_seconds)
+                continue
+            self.process(job, stop_event)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Shared fetch queue for distributed workers")
+    commands = parser.add_subparsers(dest="command", required=True)
+    enqueue = commands.add_parser("enqueue", help="add a model/version job")
+    enqueue.add_argument("model_id", type=int)
+    enqueue.add_argument("version", nargs="?", default=civitai_fetch_model.ALL_VERSIONS)
+    commands.add_parser("worker", help="fetch jobs until stopped")
+    commands.add_parser("status", help="job counts by state")
+    args = parser.parse_args()
+
+    config = ConfigManager()
+    work_queue = WorkQueue.from_config(config)
+    if work_queue is None:
+        print("[ERROR] work_queue_file is not configured")
+        return
+
+    if args.command == "enqueue":
+        if work_queue.enqueue(args.model_id, args.version):
+            print(f"[OK] Queued model {args.model_id} / Version {args.version}")
+        else:
+            print(f"[SKIP] Model {args.model_id} / Version {args.version} is already queued or done")
+    elif args.command == "status":
+        for status, count in work_queue.stats().items():
+            print(f"[INFO] {status}: {count}")
+    else:
+        transport.configure_from_config(config)
+        adaptive_concurrency.configure_from_config(config, api_helper.api_limiter, civitai_fetch_model.image_limiter)
+        scheduling.configure_from_config(config)
+        api_helper.configure_cache(
+            config.get("metadata_cache_dir") or None,
+            config.get("metadata_cache_ttl", api_helper.DEFAULT_CACHE_TTL)
+        )
+
+        worker = QueueWorker(
+            work_queue,
+            config,
+            heartbeat_seconds=config.get("work_queue_heartbeat_seconds", DEFAULT_HEARTBEAT_SECONDS),
+            poll_seconds=config.get("work_queue_poll_seconds", DEFAULT_POLL_SECONDS)
+        )
+        try:
+            worker.run_forever()
+        except KeyboardInterrupt:
+            # The lease expires and another worker picks the job up
+            print("[WARN] Worker stopped")
+
+
+if __name__ == "__main__":
+    main()